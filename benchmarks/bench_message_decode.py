@@ -0,0 +1,65 @@
+"""
+Micro-benchmark: eval of the raw Socket.IO payload (previous parsing)
+vs. the validated JSON decoder in message_server/messages.py
+
+Usage: python -m benchmarks.bench_message_decode [--number N]
+"""
+import argparse
+import json
+import timeit
+from message_server.messages import decode_message
+from message_server.robot_protocol import decode_text_reply, encode_telemetry, decode_telemetry, TELEMETRY_FIELDS
+
+PAYLOADS = {
+    "socket_detection": json.dumps({
+        "message_type": "cmd",
+        "content": "socket_detection",
+        "data": {"result": 1, "unit": "m/rad", "coords": [0.41231, -0.02312, 0.11873, 0.0123, 3.1101, -0.0412]}
+    }),
+    "safety_detection": json.dumps({
+        "message_type": "msg",
+        "content": "safety_detection",
+        "data": {"result": 0, "object": {"name": "person", "confidence": 0.8731},
+                 "message": "Foreign object detected: person, 87.31%", "timestamp": 1700000000.123}
+    }),
+    "start_plug_in": json.dumps({"message_type": "cmd", "content": "start_plug_in", "data": {}}),
+}
+
+ROBOT_INFORMATION = {
+    "current_pos": [347.85, 34.5, 491.3, 179.0, -179.9, 179.0],
+    "joint_torque": [0.123456789, -12.3456789, 23.456789, 1.23456789, -0.3456789, 0.056789],
+    "external_torque": [0.0123, -0.2345, 0.3456, -0.0456, 0.0567, -0.0678],
+    "tool_force": [1.2345, -2.3456, 3.4567, -0.4567, 0.5678, -0.6789],
+}
+TEXT_REPLY = str({
+    "current_pos": str((ROBOT_INFORMATION["current_pos"], 2)),
+    "joint_torque": str(ROBOT_INFORMATION["joint_torque"]),
+    "external_torque": str(ROBOT_INFORMATION["external_torque"]),
+    "tool_force": str(ROBOT_INFORMATION["tool_force"]),
+})
+BINARY_REPLY = encode_telemetry(ROBOT_INFORMATION)
+
+def eval_robot_reply(reply):
+    robot_information = eval(reply)
+    robot_information["current_pos"] = eval(robot_information["current_pos"])[0]
+    return robot_information
+
+def run(number):
+    cases = []
+    for name, payload in PAYLOADS.items():
+        cases.append((f"{name}: eval", lambda payload=payload: eval(payload)))
+        cases.append((f"{name}: decode_message", lambda payload=payload: decode_message(payload)))
+    cases.append(("robot reply: eval (old text mode)", lambda: eval_robot_reply(TEXT_REPLY)))
+    cases.append(("robot reply: decode_text_reply", lambda: decode_text_reply(TEXT_REPLY)))
+    cases.append(("robot reply: decode_telemetry (binary)", lambda: decode_telemetry(BINARY_REPLY)))
+
+    print(f"{'case':<45}{'us/call':>10}")
+    for name, function in cases:
+        best = min(timeit.repeat(function, number=number, repeat=5))
+        print(f"{name:<45}{best/number*1e6:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Message decoding benchmark")
+    parser.add_argument("--number", default=20000, type=int, help="calls per measurement")
+    args = parser.parse_args()
+    run(args.number)
@@ -0,0 +1,79 @@
+"""
+Benchmark: recalc_coordinates of data_exploration.ipynb (deep copy of the
+coefficient dict, term by term per row) vs. the Horner evaluation of
+message_server/pose_correction.py, per pose and for a whole N x 6 array
+
+Usage: python -m benchmarks.bench_pose_correction [--rows N] [--degree D] [--number N]
+"""
+import argparse
+import copy
+import timeit
+import numpy as np
+from message_server.pose_correction import PoseCorrection, AXES
+
+ED_NAMES = ["ed_x", "ed_y", "ed_z", "ed_rx", "ed_ry", "ed_rz"]
+
+def recalc_coordinates(coords, coeffs_raw:dict):
+    """
+    Implementation of the notebook, the statsmodels params (pandas Series) as dicts
+    """
+    coeffs = copy.deepcopy(coeffs_raw)
+    new_coords = []
+    for i, x in enumerate(ED_NAMES):
+        rel_coeffs = coeffs[x]
+        rel_coeffs["x0"] = rel_coeffs.pop("const")
+        degree = len(rel_coeffs) - 1  # Degree of the polynomial
+        new_coord = 0
+
+        for d in range(degree + 1):
+            coefficient = rel_coeffs[f'x{d}']
+            new_coord += coefficient * coords[i] ** d
+
+        new_coords.append(new_coord)
+
+    return new_coords
+
+def create_model(degree, rng):
+    """
+    Returns:
+        tuple: (notebook coefficient dict, PoseCorrection)
+    """
+    params = rng.normal(0, 0.1, (AXES, degree+1)) / (10.0 ** np.arange(degree+1)) #small higher order terms
+    params[:, 1] += 1
+    coeff_dict = {
+        name: {"const": axis_params[0], **{f"x{d}": axis_params[d] for d in range(1, degree+1)}}
+        for name, axis_params in zip(ED_NAMES, params.tolist())
+    }
+    return coeff_dict, PoseCorrection.from_params(params)
+
+def run(rows, degree, number):
+    rng = np.random.default_rng(0)
+    coeff_dict, correction = create_model(degree, rng)
+    poses = rng.uniform(-500, 500, (rows, AXES))
+    pose_rows = poses.tolist() #the notebook iterates the rows of a DataFrame
+
+    expected = np.array([recalc_coordinates(row, coeff_dict) for row in pose_rows])
+    assert np.allclose(correction.apply_array(poses), expected), "results differ from the notebook"
+    assert np.allclose(correction.apply(pose_rows[0]), expected[0]), "results differ from the notebook"
+
+    cases = [
+        ("single pose: recalc_coordinates", lambda: recalc_coordinates(pose_rows[0], coeff_dict), 1),
+        ("single pose: PoseCorrection.apply", lambda: correction.apply(pose_rows[0]), 1),
+        (f"{rows} poses: recalc_coordinates per row", lambda: [recalc_coordinates(row, coeff_dict) for row in pose_rows], rows),
+        (f"{rows} poses: PoseCorrection.apply_array", lambda: correction.apply_array(poses), rows),
+    ]
+
+    print(f"degree {degree}")
+    print(f"{'case':<50}{'us/call':>10}{'us/pose':>10}")
+    for name, function, count in cases:
+        calls = max(1, number // count)
+        best = min(timeit.repeat(function, number=calls, repeat=5)) / calls
+        print(f"{name:<50}{best*1e6:>10.2f}{best/count*1e6:>10.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pose correction benchmark")
+    parser.add_argument("--rows", default=10000, type=int, help="poses of the batch cases")
+    parser.add_argument("--degree", default=1, type=int, help="polynomial degree (the notebook fits degree 1)")
+    parser.add_argument("--number", default=20000, type=int, help="poses per measurement")
+    args = parser.parse_args()
+    run(args.rows, args.degree, args.number)
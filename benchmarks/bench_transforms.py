@@ -0,0 +1,74 @@
+"""
+Benchmark: per-detection cost of the previous conversion of a detection
+(convert_coords + element-wise apply_camera_offset of robot_controller.py) vs.
+convert_pose + the cached camera Transform of message_server/transforms.py,
+per detection and for a whole N x 6 array
+
+Usage: python -m benchmarks.bench_transforms [--rows N] [--number N]
+"""
+import argparse
+import math
+import timeit
+import numpy as np
+from message_server.transforms import Transform, convert_pose, to_mm_deg, pose_to_matrix, UNIT_M_RAD
+
+CAMERA_OS = [-82, -6, 55.5, 0, 0, 0] #config.ini
+CAMERA_OS_ROTATED = [-82, -6, 55.5, 0.5, -0.8, 1.2] #with a rotation offset (calibration/rotation_offset.py)
+DETECTION = [0.41231, -0.02312, 0.11873, 0.0123, 3.1101, -0.0412] #m/rad, as sent by the vision client
+
+def convert_coords(unit, coords):
+    """
+    Previous implementation of robot_controller.py
+    """
+    converted_coords = list()
+    if unit == UNIT_M_RAD:
+        converted_coords[0:2] = [x*1000 for x in coords[0:3]]
+        converted_coords[3:5] = [math.degrees(rad) for rad in coords[3:6]]
+    return converted_coords
+
+def apply_camera_offset(coords:list, camera_os:list):
+    """
+    Previous implementation of robot_controller.py
+    """
+    return (np.array(coords)+np.array(camera_os)).tolist()
+
+def run(rows, number):
+    rng = np.random.default_rng(0)
+    detections = np.column_stack([rng.uniform(-0.5, 0.5, (rows, 3)), rng.uniform(-math.pi, math.pi, (rows, 3))])
+    camera = Transform.from_pose(CAMERA_OS)
+    camera_rotated = Transform.from_pose(CAMERA_OS_ROTATED)
+
+    #without rotation offset the result is the same as the element-wise offset
+    expected = apply_camera_offset(convert_coords(UNIT_M_RAD, DETECTION), CAMERA_OS)
+    assert camera.apply(convert_pose(UNIT_M_RAD, DETECTION)) == expected, "results differ from the element-wise offset"
+    #single pose and array evaluation are the same composition of homogeneous matrices
+    poses = to_mm_deg(detections)
+    composed = camera_rotated.matrix @ pose_to_matrix(poses)
+    single = np.array([camera_rotated.apply(pose) for pose in poses.tolist()])
+    assert np.allclose(pose_to_matrix(single), composed), "single pose result differs from the matrix product"
+    assert np.allclose(pose_to_matrix(camera_rotated.apply_array(poses)), composed), "array result differs from the matrix product"
+
+    cases = [
+        ("detection: convert_coords + apply_camera_offset",
+         lambda: apply_camera_offset(convert_coords(UNIT_M_RAD, DETECTION), CAMERA_OS), 1),
+        ("detection: convert_pose + Transform.apply", lambda: camera.apply(convert_pose(UNIT_M_RAD, DETECTION)), 1),
+        ("detection: convert_pose + Transform.apply (rotated)",
+         lambda: camera_rotated.apply(convert_pose(UNIT_M_RAD, DETECTION)), 1),
+        (f"{rows} detections: Transform.apply per row",
+         lambda: [camera_rotated.apply(convert_pose(UNIT_M_RAD, row)) for row in detections.tolist()], rows),
+        (f"{rows} detections: to_mm_deg + Transform.apply_array",
+         lambda: camera_rotated.apply_array(to_mm_deg(detections)), rows),
+    ]
+
+    print(f"{'case':<60}{'us/call':>10}{'us/pose':>10}")
+    for name, function, count in cases:
+        calls = max(1, number // count)
+        best = min(timeit.repeat(function, number=calls, repeat=5)) / calls
+        print(f"{name:<60}{best*1e6:>10.2f}{best/count*1e6:>10.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Camera transform benchmark")
+    parser.add_argument("--rows", default=10000, type=int, help="detections of the batch cases")
+    parser.add_argument("--number", default=20000, type=int, help="detections per measurement")
+    args = parser.parse_args()
+    run(args.rows, args.number)
@@ -0,0 +1,199 @@
+"""
+Headless intrinsics calibration of the camera from chessboard images
+(the pipeline of calibration.ipynb without windows).
+
+Every image is thresholded and median-filtered with OpenCV and the chessboard
+corners are searched with cv2.findChessboardCornersSB in a process pool. The
+corners of every image are cached by the hash of the file (and the detection
+parameters), so adding images to the folder only processes the new ones.
+cv2.calibrateCamera then computes the camera matrix and distortion coefficients,
+which are saved as JSON (message_server/camera_intrinsics.py), set
+[CAMERA] intrinsics in config.ini to load them in the server.
+
+Usage:
+    python -m calibration.intrinsics [--images calibration_images] [--output models/camera_intrinsics.json]
+        [--board 15 10] [--threshold 80] [--median 9] [--workers N] [--no-cache]
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from message_server.camera_intrinsics import CameraIntrinsics, DEFAULT_INTRINSICS_PATH
+
+DEFAULT_IMAGE_DIR = "calibration_images"
+CACHE_NAME = ".corners_cache.json" #in the image folder
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+DEFAULT_BOARD_SIZE = (15, 10) #inner corners per row and column
+DEFAULT_THRESHOLD = 80
+DEFAULT_MEDIAN_SIZE = 9 #0 to disable the median filter
+DEFAULT_SQUARE_SIZE = 1.0 #only scales the extrinsics, not the intrinsics
+HASH_BLOCK_SIZE = 1024*1024
+
+FIELD_PARAMETERS = "parameters"
+FIELD_IMAGES = "images"
+FIELD_NAME = "name"
+FIELD_SIZE = "size"
+FIELD_CORNERS = "corners"
+
+def list_images(folder):
+    """
+    Returns:
+        list: image files of the folder, sorted by name
+    """
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+def file_hash(path):
+    """
+    Returns:
+        str: sha1 of the file content
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def preprocess(image, threshold=DEFAULT_THRESHOLD, median_size=DEFAULT_MEDIAN_SIZE):
+    """
+    Binary threshold and median filter of a grayscale image
+    (the notebook filtered through PIL, ImageFilter.MedianFilter(9) is the same 9x9 median)
+    """
+    image = cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY)[1]
+    if median_size:
+        image = cv2.medianBlur(image, median_size)
+    return image
+
+def detect_corners(path, board_size=DEFAULT_BOARD_SIZE, threshold=DEFAULT_THRESHOLD, median_size=DEFAULT_MEDIAN_SIZE):
+    """
+    Chessboard corners of one image, runs in the worker processes
+
+    Returns:
+        tuple: (image size (width, height), corners as N x 2 list or None if the board was not found)
+    """
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Image {path} could not be read")
+    found, corners = cv2.findChessboardCornersSB(preprocess(image, threshold, median_size), tuple(board_size), None)
+    size = image.shape[::-1]
+    return size, corners.reshape(-1, 2).tolist() if found else None
+
+def _init_worker():
+    #one OpenCV thread per process, the pool already uses all cores
+    cv2.setNumThreads(1)
+
+def load_cache(path, parameters):
+    """
+    Returns:
+        dict: cached detections by file hash, empty if the detection parameters changed
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        cache = json.load(file)
+    if cache.get(FIELD_PARAMETERS) != parameters:
+        return {}
+    return cache[FIELD_IMAGES]
+
+def save_cache(path, parameters, detections):
+    with open(path, "w") as file:
+        json.dump({FIELD_PARAMETERS: parameters, FIELD_IMAGES: detections}, file)
+
+def find_corners(paths, board_size=DEFAULT_BOARD_SIZE, threshold=DEFAULT_THRESHOLD, median_size=DEFAULT_MEDIAN_SIZE,
+                 workers=None, cache_path=None):
+    """
+    Chessboard corners of all images, only uncached images are processed
+
+    Args:
+        paths (list): image files
+        workers (int): processes of the pool (default: cpu count)
+        cache_path (str): corner cache file, None to disable the cache
+
+    Returns:
+        tuple: (detections {hash: {name, size, corners}} of the images, amount of processed images)
+    """
+    parameters = {"board_size": list(board_size), "threshold": threshold, "median_size": median_size}
+    cache = load_cache(cache_path, parameters) if cache_path else {}
+    hashes = [file_hash(path) for path in paths]
+    missing = {image_hash: path for path, image_hash in zip(paths, hashes) if image_hash not in cache}
+
+    if missing:
+        detect = functools.partial(detect_corners, board_size=board_size, threshold=threshold, median_size=median_size)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            for (image_hash, path), (size, corners) in zip(missing.items(), executor.map(detect, missing.values())):
+                cache[image_hash] = {FIELD_NAME: os.path.basename(path), FIELD_SIZE: list(size), FIELD_CORNERS: corners}
+        if cache_path:
+            save_cache(cache_path, parameters, cache)
+    return {image_hash: cache[image_hash] for image_hash in hashes}, len(missing)
+
+def board_points(board_size=DEFAULT_BOARD_SIZE, square_size=DEFAULT_SQUARE_SIZE):
+    """
+    Returns:
+        np.ndarray: object points (0,0,0), (1,0,0), ... of the chessboard corners
+    """
+    columns, rows = board_size
+    points = np.zeros((rows * columns, 3), np.float32)
+    points[:, :2] = np.mgrid[0:columns, 0:rows].T.reshape(-1, 2) * square_size
+    return points
+
+def calibrate(detections, board_size=DEFAULT_BOARD_SIZE, square_size=DEFAULT_SQUARE_SIZE):
+    """
+    Calibrate the camera with the images the board was found in
+
+    Args:
+        detections (list): detections {name, size, corners} of find_corners
+
+    Returns:
+        CameraIntrinsics
+    """
+    found = [detection for detection in detections if detection[FIELD_CORNERS] is not None]
+    if not found:
+        raise ValueError("The chessboard was not found in any image")
+    sizes = {tuple(detection[FIELD_SIZE]) for detection in found}
+    if len(sizes) > 1:
+        raise ValueError(f"All images must have the same size, found {sorted(sizes)}")
+    image_size = sizes.pop()
+
+    object_points = board_points(board_size, square_size)
+    image_points = [np.asarray(detection[FIELD_CORNERS], dtype=np.float32).reshape(-1, 1, 2) for detection in found]
+    rms, camera_matrix, distortion, _, _ = cv2.calibrateCamera(
+        [object_points]*len(image_points), image_points, image_size, None, None)
+    return CameraIntrinsics(camera_matrix, distortion, image_size, float(rms), {
+        "board_size": list(board_size),
+        "square_size": square_size,
+        "images": [detection[FIELD_NAME] for detection in found],
+    })
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intrinsics calibration of the camera")
+    parser.add_argument("--images", default=DEFAULT_IMAGE_DIR, help="folder with the chessboard images")
+    parser.add_argument("--output", default=DEFAULT_INTRINSICS_PATH, help="json file of the calibration")
+    parser.add_argument("--board", default=DEFAULT_BOARD_SIZE, type=int, nargs=2, help="inner corners per row and column")
+    parser.add_argument("--square-size", default=DEFAULT_SQUARE_SIZE, type=float, help="size of a square (unit of the extrinsics)")
+    parser.add_argument("--threshold", default=DEFAULT_THRESHOLD, type=int, help="binary threshold of the images")
+    parser.add_argument("--median", default=DEFAULT_MEDIAN_SIZE, type=int, help="median filter size (odd), 0 to disable")
+    parser.add_argument("--workers", default=None, type=int, help="processes (default: cpu count)")
+    parser.add_argument("--no-cache", action="store_true", help="process all images again")
+    args = parser.parse_args()
+
+    paths = list_images(args.images)
+    cache_path = None if args.no_cache else os.path.join(args.images, CACHE_NAME)
+    start = time.perf_counter()
+    detections, processed = find_corners(paths, args.board, args.threshold, args.median, args.workers, cache_path)
+    print(f"{len(paths)} images, {processed} processed in {time.perf_counter() - start:.2f}s "
+          f"({len(paths) - processed} cached)")
+    for detection in detections.values():
+        print(f"{detection[FIELD_NAME]}: {'found' if detection[FIELD_CORNERS] is not None else 'not found'}")
+
+    intrinsics = calibrate(list(detections.values()), args.board, args.square_size)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    intrinsics.save(args.output)
+    print(f"Camera matrix:\n{intrinsics.camera_matrix}")
+    print(f"Distortion coefficients:\n{intrinsics.distortion}")
+    print(f"RMS reprojection error: {intrinsics.rms:.4f}px, {len(intrinsics.metadata['images'])} images")
+    print(f"Written to {args.output}")
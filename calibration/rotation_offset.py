@@ -0,0 +1,243 @@
+"""
+Search of the rotation offset of the camera (rs_x, rs_y, rs_z in degrees):
+the rotation of the estimated socket distances (ed_x, ed_y, ed_z) that best
+matches the actual distances (ad_x, ad_y, ad_z) of the increment recordings
+(see data_exploration.ipynb).
+
+The costs only depend on a few 3x3 sums of the samples, so the rotation
+matrices of the grid are built in batches (chunks of grid points) and all
+costs are evaluated with broadcasting against these sums; the best grid point
+is then refined with finer grids around it. The result is written as rotation part
+of the camera offset ([CAMERA] os), the translation is kept. The search uses
+rotations around x, y, z (Rz @ Ry @ Rx, small angles around 0), the offset is
+written in the Doosan ZYZ angles of the poses (see message_server/transforms.py).
+
+Usage:
+    python -m calibration.rotation_offset --data data/x-increments.csv data/y-increments.csv data/z-increments.csv
+        [--range 2.5] [--steps 25] [--criterion residual|notebook] [--config config.ini] [--write]
+"""
+import argparse
+import ast
+import re
+import time
+import numpy as np
+from message_server.globalconfig import GlobalConfig
+from message_server.transforms import matrix_to_zyz
+
+ED_NAMES = ("ed_x", "ed_y", "ed_z")
+AD_NAMES = ("ad_x", "ad_y", "ad_z")
+CSV_HEADER_ROWS = 5 #rows before the column names in the recorded csv files
+CAMERA_SECTION = "CAMERA"
+CAMERA_OFFSET_KEY = "os"
+
+CRITERION_RESIDUAL = "residual"
+CRITERION_NOTEBOOK = "notebook"
+
+DEFAULT_RANGE = 2.5 #degrees
+DEFAULT_STEPS = 25
+DEFAULT_CHUNK_SIZE = 2**16 #rotations per chunk
+REFINE_STEPS = 11
+REFINE_FACTOR = 5 #step reduction per refinement
+DEFAULT_TOLERANCE = 1e-4 #degrees
+
+def load_increments(paths):
+    """
+    Load the estimated and actual distances of the recorded csv files
+
+    Returns:
+        tuple: (estimated, actual) as N x 3 arrays in mm
+    """
+    estimated = []
+    actual = []
+    for path in paths:
+        data = np.genfromtxt(path, delimiter=",", names=True, skip_header=CSV_HEADER_ROWS,
+                             dtype=None, encoding=None)
+        estimated.append(np.column_stack([data[name] for name in ED_NAMES]).astype(np.float64))
+        actual.append(np.column_stack([data[name] for name in AD_NAMES]).astype(np.float64))
+    return np.concatenate(estimated), np.concatenate(actual)
+
+def rotation_matrices(angles):
+    """
+    Rotation matrices Rz @ Ry @ Rx for many angle triples at once
+
+    Args:
+        angles (array): G x 3 rotations around x, y, z in degrees
+
+    Returns:
+        np.ndarray: G x 3 x 3
+    """
+    rx, ry, rz = np.radians(np.asarray(angles, dtype=np.float64)).T
+    cx, sx = np.cos(rx), np.sin(rx)
+    cy, sy = np.cos(ry), np.sin(ry)
+    cz, sz = np.cos(rz), np.sin(rz)
+    return np.stack([
+        np.stack([cz*cy, cz*sy*sx - sz*cx, cz*sy*cx + sz*sx], axis=-1),
+        np.stack([sz*cy, sz*sy*sx + cz*cx, sz*sy*cx - cz*sx], axis=-1),
+        np.stack([-sy, cy*sx, cy*cx], axis=-1),
+    ], axis=-2)
+
+def angle_grid(center, half_range, steps):
+    """
+    Returns:
+        np.ndarray: steps^3 x 3 angle triples around the center
+    """
+    offsets = np.linspace(-half_range, half_range, steps)
+    axes = [center[axis] + offsets for axis in range(3)]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+
+class IncrementStatistics:
+    """
+    Sums of the samples the costs depend on, so a rotation is evaluated
+    with 3x3 products instead of rotating every sample
+
+    Args:
+        estimated (array): N x 3
+        actual (array): N x 3
+    """
+
+    def __init__(self, estimated, actual):
+        self.count = len(estimated)
+        self.squared_norms = np.sum(estimated**2) + np.sum(actual**2)
+        self.cross = estimated.T @ actual #[j,i]: sum of e_j * a_i
+        self.estimated_mean = estimated.mean(axis=0)
+        self.actual_mean = actual.mean(axis=0)
+        estimated_centered = estimated - self.estimated_mean
+        self.cross_centered = estimated_centered.T @ (actual - self.actual_mean)
+        self.scatter = estimated_centered.T @ estimated_centered
+
+def residual_costs(matrices, statistics:IncrementStatistics):
+    """
+    Mean squared distance between rotated estimates and actual distances:
+    |R e - a|^2 = |e|^2 + |a|^2 - 2 a.(R e), as rotations keep the length
+
+    Args:
+        matrices (array): C x 3 x 3
+    """
+    alignment = np.einsum("cij,ji->c", matrices, statistics.cross)
+    return (statistics.squared_norms - 2*alignment) / statistics.count
+
+def notebook_costs(matrices, statistics:IncrementStatistics):
+    """
+    Criterion of data_exploration.ipynb: per axis a degree 1 fit actual ~ rotated estimate,
+    the cost is the sum of the absolute means of intercept and slope
+    """
+    covariance = np.einsum("cij,ji->ci", matrices, statistics.cross_centered)
+    variance = np.einsum("cij,jk,cik->ci", matrices, statistics.scatter, matrices)
+    slope = covariance / variance
+    intercept = statistics.actual_mean - slope * (matrices @ statistics.estimated_mean)
+    return np.sum(np.abs((intercept + slope) / 2), axis=-1)
+
+COST_FUNCTIONS = {
+    CRITERION_RESIDUAL: residual_costs,
+    CRITERION_NOTEBOOK: notebook_costs,
+}
+
+def evaluate(angles, statistics:IncrementStatistics, criterion=CRITERION_RESIDUAL, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Cost of every rotation, the rotation matrices are built per chunk of grid points to bound the memory
+
+    Args:
+        angles (array): G x 3 in degrees
+
+    Returns:
+        np.ndarray: G costs
+    """
+    cost_function = COST_FUNCTIONS[criterion]
+    costs = np.empty(len(angles))
+    for start in range(0, len(angles), chunk_size):
+        costs[start:start+chunk_size] = cost_function(rotation_matrices(angles[start:start+chunk_size]), statistics)
+    return costs
+
+def search(estimated, actual, half_range=DEFAULT_RANGE, steps=DEFAULT_STEPS, criterion=CRITERION_RESIDUAL,
+           tolerance=DEFAULT_TOLERANCE, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Grid search of the rotation offset followed by coarse-to-fine refinement
+
+    Returns:
+        tuple: (angles [rs_x, rs_y, rs_z] in degrees, cost, evaluated rotations)
+    """
+    statistics = IncrementStatistics(estimated, actual)
+    angles = angle_grid(np.zeros(3), half_range, steps)
+    costs = evaluate(angles, statistics, criterion, chunk_size)
+    best = int(np.argmin(costs))
+    best_angles, best_cost = angles[best], costs[best]
+    evaluations = len(angles)
+
+    #refine around the best point, the new grid covers one step of the previous grid in every direction
+    step = 2 * half_range / (steps - 1) if steps > 1 else half_range
+    while step > tolerance:
+        angles = angle_grid(best_angles, step, REFINE_STEPS)
+        costs = evaluate(angles, statistics, criterion, chunk_size)
+        evaluations += len(angles)
+        best = int(np.argmin(costs))
+        if costs[best] <= best_cost:
+            best_angles, best_cost = angles[best], costs[best]
+        step /= REFINE_FACTOR
+    return best_angles, float(best_cost), evaluations
+
+def camera_offset_with_rotation(camera_os, angles):
+    """
+    Args:
+        camera_os (list): current camera offset [x,y,z,rx,ry,rz], rotation in ZYZ angles
+        angles (list): searched rotation [rs_x, rs_y, rs_z] (Rz @ Ry @ Rx)
+
+    Returns:
+        list: camera offset with the rotation part replaced by the searched rotation in ZYZ angles
+    """
+    zyz = matrix_to_zyz(rotation_matrices(angles), np.asarray(camera_os[3:6], dtype=np.float64))
+    return list(camera_os[:3]) + [round(float(angle), 4) for angle in zyz]
+
+def write_camera_offset(path, camera_os):
+    """
+    Replace the 'os' line of the [CAMERA] section, the rest of the file (comments) is kept
+
+    Args:
+        path (str): config file
+        camera_os (list): [x,y,z,rx,ry,rz]
+    """
+    with open(path) as file:
+        lines = file.readlines()
+    section = None
+    for i, line in enumerate(lines):
+        header = re.match(r"\s*\[(.+)\]", line)
+        if header:
+            section = header.group(1)
+        elif section == CAMERA_SECTION and re.match(rf"\s*{CAMERA_OFFSET_KEY}\s*[=:]", line):
+            lines[i] = f"{CAMERA_OFFSET_KEY} = {camera_os}\n"
+            break
+    else:
+        raise KeyError(f"'{CAMERA_OFFSET_KEY}' not found in the [{CAMERA_SECTION}] section of {path}")
+    with open(path, "w") as file:
+        file.writelines(lines)
+
+def read_camera_offset(path):
+    """
+    Returns:
+        list: [CAMERA] os of the config file
+    """
+    return ast.literal_eval(GlobalConfig(path)[CAMERA_SECTION, CAMERA_OFFSET_KEY])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rotation offset search of the camera")
+    parser.add_argument("--data", nargs="+", required=True, help="increment csv files with ed_* and ad_* columns")
+    parser.add_argument("--range", default=DEFAULT_RANGE, type=float, help="searched rotation in +-degrees per axis")
+    parser.add_argument("--steps", default=DEFAULT_STEPS, type=int, help="grid points per axis")
+    parser.add_argument("--criterion", default=CRITERION_RESIDUAL, choices=list(COST_FUNCTIONS),
+                        help="residual: mean squared distance, notebook: criterion of data_exploration.ipynb")
+    parser.add_argument("--tolerance", default=DEFAULT_TOLERANCE, type=float, help="final step in degrees")
+    parser.add_argument("--config", default="config.ini", help="config with the current camera offset")
+    parser.add_argument("--write", action="store_true", help="write the result into the config")
+    args = parser.parse_args()
+
+    estimated, actual = load_increments(args.data)
+    start = time.perf_counter()
+    angles, cost, evaluations = search(estimated, actual, args.range, args.steps, args.criterion, args.tolerance)
+    duration = time.perf_counter() - start
+
+    camera_os = camera_offset_with_rotation(read_camera_offset(args.config), angles)
+    print(f"{len(estimated)} samples, {evaluations} rotations evaluated in {duration:.2f}s")
+    print(f"rs_x, rs_y, rs_z: {np.round(angles, 4).tolist()} ({args.criterion} cost {cost:.6g})")
+    print(f"[{CAMERA_SECTION}]\n{CAMERA_OFFSET_KEY} = {camera_os}")
+    if args.write:
+        write_camera_offset(args.config, camera_os)
+        print(f"Written to {args.config}")
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import socketio
+from aiohttp import web
+from message_server.settings import Settings
+from message_server.roc_logging import setup_logging, stop_logging, get_logger
+from message_server.server import Server, CMD
+from message_server.metrics import registry, CONTENT_TYPE, CLIENTS, QUEUE_DEPTH
+
+QUEUE_COMMAND = "command"
+QUEUE_MESSAGE = "message"
+
+class AsyncServer(Server):
+    """
+    This class implements the server on asyncio (python-socketio + aiohttp)
+    instead of Flask.
+
+    Robot commands block on the robot socket, so they are executed in a single
+    worker thread (which keeps their order). Messages - most importantly the
+    safety detections - run in their own worker, so they are not queued behind
+    the command that is currently executed. Telemetry requests are answered
+    directly on the event loop.
+
+    The stop itself only bypasses a running command or batch with [ROBOT] control_port.
+    Without the control connection it is sent on the robot socket and waits for the
+    robot lock, i.e. until the running command or batch finished.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+        self.command_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="robot-command")
+        self.message_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="message")
+        #file writes (trace export) must not delay safety messages on the message worker
+        self.export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        QUEUE_DEPTH.set(0, QUEUE_COMMAND)
+        QUEUE_DEPTH.set(0, QUEUE_MESSAGE)
+
+    def start(self, settings: Settings):
+        """
+        This method sets up the asyncio server using the
+        settings loaded from the config (default: config.ini)
+
+        Args:
+            settings (Settings)
+        """
+        setup_logging(settings.logging)
+        get_logger(__name__).log(
+            100,
+            "Asyncio server starting..."
+        )
+        if settings.robot.control_port is None:
+            get_logger(__name__).log(logging.WARNING,
+                                     "No [ROBOT] control_port configured, safety stops wait for the running robot command")
+
+        self.socketio = socketio.AsyncServer(async_mode="aiohttp")
+        self.server = web.Application()
+        self.socketio.attach(self.server)
+
+        host = settings.server.host
+        port = settings.server.port
+
+        self.setup(settings)
+
+        @self.socketio.on("message_output")
+        async def receive_message(sid, message):
+            """
+            Dispatches the message to the command or message worker
+            """
+            message_raw = self.parse_message(message)
+            if message_raw is None:
+                return
+            if message_raw.message_type == CMD:
+                await self.run_in_worker(QUEUE_COMMAND, self.command_executor, self.process_message, message_raw)
+            else:
+                await self.run_in_worker(QUEUE_MESSAGE, self.message_executor, self.process_message, message_raw)
+
+        @self.socketio.on("telemetry")
+        async def get_telemetry(sid, request_data=None):
+            return self.get_telemetry(request_data)
+
+        @self.socketio.on("export_trace")
+        async def export_trace(sid, request_data=None):
+            return await self.loop.run_in_executor(self.export_executor, self.export_trace, request_data)
+
+        @self.socketio.on("connect")
+        async def handle_connect(sid, environ):
+            CLIENTS.inc()
+            get_logger(__name__).log(logging.INFO,
+                                     "Client connected from IP: %s", environ.get("REMOTE_ADDR"))
+
+        @self.socketio.on("disconnect")
+        async def handle_disconnect(sid):
+            CLIENTS.dec()
+            get_logger(__name__).log(logging.INFO,
+                                     "Client %s disconnected", sid)
+
+        async def metrics(request):
+            #prometheus content type has a version parameter, which aiohttp does not accept in content_type
+            return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+        self.server.router.add_get("/metrics", metrics)
+
+        async def on_startup(app):
+            self.loop = asyncio.get_running_loop()
+
+        self.server.on_startup.append(on_startup)
+
+        try:
+            web.run_app(self.server, host=host, port=port)
+
+        except Exception as e:
+            get_logger(__name__).error(e)
+            raise
+        finally:
+            self.command_executor.shutdown(wait=False)
+            self.message_executor.shutdown(wait=False)
+            self.export_executor.shutdown(wait=False)
+            self.shutdown()
+            get_logger(__name__).log(
+                100,
+                "Asyncio server shutting down"
+            )
+            stop_logging()
+
+    async def run_in_worker(self, queue, executor, function, *args):
+        """
+        Run the function on a worker, counted in the queue depth until it finished
+
+        Args:
+            queue (str): QUEUE_COMMAND or QUEUE_MESSAGE
+            executor (ThreadPoolExecutor): worker of the queue
+        """
+        QUEUE_DEPTH.inc(queue)
+        future = self.loop.run_in_executor(executor, function, *args)
+        future.add_done_callback(lambda _: QUEUE_DEPTH.dec(queue))
+        return await future
+
+    def send_message(self, client, message):
+        """
+        Emits a message to the clients, can be called from the worker threads
+        """
+        asyncio.run_coroutine_threadsafe(self.socketio.emit(client, message), self.loop)
+
+        get_logger(__name__).log(logging.INFO,
+                                 "Sent message %s to client %s", message, client)
@@ -0,0 +1,69 @@
+"""
+Intrinsics of the camera (camera matrix and distortion coefficients) from the
+chessboard calibration (calibration/intrinsics.py, previously calibration.ipynb).
+
+The calibration is stored as JSON so the server and the vision tooling can load
+it without OpenCV:
+    {"camera_matrix": 3x3, "distortion": [k1, k2, p1, p2, k3, ...],
+     "image_size": [width, height], "rms": reprojection error in pixels, ...}
+"""
+import json
+import numpy as np
+
+FIELD_CAMERA_MATRIX = "camera_matrix"
+FIELD_DISTORTION = "distortion"
+FIELD_IMAGE_SIZE = "image_size"
+FIELD_RMS = "rms"
+DEFAULT_INTRINSICS_PATH = "models/camera_intrinsics.json"
+
+class CameraIntrinsics:
+    """
+    Camera matrix and distortion coefficients of the calibrated camera
+
+    Args:
+        camera_matrix (array): 3x3
+        distortion (array): distortion coefficients as returned by cv2.calibrateCamera
+        image_size (tuple): (width, height) of the calibration images
+        rms (float): reprojection error of the calibration in pixels
+        metadata (dict): additional information of the calibration (board, images, ...)
+    """
+
+    def __init__(self, camera_matrix, distortion, image_size, rms=None, metadata=None):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        if self.camera_matrix.shape != (3, 3):
+            raise ValueError(f"Camera matrix must have the shape (3, 3), not {self.camera_matrix.shape}")
+        self.distortion = np.asarray(distortion, dtype=np.float64).ravel()
+        self.image_size = tuple(int(value) for value in image_size)
+        self.rms = rms
+        self.metadata = metadata or {}
+
+    @property
+    def focal_length(self):
+        return float(self.camera_matrix[0, 0]), float(self.camera_matrix[1, 1])
+
+    @property
+    def principal_point(self):
+        return float(self.camera_matrix[0, 2]), float(self.camera_matrix[1, 2])
+
+    @classmethod
+    def load(cls, path:str):
+        with open(path) as file:
+            data = json.load(file)
+        return cls(
+            data.pop(FIELD_CAMERA_MATRIX),
+            data.pop(FIELD_DISTORTION),
+            data.pop(FIELD_IMAGE_SIZE),
+            data.pop(FIELD_RMS, None),
+            data
+        )
+
+    def save(self, path:str):
+        data = {
+            FIELD_CAMERA_MATRIX: self.camera_matrix.tolist(),
+            FIELD_DISTORTION: self.distortion.tolist(),
+            FIELD_IMAGE_SIZE: list(self.image_size),
+            FIELD_RMS: self.rms,
+            **self.metadata
+        }
+        with open(path, "w") as file:
+            json.dump(data, file, indent=2)
@@ -8,7 +8,7 @@ class GlobalConfig:
     configContent = None
 
     def __init__(self, config_file):
-        self.fileFound = config_file
+        self.fileFound = False
         # check if file exists, if not mark as not found
         path = Path(config_file)
         if path.is_file():
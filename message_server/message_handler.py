@@ -1,7 +1,18 @@
 import logging
 import socket
+import threading
+import time
 from message_server.robot_controller import RobotController
 from message_server.roc_logging import get_logger
+from message_server.safety_latency import SafetyLatencyRecorder
+from message_server.tracing import get_tracer, span
+from message_server.metrics import (COMMANDS, MESSAGES, COMMANDS_REJECTED, DETECTION_RESULTS,
+                                    ROBOT_ROUNDTRIP, ROBOT_PENDING)
+from message_server.robot_protocol import (PROTOCOL_TEXT, PROTOCOL_BINARY, MSG_COMMAND, MSG_REPLY,
+                                           MSG_BATCH, MSG_BATCH_REPLY, encode_batch, decode_batch_reply,
+                                           ACK_MODE_FIXED_WAIT, ACK_MODE_COMPLETION, ACK_NONE,
+                                           FLAG_COMPLETION_ACK, ProtocolError, BatchInterrupted, send_frame, recv_frame,
+                                           encode_command, decode_telemetry, decode_text_reply)
 
 CMD_RESET_PLUG_IN = "reset_plug_in"
 CMD_SOCKET_DET = "socket_detection"
@@ -19,6 +30,16 @@ RES_START = 1
 RES_END = 2
 RES_FOREIGN = 0
 
+#metric labels
+COMMAND_NAMES = (CMD_RESET_PLUG_IN, CMD_SOCKET_DET, CMD_PLUG_IN, CMD_UNPLUG, CMD_COLLECT_DATA)
+MESSAGE_NAMES = (MSG_SAFETY, MSG_CONTAINER_DOWN)
+LABEL_UNKNOWN = "unknown"
+DETECTION_RESULT_NAMES = {RES_FAIL: "fail", RES_SUCCESS: "success", RES_UNRELIABLE: "unreliable"}
+SAFETY_RESULT_NAMES = {RES_FOREIGN: "foreign_object", RES_START: "start", RES_END: "end"}
+RT_COMMAND = "command"
+RT_BATCH = "batch"
+RT_STOP = "stop"
+
 TGT_ROBOT = "message_robot"
 TGT_INPUT = "message_input"
 TGT_SAFETY = "message_safety"
@@ -29,6 +50,7 @@ FIELD_UNIT = "unit"
 FIELD_COORDS = "coords"
 FIELD_RESULT = "result"
 FIELD_MESSAGE = "message"
+CLIENT_WAIT_TARGETS = (TGT_TAKE_IMAGE, TGT_INPUT) #the client continues the cycle after these messages
 
 class MessageHandler():
     """
@@ -37,20 +59,51 @@ class MessageHandler():
 
     """
 
-    def __init__(self, server, robot_controller:RobotController):
+    def __init__(self, server, robot_controller:RobotController, protocol=PROTOCOL_TEXT, ack_mode=ACK_MODE_FIXED_WAIT, control_port=None):
         self.server = server
         self.robot_controller = robot_controller
         self.robot_controller.message_handler = self
         self.collect_data = False
+        self.recorder = None #TelemetryRecorder, set if telemetry recording is enabled
+        self.command_count = 0 #id of the last robot command with a reply
+        if protocol not in (PROTOCOL_TEXT, PROTOCOL_BINARY):
+            raise ValueError(f"Unknown robot protocol {protocol}")
+        self.protocol = protocol
+        if ack_mode not in (ACK_MODE_FIXED_WAIT, ACK_MODE_COMPLETION):
+            raise ValueError(f"Unknown acknowledgement mode {ack_mode}")
+        if ack_mode == ACK_MODE_COMPLETION and protocol != PROTOCOL_BINARY:
+            get_logger(__name__).log(logging.WARNING,
+                                     "Acknowledgement mode %s requires the binary protocol, using %s", ack_mode, ACK_MODE_FIXED_WAIT)
+            ack_mode = ACK_MODE_FIXED_WAIT
+        self.ack_mode = ack_mode
         self.robot_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.robot_lock = threading.Lock() #one request/reply exchange on the robot socket at a time
         self.robot_socket.settimeout(60)
         try:
             self.robot_socket.connect((self.robot_controller.ip, int(self.robot_controller.port)))
             get_logger(__name__).log(logging.INFO,
-                                     f"Connection to robot socket established")
+                                     "Connection to robot socket established")
         except Exception as e:
             get_logger(__name__).log(logging.ERROR,
-                                     f"Error in establishing connection to socket {e}")
+                                     "Error in establishing connection to socket %s", e)
+
+        #high-priority control connection for stops, independent of the command socket
+        self.control_socket = None
+        self.control_lock = threading.Lock()
+        self.safety_latency = SafetyLatencyRecorder()
+        if control_port:
+            if protocol != PROTOCOL_BINARY:
+                get_logger(__name__).log(logging.WARNING,
+                                         "Control connection requires the binary protocol, stops use the command socket")
+            else:
+                try:
+                    self.control_socket = socket.create_connection((self.robot_controller.ip, int(control_port)), timeout=10)
+                    get_logger(__name__).log(logging.INFO,
+                                             "Connection to robot control socket established")
+                except Exception as e:
+                    self.control_socket = None
+                    get_logger(__name__).log(logging.ERROR,
+                                             "Error in establishing connection to control socket %s", e)
 
 
     def handle_command(self, command, data):
@@ -60,34 +113,28 @@ class MessageHandler():
 
         Args:
             command (str)
-            data (dict)
+            data (SocketDetection/ResetPlugIn/dict): decoded message data
         """
+        COMMANDS.inc(command if command in COMMAND_NAMES else LABEL_UNKNOWN)
 
         if command == CMD_RESET_PLUG_IN or command == CMD_UNPLUG or not self.robot_controller.safety_stop:
             get_logger(__name__).log(
             logging.INFO,
-            f"Executing command {command} starting"
+            "Executing command %s starting", command
             )
             if command == CMD_RESET_PLUG_IN:
                 self.robot_controller.move_home(False) 
-                if FIELD_TARGET in data:
-                    target = eval(data)[FIELD_TARGET]
-                    self.robot_controller.front_socket_position = self.robot_controller.fsp_list[target]
+                if data.target is not None:
+                    self.robot_controller.front_socket_position = self.robot_controller.fsp_list[data.target]
                 self.send_message(TGT_SAFETY,"start_detection")
                 self.send_message(TGT_TAKE_IMAGE,"take image")
             elif command == CMD_SOCKET_DET:
-                if data[FIELD_RESULT] == RES_SUCCESS:
-                    try:
-                        unit = data[FIELD_UNIT]
-                    except KeyError:
-                        raise Exception("'Unit' not in data")
-                    try:
-                        coords = data[FIELD_COORDS]
-                    except KeyError:
-                        raise Exception("'Coords' not in data")
-                    self.robot_controller.socket_detection(unit, coords)
+                #unit and coords are validated by the message decoder
+                DETECTION_RESULTS.inc(CMD_SOCKET_DET, DETECTION_RESULT_NAMES[data.result])
+                if data.result == RES_SUCCESS:
+                    self.robot_controller.socket_detection(data.unit, data.coords)
                 
-                elif data[FIELD_RESULT] == RES_FAIL or data[FIELD_RESULT] == RES_UNRELIABLE:
+                elif data.result == RES_FAIL or data.result == RES_UNRELIABLE:
                     self.robot_controller.reposition_eoat(data)
             
             elif command == CMD_PLUG_IN:
@@ -102,17 +149,18 @@ class MessageHandler():
             else:
                 get_logger(__name__).log(
                     logging.WARNING,
-                    f"Unknown robot command"
+                    "Unknown robot command %s", command
                 )
             
             get_logger(__name__).log(
                 logging.INFO,
-                f"Executing command {command} finished"
+                "Executing command %s finished", command
             )
         else:
+            COMMANDS_REJECTED.inc(command if command in COMMAND_NAMES else LABEL_UNKNOWN)
             get_logger(__name__).log(
                 logging.WARNING,
-                f"No execution of command {command} due to safety stop"
+                "No execution of command %s due to safety stop", command
             )
     
     def handle_message(self, content, message):
@@ -122,36 +170,37 @@ class MessageHandler():
 
         Args:
             content (str):
-            message (dict)
+            message (SafetyDetection/dict): decoded message data
         """
+        MESSAGES.inc(content if content in MESSAGE_NAMES else LABEL_UNKNOWN)
+        if content == MSG_SAFETY:
+            DETECTION_RESULTS.inc(MSG_SAFETY, SAFETY_RESULT_NAMES[message.result])
+
         if content == MSG_CONTAINER_DOWN:
             get_logger(__name__).log(
                 logging.WARNING,
-                f"{message}"
+                "%s", message
             )
         elif content == MSG_SAFETY:
-            if FIELD_RESULT not in message:
-                get_logger(__name__).log(
-                    logging.WARNING,
-                    f"Unknown result from safety-system: {message}"
-                )
-            if message[FIELD_RESULT] == RES_START or message[FIELD_RESULT] == RES_END:
+            if message.result == RES_START or message.result == RES_END:
                 get_logger(__name__).log(
                     logging.INFO,
-                    "Safety-system: "+ message[FIELD_MESSAGE]
+                    "Safety-system: %s", message.message
                 )
                 self.send_message(TGT_SAFETY,"safety_start_received")
-            elif message["result"] == RES_FOREIGN:
+            elif message.result == RES_FOREIGN:
                 get_logger(__name__).log(
                     logging.WARNING,
-                    f"Safety-system: "+message[FIELD_MESSAGE]
+                    "Safety-system: %s", message.message
                 )
                 #Foreign object detected - stop the robot
-                self.robot_controller.stop()
+                received_at = time.time()
+                stopped_at = self.robot_controller.stop()
+                self.safety_latency.record(message.timestamp, received_at, stopped_at)
         else:
             get_logger(__name__).log(
                 logging.WARNING,
-                f"Received unknown message: {message}"
+                "Received unknown message: %s", message
             )
 
     def send_message(self, target:str,message:str):
@@ -167,25 +216,161 @@ class MessageHandler():
         """
         if target == TGT_ROBOT:
             get_logger(__name__).log(logging.INFO,
-                f"Sent command {message} to robot socket")
-            self.robot_socket.sendall(message.encode())
-
+                "Sent command %s to robot socket", message)
             #robot_information receives the returned information about the robot (most importantly the current positon)
-            robot_information = eval(self.robot_socket.recv(1024).decode())
-            current_robot_pos = eval(robot_information["current_pos"])[0]
-            joint_torque = robot_information["joint_torque"]
-            ext_torque = robot_information["external_torque"]
-            tool_force = robot_information["tool_force"]
-
-            self.robot_controller.current_position = current_robot_pos
-            if "move_home" in message: #when moving to actual robot-home position(without async), set actual home pos as program home pos
-                self.robot_controller.home_position = current_robot_pos
-                get_logger(__name__).log(logging.INFO,
-                                        f"Received and updated new robot home pos {self.robot_controller.home_position}")
-            
-            if self.collect_data:
-                self.server.send_message(TGT_INPUT,current_robot_pos)
-            get_logger(__name__).log(logging.INFO,
-                                    f"Received and updated current robot pos {self.robot_controller.current_position}")
+            with span("robot_command", command=message):
+                robot_information = self._timed(RT_COMMAND, self._exchange_robot_command, message)
+            self._update_robot_information(message, robot_information)
+            return robot_information
         else:
-            self.server.send_message(target,message)
\ No newline at end of file
+            if target in CLIENT_WAIT_TARGETS:
+                get_tracer().begin_client_wait(message.get(FIELD_MESSAGE) if isinstance(message, dict) else str(message))
+            self.server.send_message(target,message)
+
+    def send_batch(self, commands:list):
+        """
+        Send an ordered list of DRL commands to the robot as one request,
+        the robot executes them back-to-back and replies with the information per step.
+        In text mode the commands are sent one by one, the remaining ones are not sent after a safety stop.
+
+        Args:
+            commands (list): DRL commands (str)
+
+        Returns:
+            list: robot information per executed step
+
+        Raises:
+            BatchInterrupted: not all commands were executed, e.g. a stop aborted the remaining steps
+        """
+        if self.protocol != PROTOCOL_BINARY:
+            steps = []
+            for command in commands:
+                if self.robot_controller.safety_stop:
+                    raise BatchInterrupted(steps, len(commands))
+                steps.append(self.send_message(TGT_ROBOT, command))
+            return steps
+
+        get_logger(__name__).log(logging.INFO,
+            "Sent batch %s to robot socket", commands)
+        flags = FLAG_COMPLETION_ACK if self.ack_mode == ACK_MODE_COMPLETION else 0
+        with span("robot_batch", commands=commands):
+            msg_type, _, payload = self._timed(RT_BATCH, self._exchange_frame, self.robot_socket, self.robot_lock,
+                                               MSG_BATCH, encode_batch(commands), flags)
+        if msg_type != MSG_BATCH_REPLY:
+            raise ProtocolError(f"Unexpected frame type {msg_type} from robot")
+        steps = decode_batch_reply(payload)
+        for command, robot_information in zip(commands, steps):
+            self._update_robot_information(command, robot_information)
+        if len(steps) != len(commands): #a stop on the control connection aborts the remaining steps
+            raise BatchInterrupted(steps, len(commands))
+        return steps
+
+    def send_priority(self, command:str):
+        """
+        Send a stop command over the control connection, which is handled by the robot
+        immediately - even while a command on the robot socket is still executing.
+        Without control connection the command is sent over the robot socket.
+
+        Args:
+            command (str): DRL stop command
+
+        Returns:
+            dict: robot information after the stop
+        """
+        if self.control_socket is None:
+            return self.send_message(TGT_ROBOT, command)
+
+        get_logger(__name__).log(logging.INFO,
+            "Sent priority command %s to robot control socket", command)
+        with span("robot_stop", command=command):
+            msg_type, ack, payload = self._timed(RT_STOP, self._exchange_frame, self.control_socket, self.control_lock,
+                                                 MSG_COMMAND, encode_command(command))
+        if msg_type != MSG_REPLY:
+            raise ProtocolError(f"Unexpected frame type {msg_type} from robot")
+        robot_information = decode_telemetry(payload)
+        robot_information["ack"] = ack
+        self._update_robot_information(command, robot_information)
+        return robot_information
+
+    def _update_robot_information(self, command:str, robot_information:dict):
+        """
+        Save the robot information returned for a command
+
+        Args:
+            command (str): executed DRL command
+            robot_information (dict): returned robot information
+        """
+        current_robot_pos = robot_information["current_pos"]
+        self.command_count += 1
+        if self.recorder is not None:
+            self.recorder.record(robot_information, self.command_count)
+
+        self.robot_controller.current_position = current_robot_pos
+        self.robot_controller.last_ack = robot_information["ack"]
+        if "move_home" in command: #when moving to actual robot-home position(without async), set actual home pos as program home pos
+            self.robot_controller.home_position = current_robot_pos
+            get_logger(__name__).log(logging.INFO,
+                                    "Received and updated new robot home pos %s", current_robot_pos)
+
+        if self.collect_data:
+            self.server.send_message(TGT_INPUT,current_robot_pos)
+        get_logger(__name__).log(logging.INFO,
+                                "Received and updated current robot pos %s", current_robot_pos)
+
+    def _timed(self, kind:str, exchange, *args):
+        """
+        Run a robot request/reply exchange and record its round-trip time,
+        including the wait for the socket
+
+        Args:
+            kind (str): one of the RT_* labels
+            exchange (callable): sends the request and returns the reply
+        """
+        ROBOT_PENDING.inc()
+        start = time.perf_counter()
+        try:
+            return exchange(*args)
+        finally:
+            ROBOT_ROUNDTRIP.observe(time.perf_counter() - start, kind)
+            ROBOT_PENDING.dec()
+
+    def _exchange_frame(self, robot_socket, lock, msg_type:int, payload:bytes, flags=0):
+        """
+        Send one frame and receive the reply frame while holding the socket lock
+
+        Returns:
+            tuple: (message type, flags, payload) of the reply
+        """
+        with lock:
+            send_frame(robot_socket, msg_type, payload, flags)
+            return recv_frame(robot_socket)
+
+    def _exchange_robot_command(self, command:str):
+        """
+        Send a single DRL command to the robot socket and wait for the reply,
+        using the protocol set in the config
+
+        Args:
+            command (str): DRL command
+
+        Returns:
+            dict: robot information with 'current_pos' as [x,y,z,rx,ry,rz]
+                and 'ack' as one of the ACK_* constants
+        """
+        if self.protocol == PROTOCOL_BINARY:
+            flags = FLAG_COMPLETION_ACK if self.ack_mode == ACK_MODE_COMPLETION else 0
+            msg_type, ack, payload = self._exchange_frame(self.robot_socket, self.robot_lock,
+                                                          MSG_COMMAND, encode_command(command), flags)
+            if msg_type != MSG_REPLY:
+                raise ProtocolError(f"Unexpected frame type {msg_type} from robot")
+            robot_information = decode_telemetry(payload)
+            robot_information["ack"] = ack
+            return robot_information
+
+        #legacy text mode: str(dict) reply with the posx tuple as string
+        with self.robot_lock:
+            self.robot_socket.sendall(command.encode())
+            reply = self.robot_socket.recv(1024).decode()
+        robot_information = decode_text_reply(reply)
+        robot_information["ack"] = ACK_NONE
+        return robot_information
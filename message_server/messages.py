@@ -0,0 +1,194 @@
+"""
+Typed schema for the messages received on the 'message_output' event.
+
+decode_message parses the JSON payload once and validates it into message
+objects, replacing the eval of the raw payload.
+"""
+import ast
+import json
+from numbers import Real
+
+FIELD_MESSAGE_TYPE = "message_type"
+FIELD_CONTENT = "content"
+FIELD_DATA = "data"
+FIELD_RESULT = "result"
+FIELD_UNIT = "unit"
+FIELD_COORDS = "coords"
+FIELD_TARGET = "target"
+FIELD_MESSAGE = "message"
+FIELD_OBJECT = "object"
+FIELD_TIMESTAMP = "timestamp"
+FIELD_CYCLE_ID = "cycle_id"
+
+MESSAGE_TYPES = ("cmd", "msg")
+CT_SOCKET_DET = "socket_detection"
+CT_RESET_PLUG_IN = "reset_plug_in"
+CT_SAFETY = "safety_detection"
+
+DETECTION_RESULTS = (0, 1, 2) #fail, success, unreliable
+DETECTION_SUCCESS = 1
+SAFETY_RESULTS = (0, 1, 2) #foreign object, start, end
+COORD_UNITS = ("m/rad", "mm/deg")
+AXES = 6
+
+class MessageError(ValueError):
+    """
+    Raised when a received message does not match the schema
+    """
+    pass
+
+class Message:
+    """
+    Envelope of every message
+
+    Attributes:
+        message_type (str): 'cmd' or 'msg'
+        content (str): command or message name
+        data: typed data object for known contents, otherwise dict
+        cycle_id (str): id of the charge cycle the message belongs to, optional
+    """
+    __slots__ = ("message_type", "content", "data", "cycle_id")
+
+    def __init__(self, message_type, content, data, cycle_id=None):
+        self.message_type = message_type
+        self.content = content
+        self.data = data
+        self.cycle_id = cycle_id
+
+    def __repr__(self):
+        return f"Message({self.message_type}, {self.content}, {self.data}, {self.cycle_id})"
+
+class SocketDetection:
+    """
+    Result of the rocsys vision client, coords only for a successful detection
+    """
+    __slots__ = ("result", "unit", "coords")
+
+    def __init__(self, result, unit=None, coords=None):
+        self.result = result
+        self.unit = unit
+        self.coords = coords
+
+    def __repr__(self):
+        return f"SocketDetection({self.result}, {self.unit}, {self.coords})"
+
+class SafetyDetection:
+    """
+    Message of the safety-vision system
+    """
+    __slots__ = ("result", "message", "object", "timestamp")
+
+    def __init__(self, result, message="", object=None, timestamp=None):
+        self.result = result
+        self.message = message
+        self.object = object
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"SafetyDetection({self.result}, {self.message!r}, {self.object}, {self.timestamp})"
+
+class ResetPlugIn:
+    """
+    Reset command, target is the index of the front socket position
+    """
+    __slots__ = ("target",)
+
+    def __init__(self, target=None):
+        self.target = target
+
+    def __repr__(self):
+        return f"ResetPlugIn({self.target})"
+
+def _require(data:dict, field:str, content:str):
+    try:
+        return data[field]
+    except KeyError:
+        raise MessageError(f"'{field}' not in {content} data")
+
+def _check_choice(value, choices, field:str):
+    if value not in choices or isinstance(value, bool):
+        raise MessageError(f"Invalid {field} {value!r}")
+    return value
+
+def _decode_socket_detection(data:dict):
+    result = _check_choice(_require(data, FIELD_RESULT, CT_SOCKET_DET), DETECTION_RESULTS, FIELD_RESULT)
+    if result != DETECTION_SUCCESS:
+        return SocketDetection(result)
+    unit = _check_choice(_require(data, FIELD_UNIT, CT_SOCKET_DET), COORD_UNITS, FIELD_UNIT)
+    coords = _require(data, FIELD_COORDS, CT_SOCKET_DET)
+    if (not isinstance(coords, list) or len(coords) != AXES
+            or not all(isinstance(x, Real) and not isinstance(x, bool) for x in coords)):
+        raise MessageError(f"Invalid {FIELD_COORDS} {coords!r}")
+    return SocketDetection(result, unit, coords)
+
+def _decode_safety_detection(data:dict):
+    result = _check_choice(_require(data, FIELD_RESULT, CT_SAFETY), SAFETY_RESULTS, FIELD_RESULT)
+    message = data.get(FIELD_MESSAGE, "")
+    timestamp = data.get(FIELD_TIMESTAMP)
+    if not isinstance(message, str):
+        raise MessageError(f"Invalid {FIELD_MESSAGE} {message!r}")
+    if timestamp is not None and (not isinstance(timestamp, Real) or isinstance(timestamp, bool)):
+        raise MessageError(f"Invalid {FIELD_TIMESTAMP} {timestamp!r}")
+    return SafetyDetection(result, message, data.get(FIELD_OBJECT), timestamp)
+
+def _decode_reset_plug_in(data:dict):
+    target = data.get(FIELD_TARGET)
+    if target is not None and (not isinstance(target, int) or isinstance(target, bool)):
+        raise MessageError(f"Invalid {FIELD_TARGET} {target!r}")
+    return ResetPlugIn(target)
+
+DATA_DECODERS = {
+    CT_SOCKET_DET: _decode_socket_detection,
+    CT_SAFETY: _decode_safety_detection,
+    CT_RESET_PLUG_IN: _decode_reset_plug_in,
+}
+
+def decode_message(raw):
+    """
+    Parse and validate a 'message_output' payload
+
+    Args:
+        raw (str/bytes/dict): JSON payload (or already parsed dict)
+
+    Returns:
+        Message: with typed data for known contents
+
+    Raises:
+        MessageError: if the payload is not valid
+    """
+    if isinstance(raw, (str, bytes, bytearray)):
+        try:
+            raw = json.loads(raw)
+        except ValueError as e:
+            raise MessageError(f"Message is not valid JSON: {e}")
+    if not isinstance(raw, dict):
+        raise MessageError(f"Message must be an object, not {type(raw).__name__}")
+
+    missing_keys = {FIELD_MESSAGE_TYPE, FIELD_CONTENT, FIELD_DATA}.difference(raw.keys())
+    if missing_keys:
+        raise MessageError(f"Message is missing key(s): {missing_keys}")
+
+    message_type = _check_choice(raw[FIELD_MESSAGE_TYPE], MESSAGE_TYPES, FIELD_MESSAGE_TYPE)
+    content = raw[FIELD_CONTENT]
+    if not isinstance(content, str):
+        raise MessageError(f"Invalid {FIELD_CONTENT} {content!r}")
+
+    data = raw[FIELD_DATA]
+    if isinstance(data, str): #legacy senders put str(dict) into the data field
+        try:
+            data = ast.literal_eval(data) if data else {}
+        except (ValueError, SyntaxError):
+            raise MessageError(f"Invalid {FIELD_DATA} {data!r}")
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise MessageError(f"Invalid {FIELD_DATA} {data!r}")
+
+    cycle_id = raw.get(FIELD_CYCLE_ID)
+    if cycle_id is not None and not isinstance(cycle_id, str):
+        raise MessageError(f"Invalid {FIELD_CYCLE_ID} {cycle_id!r}")
+
+    decoder = DATA_DECODERS.get(content)
+    if decoder is not None:
+        data = decoder(data)
+    return Message(message_type, content, data, cycle_id)
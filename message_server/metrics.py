@@ -0,0 +1,206 @@
+"""
+Metrics of the message server in the Prometheus text format, served on /metrics.
+
+Counters, gauges and histograms keep one value (or bucket array) per label
+combination. Recording is a dict lookup and an addition under a lock, histogram
+buckets are preallocated lists indexed with bisect, so the metrics can be
+updated on the robot command and safety paths.
+"""
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+#seconds, robot round-trips range from the immediate acknowledgement to blocking motions
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _format_labels(labelnames, labels, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+class Metric:
+    """
+    Base of the metric types
+
+    Args:
+        name (str): metric name
+        help (str): description
+        labelnames (tuple): names of the labels, values are passed positionally when recording
+    """
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _check_labels(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+
+    def samples(self):
+        """
+        Returns:
+            list: (suffix, formatted labels, value) per exported sample
+        """
+        with self.lock:
+            values = list(self.values.items())
+        return [("", _format_labels(self.labelnames, labels), value) for labels, value in values]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """
+    Monotonically increasing count
+    """
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._check_labels(labels)
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+class Gauge(Metric):
+    """
+    Value that can go up and down, or is read from a function when scraped
+    """
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.functions = {}
+
+    def set(self, value, *labels):
+        self._check_labels(labels)
+        with self.lock:
+            self.values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self._check_labels(labels)
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function, *labels):
+        """
+        Read the value from function() on every scrape, e.g. for queue sizes
+        """
+        self._check_labels(labels)
+        self.functions[labels] = function
+
+    def get(self, *labels):
+        if labels in self.functions:
+            return self.functions[labels]()
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        samples = super().samples()
+        for labels, function in list(self.functions.items()):
+            samples.append(("", _format_labels(self.labelnames, labels), function()))
+        return samples
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in fixed buckets
+
+    Args:
+        buckets (tuple): sorted upper bounds, +Inf is added
+    """
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        self._check_labels(labels)
+        index = bisect_left(self.buckets, value) #first bucket with value <= bound
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                #bucket counts (last one +Inf), sum, count
+                state = self.values[labels] = [[0]*(len(self.buckets)+1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def get(self, *labels):
+        """
+        Returns:
+            tuple: (count, sum) of the observed values
+        """
+        state = self.values.get(labels)
+        return (state[2], state[1]) if state is not None else (0, 0.0)
+
+    def samples(self):
+        with self.lock:
+            states = [(labels, list(state[0]), state[1], state[2]) for labels, state in self.values.items()]
+        samples = []
+        for labels, counts, total, count in states:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"'), cumulative))
+            samples.append(("_sum", _format_labels(self.labelnames, labels), total))
+            samples.append(("_count", _format_labels(self.labelnames, labels), count))
+        return samples
+
+class Registry:
+    """
+    Collection of the metrics exported on /metrics
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        """
+        Returns:
+            str: all metrics in the Prometheus text format
+        """
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+registry = Registry()
+
+COMMANDS = registry.counter("roc_commands_total", "Received commands per command", ("command",))
+MESSAGES = registry.counter("roc_messages_total", "Received messages (not commands) per content", ("content",))
+MESSAGE_ERRORS = registry.counter("roc_message_errors_total", "Invalid messages and failed message handling", ("stage",))
+COMMANDS_REJECTED = registry.counter("roc_commands_rejected_total", "Commands not executed due to a safety stop", ("command",))
+ROBOT_ROUNDTRIP = registry.histogram("roc_robot_roundtrip_seconds", "Robot request/reply round-trip time", ("kind",))
+ROBOT_PENDING = registry.gauge("roc_robot_pending_requests", "Robot requests waiting for or holding the robot socket")
+SAFETY_STOPS = registry.counter("roc_safety_stops_total", "Safety stops sent to the robot")
+SAFETY_STOP_LATENCY = registry.histogram("roc_safety_stop_latency_seconds", "Latency of the safety stops", ("stage",))
+DETECTION_RESULTS = registry.counter("roc_detection_results_total", "Socket and safety detection results", ("content", "result"))
+RECONNECTS = registry.counter("roc_reconnects_total", "Reconnects after a lost connection", ("socket",))
+CLIENTS = registry.gauge("roc_clients_connected", "Connected Socket.IO clients")
+QUEUE_DEPTH = registry.gauge("roc_queue_depth", "Messages waiting for or processed by a worker", ("queue",))
@@ -0,0 +1,67 @@
+import math
+import time
+
+DEFAULT_TARGET_TOLERANCE = 2 #mm - distance to the target position
+DEFAULT_STABLE_TOLERANCE = 0.1 #mm - movement between two samples that counts as standing still
+DEFAULT_SETTLE_TIME = 0.3 #seconds the robot has to stand still
+DEFAULT_TIMEOUT = 30
+POLL_INTERVAL = 0.02
+
+def distance(pos1:list, pos2:list):
+    """
+    Returns the euclidean distance of the x,y,z part of two positions
+    """
+    return math.dist(pos1[0:3], pos2[0:3])
+
+class MotionMonitor:
+    """
+    Detects the end of async motions (amovel) from the telemetry stream:
+    the motion is complete when the robot stands still for the settle time,
+    at the target position if a target is known.
+    """
+
+    def __init__(self, telemetry_store, target_tolerance=DEFAULT_TARGET_TOLERANCE,
+                 settle_time=DEFAULT_SETTLE_TIME, timeout=DEFAULT_TIMEOUT):
+        self.telemetry_store = telemetry_store
+        self.target_tolerance = float(target_tolerance)
+        self.settle_time = float(settle_time)
+        self.timeout = float(timeout)
+
+    def wait_for_completion(self, target=None, cancelled=None, timeout=None):
+        """
+        Blocks until the motion is complete
+
+        Args:
+            target (list): expected end position [x,y,z,...], None if unknown
+            cancelled (function): returns True to stop waiting (e.g. safety stop)
+            timeout (float): maximum wait in seconds, the configured timeout if None
+
+        Returns:
+            tuple: (completed (bool), waited time in seconds)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        last_sample = None
+        stable_since = None
+        while time.monotonic() - start < timeout:
+            if cancelled is not None and cancelled():
+                break
+            sample = self.telemetry_store.get_latest()
+            if sample is None or sample is last_sample:
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            now = time.monotonic()
+            position = sample["current_pos"]
+            if last_sample is not None and distance(position, last_sample["current_pos"]) <= DEFAULT_STABLE_TOLERANCE:
+                if stable_since is None:
+                    stable_since = now
+            else:
+                stable_since = None
+            last_sample = sample
+
+            at_target = target is None or distance(position, target) <= self.target_tolerance
+            if at_target and stable_since is not None and now - stable_since >= self.settle_time:
+                return True, now - start
+            time.sleep(POLL_INTERVAL)
+        return False, time.monotonic() - start
@@ -0,0 +1,100 @@
+"""
+Correction of the socket pose estimated by the rocsys vision client.
+
+The model is fitted in data_exploration.ipynb: per axis a polynomial (statsmodels
+OLS on PolynomialFeatures) from the estimated distance (ed_*) to the actual
+distance (ad_*), in mm/deg. The coefficients are stored lowest order first as
+one (6, degree+1) array in a .npz file and evaluated with Horner's scheme, for a
+single pose or a whole N x 6 array at once.
+
+Export from the notebook:
+    PoseCorrection.from_params([coeff_dict[name] for name in ed_names]).save("models/pose_correction.npz")
+"""
+import numpy as np
+
+AXES = 6
+FIELD_COEFFICIENTS = "coefficients"
+
+class PoseCorrection:
+    """
+    Per-axis polynomial correction of estimated poses
+
+    Args:
+        coefficients (array): shape (6, degree+1), lowest order first
+    """
+
+    def __init__(self, coefficients):
+        coefficients = np.asarray(coefficients, dtype=np.float64)
+        if coefficients.ndim != 2 or coefficients.shape[0] != AXES or coefficients.shape[1] < 1:
+            raise ValueError(f"Coefficients must have the shape ({AXES}, degree+1), not {coefficients.shape}")
+        #highest order first, the order Horner's scheme consumes them
+        self.coefficients = np.ascontiguousarray(coefficients[:, ::-1])
+        self.coefficient_rows = self.coefficients.tolist() #for single poses, faster than numpy for 6 values
+
+    @property
+    def degree(self):
+        return self.coefficients.shape[1] - 1
+
+    @classmethod
+    def from_params(cls, params:list):
+        """
+        Create the correction from the fitted parameters per axis
+        (e.g. the statsmodels params [const, x1, x2, ...]), shorter ones are padded with zeros
+
+        Args:
+            params (list): 6 sequences of coefficients, lowest order first
+        """
+        if len(params) != AXES:
+            raise ValueError(f"Expected parameters for {AXES} axes, got {len(params)}")
+        params = [np.asarray(axis_params, dtype=np.float64).ravel() for axis_params in params]
+        coefficients = np.zeros((AXES, max(len(axis_params) for axis_params in params)))
+        for axis, axis_params in enumerate(params):
+            coefficients[axis, :len(axis_params)] = axis_params
+        return cls(coefficients)
+
+    @classmethod
+    def identity(cls):
+        return cls(np.column_stack([np.zeros(AXES), np.ones(AXES)]))
+
+    @classmethod
+    def load(cls, path:str):
+        with np.load(path) as model:
+            return cls(model[FIELD_COEFFICIENTS])
+
+    def save(self, path:str):
+        np.savez(path, **{FIELD_COEFFICIENTS: self.coefficients[:, ::-1]})
+
+    def apply_array(self, poses):
+        """
+        Correct many poses at once
+
+        Args:
+            poses (array): shape (N, 6) or (6,), mm/deg
+
+        Returns:
+            np.ndarray: corrected poses, same shape
+        """
+        poses = np.asarray(poses, dtype=np.float64)
+        result = np.broadcast_to(self.coefficients[:, 0], poses.shape).copy()
+        for order in range(1, self.coefficients.shape[1]):
+            result *= poses
+            result += self.coefficients[:, order]
+        return result
+
+    def apply(self, coords:list):
+        """
+        Correct a single pose
+
+        Args:
+            coords (list): [x,y,z,rx,ry,rz] in mm/deg
+
+        Returns:
+            list: corrected coordinates as plain floats
+        """
+        corrected = []
+        for value, coefficients in zip(coords, self.coefficient_rows):
+            result = coefficients[0]
+            for coefficient in coefficients[1:]:
+                result = result*value + coefficient
+            corrected.append(float(result))
+        return corrected
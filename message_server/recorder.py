@@ -0,0 +1,193 @@
+"""
+Recorder of the robot telemetry (pose, joint torque, external torque and tool
+force) returned with every command reply and received on the telemetry stream.
+
+Samples are written into a preallocated structured array and saved as .npy
+chunk when it is full, by a writer thread so recording only copies the values.
+The chunk files are named after their first and last timestamp and the oldest
+chunks are deleted once more than max_chunks exist.
+
+Reading a time range for analysis (e.g. in data_exploration.ipynb):
+    from message_server.recorder import load_range
+    samples = load_range("data/telemetry", start, end)
+    samples["current_pos"][:, 0], samples["tool_force"]
+"""
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+import numpy as np
+from message_server.roc_logging import get_logger
+from message_server.robot_protocol import TELEMETRY_FIELDS, AXES
+
+FIELD_RECORDER = "RECORDER"
+FIELD_TIMESTAMP = "timestamp"
+FIELD_COMMAND_ID = "command_id"
+FIELD_SOURCE = "source"
+DEFAULT_DIRECTORY = "data/telemetry"
+DEFAULT_CHUNK_SIZE = 4096
+DEFAULT_MAX_CHUNKS = 200
+CHUNK_PREFIX = "telemetry"
+SOURCE_REPLY = 0 #returned with a robot command reply
+SOURCE_STREAM = 1 #received on the telemetry stream
+NO_COMMAND = -1
+
+SAMPLE_DTYPE = np.dtype(
+    [(FIELD_TIMESTAMP, "<f8"), (FIELD_COMMAND_ID, "<i8"), (FIELD_SOURCE, "u1")]
+    + [(field, "<f8", (AXES,)) for field in TELEMETRY_FIELDS]
+)
+
+def chunk_name(first, last):
+    """
+    Chunk file name with the time range in microseconds, sortable by time
+    """
+    return f"{CHUNK_PREFIX}_{int(first*1e6):017d}_{int(last*1e6):017d}.npy"
+
+def chunk_range(path):
+    """
+    Returns:
+        tuple: (first, last) timestamp of the chunk file in seconds
+    """
+    _, first, last = os.path.splitext(os.path.basename(path))[0].split("_")
+    return int(first)/1e6, int(last)/1e6
+
+def list_chunks(directory):
+    """
+    Returns:
+        list: chunk files of the directory, oldest first
+    """
+    return sorted(glob.glob(os.path.join(directory, f"{CHUNK_PREFIX}_*.npy")))
+
+class TelemetryRecorder:
+    """
+    Appends telemetry samples to .npy chunks in a directory
+
+    Args:
+        directory (str): output directory, created if missing
+        chunk_size (int): samples per chunk file
+        max_chunks (int): amount of chunk files kept, the oldest are deleted
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, chunk_size=DEFAULT_CHUNK_SIZE, max_chunks=DEFAULT_MAX_CHUNKS):
+        self.directory = directory
+        self.chunk_size = int(chunk_size)
+        self.max_chunks = int(max_chunks)
+        if self.chunk_size < 1 or self.max_chunks < 1:
+            raise ValueError(f"chunk_size and max_chunks must be at least 1, not {chunk_size} and {max_chunks}")
+        os.makedirs(directory, exist_ok=True)
+
+        self.buffer = np.empty(self.chunk_size, dtype=SAMPLE_DTYPE)
+        self.count = 0
+        self.last_command_id = NO_COMMAND
+        self.lock = threading.Lock() #replies and the telemetry stream are recorded from different threads
+        self.chunks = queue.Queue()
+        self.writer = threading.Thread(target=self._write_chunks, name="telemetry-recorder", daemon=True)
+        self.writer.start()
+
+    def record(self, sample:dict, command_id=None, source=SOURCE_REPLY, timestamp=None):
+        """
+        Append one sample
+
+        Args:
+            sample (dict): lists of 6 floats keyed by TELEMETRY_FIELDS
+            command_id (int): id of the robot command, the last recorded command if None
+            source (int): SOURCE_REPLY or SOURCE_STREAM
+            timestamp (float): time of the sample (default: now)
+        """
+        with self.lock:
+            if command_id is None:
+                command_id = self.last_command_id
+            else:
+                self.last_command_id = command_id
+            #one tuple assignment is ~3x faster than setting the fields of the row
+            self.buffer[self.count] = (time.time() if timestamp is None else timestamp, command_id, source,
+                                       *[sample[field] for field in TELEMETRY_FIELDS])
+            self.count += 1
+            if self.count == self.chunk_size:
+                self._swap()
+
+    def flush(self):
+        """
+        Save the samples of the current (not full) chunk
+        """
+        with self.lock:
+            if self.count:
+                self._swap()
+
+    def close(self):
+        """
+        Save the remaining samples and stop the writer thread
+        """
+        self.flush()
+        self.chunks.put(None)
+        self.writer.join()
+
+    def _swap(self):
+        self.chunks.put(self.buffer[:self.count])
+        self.buffer = np.empty(self.chunk_size, dtype=SAMPLE_DTYPE)
+        self.count = 0
+
+    def _write_chunks(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            try:
+                timestamps = chunk[FIELD_TIMESTAMP]
+                #stream samples carry the robot timestamp and replies the receive time, so samples of
+                #the two threads can arrive out of order - read_range relies on sorted chunks
+                if np.any(timestamps[1:] < timestamps[:-1]):
+                    chunk = chunk[np.argsort(timestamps, kind="stable")]
+                    timestamps = chunk[FIELD_TIMESTAMP]
+                np.save(os.path.join(self.directory, chunk_name(timestamps.min(), timestamps.max())), chunk)
+                for path in list_chunks(self.directory)[:-self.max_chunks]:
+                    os.remove(path)
+            except OSError as e:
+                get_logger(__name__).log(logging.ERROR, "Telemetry chunk not saved: %s", e)
+
+def read_range(directory=DEFAULT_DIRECTORY, start=None, end=None):
+    """
+    Memory-map the chunks overlapping the time range, without copying
+
+    Args:
+        directory (str): recorder directory
+        start (float): first timestamp (unix seconds), from the beginning if None
+        end (float): last timestamp, until the end if None
+
+    Returns:
+        list: structured arrays (SAMPLE_DTYPE) per chunk, views of the memory-mapped files
+    """
+    start = -np.inf if start is None else start
+    end = np.inf if end is None else end
+    views = []
+    for path in list_chunks(directory):
+        first, last = chunk_range(path)
+        if last < start or first > end:
+            continue
+        chunk = np.load(path, mmap_mode="r")
+        timestamps = chunk[FIELD_TIMESTAMP]
+        mask = (timestamps >= start) & (timestamps <= end)
+        if mask.all():
+            views.append(chunk)
+        elif mask.any():
+            #chunks are saved sorted by time, so the range is contiguous
+            indices = np.flatnonzero(mask)
+            views.append(chunk[indices[0]:indices[-1]+1])
+    return views
+
+def load_range(directory=DEFAULT_DIRECTORY, start=None, end=None):
+    """
+    Samples of a time range as one structured array,
+    only copied if the range spans more than one chunk
+
+    Returns:
+        np.ndarray: SAMPLE_DTYPE array
+    """
+    views = read_range(directory, start, end)
+    if not views:
+        return np.empty(0, dtype=SAMPLE_DTYPE)
+    if len(views) == 1:
+        return views[0]
+    return np.concatenate(views)
@@ -1,6 +1,10 @@
-import math
-import numpy as np
+import threading
+import time
 from message_server.roc_logging import get_logger
+from message_server.robot_protocol import ACK_NONE, ACK_FINISHED, BatchInterrupted
+from message_server.tracing import span, run_in_context
+from message_server.metrics import SAFETY_STOPS
+from message_server.transforms import Transform, convert_pose
 import logging
 
 # if Doosan Robot Control Functions import does not work: read global below variables
@@ -12,8 +16,6 @@ DR_TOOL = 1
 DR_SSTOP = 2
 DR_HOME_TARGET_USER = 1
 
-COORD_RAD = 'm/rad'
-COORD_DEG = 'mm/deg'
 TGT_ROBOT = "message_robot"
 TGT_INPUT = "message_input"
 TGT_SAFETY = "message_safety"
@@ -21,40 +23,16 @@ TGT_ALL = "message_all"
 TGT_TAKE_IMAGE = "take_image"
 MTD_WIGGLE = "wiggle"
 MTD_FORCE_CONTROL = "force_control"
+TELEMETRY_MAX_AGE = 1 #seconds - older telemetry samples are not used for the current position
+FIELD_MESSAGE = "message"
+FIELD_MOTION_COMPLETE = "motion_complete"
+FIELD_INTERRUPTED = "interrupted"
+FIELD_DURATION = "duration"
 
-def convert_coords(unit, coords):
-    """
-    converts coordinates from m/rad to mm/deg
-
-    Args:
-        unit (str): _description_
-        coords (list): _description_
-
-    Returns:
-        coords (list): [x,y,z,rx,ry,rz] 
-    """
-    converted_coords = list()
-    if unit == COORD_RAD:
-        converted_coords[0:2] = [x*1000 for x in coords[0:3]]
-        converted_coords[3:5] = [math.degrees(rad) for rad in coords[3:6]]
-    if unit == COORD_DEG:
-        converted_coords = coords
-    return converted_coords
-
-def apply_camera_offset(coords:list,camera_os:list):
-    """
-    apply camera offset to coordinates,
-    offset is set in config
-
-    Args:
-        coords (list): original coords
-        camera_os (list): camera offset
-
-    Returns:
-        list: updated coords
-    """
-    coords = list(np.array(coords)+np.array(camera_os))
-    return coords
+#fixed delays the rocsys client uses if no motion complete event is sent (for logging the saved time)
+CLIENT_DELAY_RETAKE = 12
+CLIENT_DELAY_IN_POSITION = 18
+CLIENT_DELAY_PLUG_OUT = 9
 
 def is_within(list1:list,list2:list,value:int):
     """
@@ -70,6 +48,20 @@ def is_within(list1:list,list2:list,value:int):
     """
     return all(abs((1-value) * x) <= abs(y) <= abs((1+value) * x) for x, y in zip(list2, list1))
 
+def relative_target(position:list, movement:list):
+    """
+    Returns the expected end position of a relative movement (base reference),
+    only the x,y,z part is used for checking the arrival
+
+    Args:
+        position (list): start position
+        movement (list): relative movement
+
+    Returns:
+        list: [x,y,z]
+    """
+    return [float(p) + float(m) for p, m in zip(position[0:3], movement[0:3])]
+
 class RobotController:
     """
     This class handles the commands directed at the robot.
@@ -84,9 +76,14 @@ class RobotController:
 
         #robot vars
         self.camera_os = camera_os
+        self.camera_transform = Transform.from_pose(camera_os) #camera to robot reference, built once
+        self.pose_correction = None #PoseCorrection of the detected coordinates, set if enabled in the config
         self.home_position = home_position
         self.current_position = home_position
         self.front_socket_position = None
+        self.last_ack = ACK_NONE #acknowledgement of the last robot command (accepted/finished)
+        self.telemetry_store = None #set if the robot telemetry stream is enabled
+        self.motion_monitor = None #set if motion complete events are enabled
 
         #vars for various purposes
         self.safety_stop = False
@@ -99,6 +96,8 @@ class RobotController:
     def socket_detection(self, unit, coords):
         """
         Socket detection logic:
+        - correct the detected coordinates with the fitted model (if enabled)
+        - transform them from the camera to the robot reference (camera offset, see transforms.py)
         - take image:
          - move to coordinates which are close to detection (for closer/better second detection)
         - take second image:
@@ -111,34 +110,37 @@ class RobotController:
             unit (str): 'm/rad','mm/deg'
             coords (list): [x,y,z,rx,ry,rz]
         """
-        coords = convert_coords(unit, coords)
+        coords = convert_pose(unit, coords)
         if all([x == 0 for x in coords]):
             get_logger(__name__).log(
                 logging.ERROR,
-                f"No/empty coordinates provided"
+                "No/empty coordinates provided"
             )
             raise
+        if self.pose_correction is not None:
+            coords = self.pose_correction.apply(coords)
         
-        if is_within(self.current_position,self.home_position,0.01):
+        if is_within(self.get_current_position(),self.home_position,0.01):
             #if robot is at starting location: move close to the robot and retake image
             get_logger(__name__).log(logging.INFO,
                                      "Executing first detection movement command")
             
             #camera offset
-            coords = apply_camera_offset(coords,self.camera_os)
+            coords = self.camera_transform.apply(coords)
             #retake offset - were tested and discussed with client for most accurate detection
             coords[0] += -320
             coords[2] += -70
             coords[4] = coords[4]/2
+            target = relative_target(self.get_current_position(), coords)
             command = f"amovel({coords},vel=300, acc=300, mod={DR_MV_MOD_REL})"
             self._send_message(TGT_ROBOT,command)
-            self._send_message(TGT_TAKE_IMAGE,"retake image")
+            self._notify_after_motion(TGT_TAKE_IMAGE,"retake image",target,CLIENT_DELAY_RETAKE)
 
         else:
             get_logger(__name__).log(logging.INFO,
                                      "Executing second detection movement command")
             
-            coords = apply_camera_offset(coords,self.camera_os)
+            coords = self.camera_transform.apply(coords)
             mod = DR_MV_MOD_REL
 
             if not self.accurate_detection and self.fsp_list: #only when socket detection is not accurate enough
@@ -147,12 +149,16 @@ class RobotController:
                 
                 get_logger(__name__).log(
                         logging.INFO,
-                        f"Targeting fsp {coords}"
+                        "Targeting fsp %s", coords
                     )
 
+            if mod == DR_MV_MOD_REL:
+                target = relative_target(self.get_current_position(), coords)
+            else:
+                target = coords
             command = f"amovel({coords},vel=100, acc = 100, mod={mod})"
             self._send_message(TGT_ROBOT,command)
-            self._send_message(TGT_TAKE_IMAGE,"in position")
+            self._notify_after_motion(TGT_TAKE_IMAGE,"in position",target,CLIENT_DELAY_IN_POSITION)
     
     def plug_in(self):
         """
@@ -166,24 +172,29 @@ class RobotController:
 
         if self.plug_in_method == MTD_WIGGLE:
             #first idea: move in a wave motion into the socket - stop at furthest part in periodic motion
-            command = f"amove_periodic({amp},period={period})"
-            self._send_message(TGT_ROBOT,command)
-            command = f"wait({wait_time})"
-            self._send_message(TGT_ROBOT,command)
-            command = f"stop({DR_SSTOP})"
-            self._send_message(TGT_ROBOT,command)
+            commands = [
+                f"amove_periodic({amp},period={period})",
+                f"wait({wait_time})",
+                f"stop({DR_SSTOP})"
+            ]
+            completed = self._send_batch(commands)
         elif self.plug_in_method == MTD_FORCE_CONTROL: #currently too inconsistent
             #second idea: move with force-control active (stiffness to be able to adjust to imperfections)
             stiffness = [3000,4000,6000,2000,2000,2000] #default: [3000, 3000, 3000, 200, 200, 200]
             movement = [-49,0,0,0,0,0]
-            command = f"task_compliance_ctrl({stiffness})"
-            self._send_message(TGT_ROBOT,command)
-            command = f"movel({movement}, vel=75, acc=100, ref={DR_TOOL}, mod={DR_MV_MOD_REL})"
-            self._send_message(TGT_ROBOT,command)
-            command = f"release_compliance_ctrl()"
-            self._send_message(TGT_ROBOT,command)
+            commands = [
+                f"task_compliance_ctrl({stiffness})",
+                f"movel({movement}, vel=75, acc=100, ref={DR_TOOL}, mod={DR_MV_MOD_REL})",
+                f"release_compliance_ctrl()"
+            ]
+            completed = self._send_batch(commands)
         else:
-            get_logger(__name__).error(f"Unkown plug-in method {self.plug_in_method}")
+            get_logger(__name__).error("Unkown plug-in method %s", self.plug_in_method)
+            completed = True
+        if not completed:
+            #the safety detection stays active while the plug is not in the socket
+            self._send_interrupted(TGT_INPUT,"plug_in_complete")
+            return
         self._send_message(TGT_INPUT,"plug_in_complete")
         self._send_message(TGT_SAFETY,"stop_detection")
 
@@ -191,35 +202,54 @@ class RobotController:
         """
         Moves the robot to the home position (set in config)
         """
-        if not interrupt:
-            command = f"move_home({DR_HOME_TARGET_USER})"
-        else:
-            command = f"amovel({self.home_position},vel=300,acc=300)"
+        command = self._home_command(interrupt)
         self.safety_stop = False    
 
         self._send_message(TGT_ROBOT,command)
 
+    def _home_command(self,interrupt=False):
+        """
+        Returns the DRL command to move home,
+        only the async movement can be interrupted
+        """
+        if not interrupt:
+            return f"move_home({DR_HOME_TARGET_USER})"
+        return f"amovel({self.home_position},vel=300,acc=300)"
+
     def plug_out(self):
         """
         Starts the unplugging procedure:
         move 6 cm in the x-direction from the tools perspective
         """
         movement = [60,0,0,0,0,0]
-        command = f"movel({movement}, vel=50, acc=50, ref={DR_TOOL}, mod={DR_MV_MOD_REL})"
-        self._send_message(TGT_ROBOT,command)
+        commands = [
+            f"movel({movement}, vel=50, acc=50, ref={DR_TOOL}, mod={DR_MV_MOD_REL})",
+            self._home_command(True)
+        ]
+        self.safety_stop = False
+        #the batch only returns after the synchronous movel, start the safety detection first
+        #so it is active for the whole plug-out and the async home movement
         self._send_message(TGT_SAFETY,"start_detection")
-        self.move_home(True)
-        self._send_message(TGT_INPUT,"plug_out_complete")
+        if not self._send_batch(commands):
+            self._send_interrupted(TGT_INPUT,"plug_out_complete")
+            return
+        self._notify_after_motion(TGT_INPUT,"plug_out_complete",self.home_position,CLIENT_DELAY_PLUG_OUT)
 
     def stop(self):
         """
         Send soft stop command to robot (safety interrupt) to 
         interrupt current movement command
+
+        Returns:
+            float: time the robot acknowledged the stop, before the clients are notified
         """
         command = f"stop({DR_SSTOP})"
         self.safety_stop = True
-        self._send_message(TGT_ROBOT,command)
+        SAFETY_STOPS.inc()
+        self.message_handler.send_priority(command)
+        stopped_at = time.time()
         self._send_message(TGT_ALL,"safety_stop_response")
+        return stopped_at
         
     def collect_data(self): #unused currently
         movement = [-1,0,0,0,0,0]
@@ -227,6 +257,30 @@ class RobotController:
         command = f"movel({movement},vel=100,acc=100,ref={DR_TOOL},mod={DR_MV_MOD_REL})"
         self._send_message(TGT_ROBOT,command)
     
+    def get_current_position(self):
+        """
+        Returns the current robot position, taken from the telemetry stream if available,
+        otherwise the position returned with the last robot command
+
+        Returns:
+            list: [x,y,z,rx,ry,rz]
+        """
+        if self.telemetry_store is not None:
+            sample = self.telemetry_store.get_latest(TELEMETRY_MAX_AGE)
+            if sample is not None:
+                return sample["current_pos"]
+        return self.current_position
+
+    def motion_finished(self):
+        """
+        Check if the robot reported the last command as finished,
+        async motions are only acknowledged as accepted
+
+        Returns:
+            bool: True if the last command was acknowledged as finished
+        """
+        return self.last_ack == ACK_FINISHED
+
     def reposition_eoat(self, data): #not implemented
         """
         Repositions EOAT to another position to retake picture
@@ -236,9 +290,80 @@ class RobotController:
         """
         pass
     
+    def _notify_after_motion(self, target, message, target_position, client_delay):
+        """
+        Send the message once the async motion is complete, so the client can continue without a fixed delay.
+        Without motion monitor the message is sent immediately (the client waits its fixed delay).
+        The monitor waits at most the fixed delay of the client and reports the waited time, the client
+        only waits the rest of its delay if the motion was not detected as complete.
+        After a safety stop the message is sent as interrupted, so the client does not continue the cycle.
+
+        Args:
+            target (str): client target
+            message (str): message for the client
+            target_position (list): expected end position of the motion
+            client_delay (float): fixed delay of the client, the longest wait for the motion
+        """
+        if self.motion_monitor is None:
+            self._send_message(target,message)
+            return
+
+        def wait_and_notify():
+            timeout = min(self.motion_monitor.timeout, client_delay)
+            with span("motion_wait", message=message):
+                completed, duration = self.motion_monitor.wait_for_completion(target_position, lambda: self.safety_stop,
+                                                                              timeout)
+            interrupted = self.safety_stop
+            if interrupted:
+                completed = False
+                get_logger(__name__).log(logging.WARNING,
+                                         "Motion for '%s' interrupted by safety stop", message)
+            elif completed:
+                get_logger(__name__).log(logging.INFO,
+                                         "Motion for '%s' complete after %.2fs (fixed delay %ss, saved %.2fs)",
+                                         message, duration, client_delay, client_delay-duration)
+            else:
+                get_logger(__name__).log(logging.WARNING,
+                                         "Motion for '%s' not complete after %.2fs, continuing", message, duration)
+            self.message_handler.send_message(target, {
+                FIELD_MESSAGE: message,
+                FIELD_MOTION_COMPLETE: completed,
+                FIELD_INTERRUPTED: interrupted,
+                FIELD_DURATION: round(duration, 3)
+            })
+
+        #the thread continues the cycle of the command that started the motion
+        threading.Thread(target=run_in_context(wait_and_notify), daemon=True).start()
+
     def _send_message(self, target,command):
         """
         Pass on message to message handler
         """
         message = str(command)
-        return self.message_handler.send_message(target,message)
\ No newline at end of file
+        return self.message_handler.send_message(target,message)
+
+    def _send_interrupted(self, target, message):
+        """
+        Send the message of an aborted motion sequence as interrupted, so the client does not continue the cycle
+        """
+        self.message_handler.send_message(target, {
+            FIELD_MESSAGE: message,
+            FIELD_MOTION_COMPLETE: False,
+            FIELD_INTERRUPTED: True,
+            FIELD_DURATION: 0
+        })
+
+    def _send_batch(self, commands):
+        """
+        Pass on a sequence of robot commands to be executed in one round-trip
+
+        Returns:
+            bool: True if all commands were executed without safety stop
+        """
+        try:
+            self.message_handler.send_batch([str(command) for command in commands])
+        except BatchInterrupted as e:
+            get_logger(__name__).log(logging.WARNING,
+                                     "%s", e)
+            return False
+        return not self.safety_stop
\ No newline at end of file
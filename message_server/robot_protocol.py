@@ -0,0 +1,290 @@
+"""
+Framed binary protocol used between the MessageHandler and the robot-side
+loop in setup_robot_server.py.
+
+Every frame consists of a fixed header followed by the payload:
+    magic (2 bytes), version (1 byte), message type (1 byte),
+    flags (1 byte), payload length (4 bytes, big endian)
+
+The robot-side script cannot import this module (it runs inside DRL-Studio),
+so the codec is mirrored there - keep both in sync when changing the format.
+"""
+import ast
+import struct
+
+PROTOCOL_TEXT = "text"
+PROTOCOL_BINARY = "binary"
+
+MAGIC = b"RC"
+VERSION = 1
+HEADER_FORMAT = "!2sBBBI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAX_PAYLOAD_SIZE = 1024*1024
+
+MSG_COMMAND = 1
+MSG_REPLY = 2
+MSG_BATCH = 3
+MSG_BATCH_REPLY = 4
+MSG_TELEMETRY_SUBSCRIBE = 5 #sent once on the telemetry socket, payload: rate in Hz
+MSG_TELEMETRY = 6 #pushed by the robot at the subscribed rate, payload: telemetry
+
+ACK_MODE_FIXED_WAIT = "fixed_wait"
+ACK_MODE_COMPLETION = "completion"
+
+#command flags
+FLAG_COMPLETION_ACK = 0x01 #skip the fixed wait, acknowledge by motion state instead
+
+#reply flags - what the acknowledgement means
+ACK_NONE = 0 #legacy: reply sent after a fixed wait
+ACK_ACCEPTED = 1 #command started, motion still in progress (async motions)
+ACK_FINISHED = 2 #command (and any motion it started) has finished
+
+#order of the float arrays in a telemetry payload
+TELEMETRY_FIELDS = ("current_pos", "joint_torque", "external_torque", "tool_force")
+AXES = 6
+TELEMETRY_FORMAT = f"!{len(TELEMETRY_FIELDS)*AXES}d"
+TELEMETRY_SIZE = struct.calcsize(TELEMETRY_FORMAT)
+
+TELEMETRY_RATE_FORMAT = "!d"
+TELEMETRY_RATE_SIZE = struct.calcsize(TELEMETRY_RATE_FORMAT)
+
+#batch payloads: step count followed by the steps
+BATCH_COUNT_FORMAT = "!H"
+BATCH_COUNT_SIZE = struct.calcsize(BATCH_COUNT_FORMAT)
+BATCH_STEP_FORMAT = "!I" #length of the DRL command
+BATCH_STEP_SIZE = struct.calcsize(BATCH_STEP_FORMAT)
+BATCH_ACK_FORMAT = "!B" #acknowledgement per step
+BATCH_ACK_SIZE = struct.calcsize(BATCH_ACK_FORMAT)
+
+class ProtocolError(Exception):
+    """
+    Raised when a received frame does not match the protocol
+    """
+    pass
+
+class BatchInterrupted(Exception):
+    """
+    Raised when a batch ended before all of its commands were executed,
+    e.g. after a safety stop
+
+    Args:
+        steps (list): robot information per executed step
+        total (int): amount of commands in the batch
+    """
+
+    def __init__(self, steps, total):
+        super().__init__(f"Batch interrupted after {len(steps)} of {total} steps")
+        self.steps = steps
+        self.total = total
+
+def encode_frame(msg_type:int, payload:bytes, flags:int=0):
+    """
+    Prefix the payload with the protocol header
+
+    Args:
+        msg_type (int): MSG_* constant
+        payload (bytes): frame content
+        flags (int): optional flags
+
+    Returns:
+        bytes: complete frame
+    """
+    return struct.pack(HEADER_FORMAT, MAGIC, VERSION, msg_type, flags, len(payload)) + payload
+
+def decode_header(header:bytes):
+    """
+    Validate and unpack a frame header
+
+    Args:
+        header (bytes): HEADER_SIZE bytes
+
+    Returns:
+        tuple: (msg_type, flags, payload_length)
+    """
+    magic, version, msg_type, flags, length = struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        raise ProtocolError(f"Invalid frame magic {magic}")
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    if length > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"Frame payload too large ({length} bytes)")
+    return msg_type, flags, length
+
+def recv_exact(sock, size:int):
+    """
+    Read exactly {size} bytes from the socket
+
+    Raises:
+        ConnectionError: if the peer closes the connection mid-frame
+    """
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Socket closed while receiving frame")
+        buffer += chunk
+    return bytes(buffer)
+
+def send_frame(sock, msg_type:int, payload:bytes, flags:int=0):
+    sock.sendall(encode_frame(msg_type, payload, flags))
+
+def recv_frame(sock):
+    """
+    Receive one complete frame from the socket
+
+    Returns:
+        tuple: (msg_type, flags, payload)
+    """
+    msg_type, flags, length = decode_header(recv_exact(sock, HEADER_SIZE))
+    payload = recv_exact(sock, length) if length else b""
+    return msg_type, flags, payload
+
+def encode_command(command:str):
+    return command.encode("utf-8")
+
+def decode_command(payload:bytes):
+    return payload.decode("utf-8")
+
+def encode_telemetry(robot_information:dict):
+    """
+    Pack pose, joint torque, external torque and tool force into one float array
+
+    Args:
+        robot_information (dict): lists of 6 floats keyed by TELEMETRY_FIELDS
+
+    Returns:
+        bytes: telemetry payload
+    """
+    values = []
+    for field in TELEMETRY_FIELDS:
+        values.extend(robot_information[field])
+    return struct.pack(TELEMETRY_FORMAT, *values)
+
+def decode_telemetry(payload:bytes):
+    """
+    Unpack a telemetry payload
+
+    Args:
+        payload (bytes): TELEMETRY_SIZE bytes
+
+    Returns:
+        dict: lists of 6 floats keyed by TELEMETRY_FIELDS
+    """
+    if len(payload) != TELEMETRY_SIZE:
+        raise ProtocolError(f"Invalid telemetry payload size {len(payload)}")
+    values = struct.unpack(TELEMETRY_FORMAT, payload)
+    return {
+        field: list(values[i*AXES:(i+1)*AXES])
+        for i, field in enumerate(TELEMETRY_FIELDS)
+    }
+
+def decode_text_reply(reply:str):
+    """
+    Parse a reply of the legacy text protocol,
+    a str(dict) with the DRL return values as strings
+
+    Args:
+        reply (str): reply from the robot
+
+    Returns:
+        dict: lists of 6 floats keyed by TELEMETRY_FIELDS
+    """
+    try:
+        raw = ast.literal_eval(reply)
+        robot_information = {field: ast.literal_eval(raw[field]) for field in TELEMETRY_FIELDS}
+        #get_current_posx returns the pose together with the solution space
+        robot_information["current_pos"] = robot_information["current_pos"][0]
+        for field in TELEMETRY_FIELDS:
+            values = [float(x) for x in robot_information[field]]
+            if len(values) != AXES:
+                raise ValueError(f"{field} has {len(values)} values")
+            robot_information[field] = values
+    except (ValueError, SyntaxError, TypeError, KeyError, IndexError) as e:
+        raise ProtocolError(f"Invalid text reply from robot: {e}")
+    return robot_information
+
+def encode_telemetry_rate(rate:float):
+    return struct.pack(TELEMETRY_RATE_FORMAT, rate)
+
+def decode_telemetry_rate(payload:bytes):
+    if len(payload) != TELEMETRY_RATE_SIZE:
+        raise ProtocolError(f"Invalid telemetry rate payload size {len(payload)}")
+    return struct.unpack(TELEMETRY_RATE_FORMAT, payload)[0]
+
+def encode_batch(commands:list):
+    """
+    Pack an ordered list of DRL commands into one batch payload
+
+    Args:
+        commands (list): DRL commands (str)
+
+    Returns:
+        bytes: batch payload
+    """
+    payload = bytearray(struct.pack(BATCH_COUNT_FORMAT, len(commands)))
+    for command in commands:
+        encoded = encode_command(command)
+        payload += struct.pack(BATCH_STEP_FORMAT, len(encoded)) + encoded
+    return bytes(payload)
+
+def decode_batch(payload:bytes):
+    """
+    Unpack a batch payload
+
+    Returns:
+        list: DRL commands (str)
+    """
+    if len(payload) < BATCH_COUNT_SIZE:
+        raise ProtocolError("Invalid batch payload size")
+    count, = struct.unpack_from(BATCH_COUNT_FORMAT, payload)
+    offset = BATCH_COUNT_SIZE
+    commands = []
+    for _ in range(count):
+        if offset + BATCH_STEP_SIZE > len(payload):
+            raise ProtocolError("Invalid batch payload size")
+        length, = struct.unpack_from(BATCH_STEP_FORMAT, payload, offset)
+        offset += BATCH_STEP_SIZE
+        if offset + length > len(payload):
+            raise ProtocolError("Invalid batch payload size")
+        commands.append(decode_command(payload[offset:offset+length]))
+        offset += length
+    if offset != len(payload):
+        raise ProtocolError("Invalid batch payload size")
+    return commands
+
+def encode_batch_reply(steps:list):
+    """
+    Pack the telemetry of every executed batch step
+
+    Args:
+        steps (list): (ack, robot_information) per executed step
+
+    Returns:
+        bytes: batch reply payload
+    """
+    payload = bytearray(struct.pack(BATCH_COUNT_FORMAT, len(steps)))
+    for ack, robot_information in steps:
+        payload += struct.pack(BATCH_ACK_FORMAT, ack) + encode_telemetry(robot_information)
+    return bytes(payload)
+
+def decode_batch_reply(payload:bytes):
+    """
+    Unpack a batch reply
+
+    Returns:
+        list: robot information dict per executed step, including the 'ack'
+    """
+    if len(payload) < BATCH_COUNT_SIZE:
+        raise ProtocolError("Invalid batch reply size")
+    count, = struct.unpack_from(BATCH_COUNT_FORMAT, payload)
+    step_size = BATCH_ACK_SIZE + TELEMETRY_SIZE
+    if len(payload) != BATCH_COUNT_SIZE + count*step_size:
+        raise ProtocolError("Invalid batch reply size")
+    steps = []
+    for i in range(count):
+        offset = BATCH_COUNT_SIZE + i*step_size
+        ack, = struct.unpack_from(BATCH_ACK_FORMAT, payload, offset)
+        robot_information = decode_telemetry(payload[offset+BATCH_ACK_SIZE:offset+step_size])
+        robot_information["ack"] = ack
+        steps.append(robot_information)
+    return steps
@@ -1,9 +1,12 @@
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from logging import Logger
+from dataclasses import replace
 
 import os
 import logging
+import queue
 import sys
+from message_server.metrics import registry
 
 # default values for file logging
 DEFAULT_LOG_DIR = "logs"
@@ -17,19 +20,72 @@ LOG_FORMAT = '[%(asctime)s] - [%(name)s] - [%(levelname)s] - %(message)s'
 MAX_BYTES = 10*1024*1024
 BACKUP_COUNT = 5
 
+# queued logging: records are written by a background thread
+DEFAULT_QUEUE_SIZE = 10000
+LOG_DROPPED = registry.counter("roc_log_records_dropped_total", "Log records dropped because the log queue was full")
+
 # global variables
-config = None
+settings = None #LoggingSettings
 loggers = {}
 file_log_handler = None
 console_log_handler = None
+queue_handler = None
+queue_listener = None
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Puts the records into a bounded queue without blocking the logging thread,
+    records are dropped (and counted) if the queue is full.
+    The message is formatted by the writer thread, so log arguments must not be changed after logging.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_DROPPED.inc()
 
-def setup_logging(t_config):
-    global config
-    config = t_config
+def setup_logging(t_settings):
+    """
+    Args:
+        t_settings (LoggingSettings): the [LOGGING] settings, parsed once at startup
+    """
+    global settings
+    settings = t_settings
+
+def stop_logging():
+    """
+    Writes the queued records and stops the writer thread of the queued logging,
+    later records (e.g. during shutdown) are written directly by the file and console handlers
+    """
+    global settings
+    global queue_handler
+    global queue_listener
+    if queue_listener is None:
+        return
+    if queue_handler.dropped:
+        get_logger(__name__).log(logging.WARNING, "%d log records dropped, log queue was full", queue_handler.dropped)
+    # replace the queue handler first, records logged meanwhile are still written by the listener
+    for logger in loggers.values():
+        for handler in queue_listener.handlers:
+            logger.addHandler(handler)
+        logger.removeHandler(queue_handler)
+    queue_listener.stop()
+    queue_listener = None
+    queue_handler = None
+    settings = replace(settings, queued=False)
 
 def attach_log_handler(logger: Logger):
-    # if no config is set exit - then nothing is logged for tests
-    if config is None:
+    # if no settings are set exit - then nothing is logged for tests
+    if settings is None:
         return
     # create main log handler
     global file_log_handler
@@ -37,37 +93,42 @@ def attach_log_handler(logger: Logger):
 
     # Log messages in file
     if file_log_handler is None:
-        log_dir = DEFAULT_LOG_DIR
-        log_file_name = DEFAULT_LOG_FILE_NAME
-        log_level = DEFAULT_LOG_LEVEL
-        if config is not None:
-            log_dir = config['LOGGING', 'log_dir', log_dir]
-            log_file_name = config['LOGGING', 'log_name', log_file_name]
-            log_level = int(config['LOGGING', 'min_level', log_level])
         file_log_handler = RotatingFileHandler(
-            os.path.join(log_dir, log_file_name), 
+            os.path.join(settings.log_dir, settings.log_name), 
             maxBytes=MAX_BYTES, 
             backupCount=BACKUP_COUNT
         )
         logFormatter = logging.Formatter(LOG_FORMAT)
         file_log_handler.setFormatter(logFormatter)
-        file_log_handler.setLevel(log_level)
+        file_log_handler.setLevel(settings.min_level)
 
     # Log messages on console
     if console_log_handler is None:
         console_log_handler = logging.StreamHandler(sys.stdout)
         logFormatter = logging.Formatter(LOG_FORMAT)
         console_log_handler.setFormatter(logFormatter)
-        console_log_level = config['LOGGING','console_log_level']
         # set log level
-        console_log_handler.setLevel(int(console_log_level))
+        console_log_handler.setLevel(settings.console_log_level)
+
+    handlers = [file_log_handler, console_log_handler] if settings.debug else [file_log_handler]
+
+    # write in a background thread, the logging thread only puts the record into the queue
+    if settings.queued:
+        global queue_handler
+        global queue_listener
+        if queue_handler is None:
+            queue_handler = DroppingQueueHandler(queue.Queue(settings.queue_size))
+            # records below the level of all handlers are not queued
+            queue_handler.setLevel(min(handler.level for handler in handlers))
+        if queue_listener is None:
+            queue_listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+            queue_listener.start()
+        handlers = [queue_handler]
 
     # attach logger
     if logger is not None:
-        logger.addHandler(file_log_handler)
-        env_debug = eval(config['LOGGING','debug'])
-        if env_debug:
-            logger.addHandler(console_log_handler)
+        for handler in handlers:
+            logger.addHandler(handler)
 
 def get_logger(logger_name: str = 'default'):
     loggername = 'rocsys.{}'.format(logger_name)
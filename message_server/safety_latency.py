@@ -0,0 +1,69 @@
+import logging
+import time
+from collections import deque
+from message_server.roc_logging import get_logger
+from message_server.metrics import SAFETY_STOP_LATENCY
+
+DEFAULT_HISTORY_SIZE = 500
+
+FIELD_DETECTED_AT = "detected_at"
+FIELD_RECEIVED_AT = "received_at"
+FIELD_STOPPED_AT = "stopped_at"
+FIELD_DETECTION_TO_STOP = "detection_to_stop"
+FIELD_RECEIVED_TO_STOP = "received_to_stop"
+
+class SafetyLatencyRecorder:
+    """
+    Records the latency of every safety stop:
+    - detection to stop: from the frame in which safety-vision detected the
+      foreign object until the robot acknowledged the stop
+      (wall-clock time, safety-vision and server need synchronized clocks)
+    - received to stop: from receiving the safety message until the stop acknowledgement
+    """
+
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE):
+        self.events = deque(maxlen=history_size)
+
+    def record(self, detected_at, received_at, stopped_at=None):
+        """
+        Save and log the latencies of one safety event
+
+        Args:
+            detected_at (float): detection timestamp sent by safety-vision, None if unknown
+            received_at (float): time the server received the safety message
+            stopped_at (float): time the robot acknowledged the stop (default: now)
+
+        Returns:
+            dict: recorded event, latencies in seconds
+        """
+        if stopped_at is None:
+            stopped_at = time.time()
+        event = {
+            FIELD_DETECTED_AT: detected_at,
+            FIELD_RECEIVED_AT: received_at,
+            FIELD_STOPPED_AT: stopped_at,
+            FIELD_DETECTION_TO_STOP: stopped_at - detected_at if detected_at is not None else None,
+            FIELD_RECEIVED_TO_STOP: stopped_at - received_at
+        }
+        self.events.append(event)
+        SAFETY_STOP_LATENCY.observe(event[FIELD_RECEIVED_TO_STOP], FIELD_RECEIVED_TO_STOP)
+        if detected_at is not None:
+            SAFETY_STOP_LATENCY.observe(event[FIELD_DETECTION_TO_STOP], FIELD_DETECTION_TO_STOP)
+
+        detection_ms = "unknown" if detected_at is None else f"{event[FIELD_DETECTION_TO_STOP]*1000:.1f} ms"
+        get_logger(__name__).log(logging.WARNING,
+                                 "Safety stop latency: detection to stop %s, received to stop %.1f ms",
+                                 detection_ms, event[FIELD_RECEIVED_TO_STOP]*1000)
+        return event
+
+    def summary(self):
+        """
+        Returns:
+            dict: amount of events, mean and max latencies in seconds
+        """
+        result = {"count": len(self.events)}
+        for field in (FIELD_DETECTION_TO_STOP, FIELD_RECEIVED_TO_STOP):
+            values = [event[field] for event in self.events if event[field] is not None]
+            result[f"{field}_mean"] = sum(values)/len(values) if values else None
+            result[f"{field}_max"] = max(values) if values else None
+        return result
@@ -1,21 +1,32 @@
-from flask import Flask, request
+from flask import Flask, Response, request
 from flask_socketio import SocketIO
 import logging
-from message_server.globalconfig import GlobalConfig
-from message_server.roc_logging import setup_logging, get_logger
+from message_server.settings import Settings, SERVER_MODE_THREADING, SERVER_MODE_ASYNCIO
+from message_server.roc_logging import setup_logging, stop_logging, get_logger
 from message_server.robot_controller import RobotController
 from message_server.message_handler import MessageHandler
+from message_server.messages import decode_message, MessageError
+from message_server.motion_monitor import MotionMonitor
+from message_server.pose_correction import PoseCorrection
+from message_server.camera_intrinsics import CameraIntrinsics
+from message_server.tracing import setup_tracing, get_tracer, span
+from message_server.metrics import registry, CONTENT_TYPE, MESSAGE_ERRORS, CLIENTS
+from message_server.recorder import TelemetryRecorder
+from message_server.telemetry import TelemetryStore, TelemetryReceiver
 
 FIELD_MESSAGE_TYPE = "message_type"
 FIELD_CONTENT = "content"
 FIELD_DATA = "data"
 FIELD_ERROR = "error"
-FIELD_ROBOT = "ROBOT"
-FIELD_CAMERA = "CAMERA"
-FIELD_SERVERCONFIG = "SERVERCONFIG"
+FIELD_COUNT = "count"
+FIELD_CYCLE_ID = "cycle_id"
+FIELD_PATH = "path"
+FIELD_SPANS = "spans"
 CMD = "cmd"
 MSG = "msg"
 TGT_ALL = "message_all"
+ERR_DECODE = "decode"
+ERR_HANDLING = "handling"
 
 class Server():
     """
@@ -28,44 +39,35 @@ class Server():
         self.socketio = None
         self.robot_controller = None
         self.message_handler = None
+        self.telemetry_store = None
+        self.telemetry_receiver = None
+        self.recorder = None
+        self.camera_intrinsics = None
 
-    def start(self, config: GlobalConfig):
+    def start(self, settings: Settings):
         """
         This method sets up the Flask server using the 
-        config settings set in GlobalConfig (default: config.ini)
+        settings loaded from the config (default: config.ini)
 
 
         Args:
-            config (GlobalConfig)
+            settings (Settings)
         """
 
-        setup_logging(config)
+        setup_logging(settings.logging)
         get_logger(__name__).log(
             100,
-            f"Flask server starting..."
+            "Flask server starting..."
         )
         
         self.server = Flask(__name__)
         self.socketio = SocketIO(self.server)
 
-        host = config[FIELD_SERVERCONFIG, "host"]
-        port = config[FIELD_SERVERCONFIG, "port"]
-        debug = eval(config[FIELD_SERVERCONFIG, "debug"])
+        host = settings.server.host
+        port = settings.server.port
+        debug = settings.server.debug
 
-        robot_ip = config[FIELD_ROBOT, "ip"]
-        robot_port = config[FIELD_ROBOT, "port"]
-        home_position = eval(config[FIELD_ROBOT, "home_position"])
-        detection_acc = eval(config[FIELD_ROBOT, "accurate_detection"])
-        plug_in_method = eval(config[FIELD_ROBOT,"plug_in_method"])
-
-        camera_os = eval(config[FIELD_CAMERA,"os"])
-
-        self.robot_controller = RobotController(robot_ip, robot_port, home_position, camera_os, detection_acc, plug_in_method)
-        self.message_handler = MessageHandler(self, self.robot_controller)
-
-        if detection_acc == False: #only used if rocsys-client detections are inaccurate -> use hard-coded positions
-            robot_fsps = eval(config[FIELD_ROBOT,"front_socket_positions"])
-            self.robot_controller.fsp_list = robot_fsps
+        self.setup(settings)
         
         @self.socketio.on("message_output")
         def receive_message(message):
@@ -76,24 +78,33 @@ class Server():
             Returns:
                 returns a message to original sender
             """
-            message_raw = eval(message)
-            try:
-                self.handle_message(message_raw)
-            except Exception as e:
-                get_logger(__name__).error(e)
-                self.send_message(TGT_ALL,{FIELD_ERROR:str(e)})
+            self.receive_message(message)
         
+        @self.socketio.on("telemetry")
+        def get_telemetry(request_data=None):
+            return self.get_telemetry(request_data)
+
+        @self.socketio.on("export_trace")
+        def export_trace(request_data=None):
+            return self.export_trace(request_data)
+
+        @self.server.route("/metrics")
+        def metrics():
+            return Response(registry.render(), mimetype=CONTENT_TYPE)
+
         @self.socketio.on("connect")
         def handle_connect():
             client_ip = request.environ["REMOTE_ADDR"]
+            CLIENTS.inc()
             get_logger(__name__).log(logging.INFO,
-                                     f"Client connected from IP: {client_ip}")
+                                     "Client connected from IP: %s", client_ip)
         
         @self.socketio.on("disconnect")
         def handle_disconnect():
             client_ip = request.environ["REMOTE_ADDR"]
+            CLIENTS.dec()
             get_logger(__name__).log(logging.INFO,
-                                     f"Client disconnected from IP: {client_ip}")
+                                     "Client disconnected from IP: %s", client_ip)
         
         try:
             self.socketio.run(self.server, host=host, port=port, debug=debug)
@@ -102,11 +113,159 @@ class Server():
             get_logger(__name__).error(e)
             raise
         finally:
-            self.message_handler.robot_socket.close()
+            self.shutdown()
             get_logger(__name__).log(
                 100,
-                f"Flask server shutting down"
+                "Flask server shutting down"
             )
+            stop_logging()
+
+    def setup(self, settings: Settings):
+        """
+        Creates the robot controller, message handler and telemetry stream
+        from the settings, independent of the server implementation
+
+        Args:
+            settings (Settings)
+        """
+        setup_tracing(settings.tracing)
+        robot = settings.robot
+        camera = settings.camera
+
+        #the positions are formatted into DRL commands, so the controller gets plain lists
+        self.robot_controller = RobotController(robot.ip, robot.port, robot.home_position.tolist(), camera.os.tolist(),
+                                                robot.accurate_detection, robot.plug_in_method)
+        self.message_handler = MessageHandler(self, self.robot_controller, robot.protocol, robot.ack_mode, robot.control_port)
+
+        if camera.pose_correction:
+            self.robot_controller.pose_correction = PoseCorrection.load(camera.pose_correction)
+            get_logger(__name__).log(logging.INFO,
+                                     "Pose correction of degree %s loaded from %s",
+                                     self.robot_controller.pose_correction.degree, camera.pose_correction)
+
+        if camera.intrinsics:
+            self.camera_intrinsics = CameraIntrinsics.load(camera.intrinsics)
+            get_logger(__name__).log(logging.INFO,
+                                     "Camera intrinsics loaded from %s (focal length %s, rms %s)",
+                                     camera.intrinsics, self.camera_intrinsics.focal_length, self.camera_intrinsics.rms)
+
+        if robot.accurate_detection == False: #only used if rocsys-client detections are inaccurate -> use hard-coded positions
+            self.robot_controller.fsp_list = {target: position.tolist() for target, position in robot.front_socket_positions.items()}
+
+        if settings.recorder.enabled:
+            self.recorder = TelemetryRecorder(settings.recorder.directory, settings.recorder.chunk_size, settings.recorder.max_chunks)
+            self.message_handler.recorder = self.recorder
+
+        if settings.telemetry.enabled:
+            self.telemetry_store = TelemetryStore(settings.telemetry.buffer_size)
+            self.telemetry_receiver = TelemetryReceiver(
+                robot.ip,
+                settings.telemetry.port,
+                settings.telemetry.rate,
+                self.telemetry_store
+            )
+            self.robot_controller.telemetry_store = self.telemetry_store
+            if self.recorder is not None and settings.recorder.record_stream:
+                self.telemetry_receiver.recorder = self.recorder
+            self.telemetry_receiver.start()
+
+            if robot.motion_events:
+                self.robot_controller.motion_monitor = MotionMonitor(
+                    self.telemetry_store,
+                    robot.motion_tolerance,
+                    robot.motion_settle_time,
+                    robot.motion_timeout
+                )
+
+    def shutdown(self):
+        """
+        Stops the telemetry stream and recorder and closes the robot connection,
+        the collected trace is exported if tracing is enabled
+        """
+        if get_tracer().enabled:
+            self.export_trace()
+        if self.telemetry_receiver is not None:
+            self.telemetry_receiver.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.message_handler.robot_socket.close()
+        if self.message_handler.control_socket is not None:
+            self.message_handler.control_socket.close()
+
+    def receive_message(self, message):
+        """
+        Parses and handles a 'message_output' event,
+        errors are reported to all clients
+
+        Args:
+            message (str): message from the rocsys client or safety-vision
+        """
+        message_raw = self.parse_message(message)
+        if message_raw is not None:
+            self.process_message(message_raw)
+
+    def parse_message(self, message):
+        """
+        Converts the raw 'message_output' payload into a Message,
+        invalid messages are reported to all clients
+
+        Returns:
+            Message: decoded message, None if the message is invalid
+        """
+        try:
+            return decode_message(message)
+        except MessageError as e:
+            MESSAGE_ERRORS.inc(ERR_DECODE)
+            get_logger(__name__).error(e)
+            self.send_message(TGT_ALL,{FIELD_ERROR:str(e)})
+            return None
+
+    def process_message(self, message_raw):
+        """
+        Handles a parsed message, errors are reported to all clients
+
+        Args:
+            message_raw (Message): decoded message
+        """
+        get_tracer().end_client_wait(message_raw.cycle_id)
+        with span(f"{message_raw.message_type}:{message_raw.content}", message_raw.cycle_id):
+            try:
+                self.handle_message(message_raw)
+            except Exception as e:
+                MESSAGE_ERRORS.inc(ERR_HANDLING)
+                get_logger(__name__).error(e)
+                self.send_message(TGT_ALL,{FIELD_ERROR:str(e)})
+
+    def get_telemetry(self, request_data=None):
+        """
+        Returns the latest robot telemetry without sending a robot command,
+        or the recent samples if a 'count' is requested
+
+        Returns:
+            dict/list: telemetry sample(s), None if the stream is disabled
+        """
+        if self.telemetry_store is None:
+            return None
+        if request_data and FIELD_COUNT in request_data:
+            return self.telemetry_store.get_recent(int(request_data[FIELD_COUNT]))
+        return self.telemetry_store.get_latest()
+
+    def export_trace(self, request_data=None):
+        """
+        Writes the collected spans as Chrome trace to the configured export path,
+        only the spans of one cycle if a 'cycle_id' is requested
+
+        Returns:
+            dict: export path and amount of exported spans, None if tracing is disabled
+        """
+        tracer = get_tracer()
+        if not tracer.enabled:
+            return None
+        cycle_id = request_data.get(FIELD_CYCLE_ID) if request_data else None
+        count = tracer.export_chrome_trace(cycle_id=cycle_id)
+        get_logger(__name__).log(logging.INFO,
+                                 "Exported %d spans to %s", count, tracer.export_path)
+        return {FIELD_PATH: tracer.export_path, FIELD_SPANS: count}
 
     def handle_message(self, message):
         """
@@ -114,24 +273,19 @@ class Server():
         them to the relating handler.
 
         Args:
-            message (str): {
+            message (Message): {
                 message_type (str): ('cmd', 'msg'),
                 content (str): ('socket_det'),
-                data (dict)
+                data (typed data object or dict)
             }
         """
-        missing_keys = {FIELD_MESSAGE_TYPE, FIELD_CONTENT, FIELD_DATA}.difference(message.keys())
-        
-        if missing_keys:
-            raise Exception(f"Message is missing key(s): {missing_keys}")
-
-        message_type = message[FIELD_MESSAGE_TYPE]
-        content = message[FIELD_CONTENT]
-        data = message[FIELD_DATA]
+        message_type = message.message_type
+        content = message.content
+        data = message.data
 
         get_logger(__name__).log(
             logging.INFO,
-            f"Received message {message}"
+            "Received message %s", message
         )
 
         if message_type == CMD:
@@ -141,7 +295,7 @@ class Server():
         else:
             get_logger(__name__).log(
                 logging.ERROR,
-                f"Unknown message type"
+                "Unknown message type"
             )
             raise
     
@@ -149,4 +303,4 @@ class Server():
         self.socketio.emit(client,message)
 
         get_logger(__name__).log(logging.INFO,
-                                 f"Sent message {message} to client {client}")
\ No newline at end of file
+                                 "Sent message %s to client %s", message, client)
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""
+Typed settings of the server, parsed once at startup from config.ini and the
+environment overrides (SECTION__key, see GlobalConfig).
+
+Every value is converted and validated when the settings are loaded, so a bad
+config fails at startup with the section and key in the error instead of in
+the middle of a charge cycle. Literals (lists, dicts, booleans, quoted strings,
+None) are parsed with ast.literal_eval, positions become read-only numpy arrays
+and the settings objects are frozen.
+"""
+import ast
+from dataclasses import dataclass
+from types import MappingProxyType
+import numpy as np
+from message_server.globalconfig import GlobalConfig
+from message_server.roc_logging import DEFAULT_LOG_DIR, DEFAULT_LOG_FILE_NAME, DEFAULT_LOG_LEVEL, DEFAULT_QUEUE_SIZE
+from message_server.robot_protocol import PROTOCOL_TEXT, PROTOCOL_BINARY, ACK_MODE_FIXED_WAIT, ACK_MODE_COMPLETION
+from message_server.robot_controller import MTD_WIGGLE, MTD_FORCE_CONTROL
+from message_server.motion_monitor import DEFAULT_TARGET_TOLERANCE, DEFAULT_SETTLE_TIME, DEFAULT_TIMEOUT
+from message_server.telemetry import DEFAULT_TELEMETRY_PORT, DEFAULT_TELEMETRY_RATE, DEFAULT_BUFFER_SIZE
+from message_server.recorder import (FIELD_RECORDER, DEFAULT_DIRECTORY as DEFAULT_RECORDER_DIRECTORY,
+                                     DEFAULT_CHUNK_SIZE, DEFAULT_MAX_CHUNKS)
+from message_server.tracing import (FIELD_TRACING, DEFAULT_BUFFER_SIZE as DEFAULT_TRACE_BUFFER_SIZE,
+                                    DEFAULT_EXPORT_PATH)
+
+FIELD_LOGGING = "LOGGING"
+FIELD_SERVERCONFIG = "SERVERCONFIG"
+FIELD_ROBOT = "ROBOT"
+FIELD_TELEMETRY = "TELEMETRY"
+FIELD_CAMERA = "CAMERA"
+DEFAULT_CONFIG_PATH = "config.ini"
+
+SERVER_MODE_THREADING = "threading"
+SERVER_MODE_ASYNCIO = "asyncio"
+SERVER_MODES = (SERVER_MODE_THREADING, SERVER_MODE_ASYNCIO)
+PROTOCOLS = (PROTOCOL_TEXT, PROTOCOL_BINARY)
+ACK_MODES = (ACK_MODE_FIXED_WAIT, ACK_MODE_COMPLETION)
+PLUG_IN_METHODS = (MTD_WIGGLE, MTD_FORCE_CONTROL)
+POSE_SIZE = 6
+REQUIRED = object() #marks settings without default
+
+class SettingsError(ValueError):
+    """
+    Raised when a config value is missing or invalid
+    """
+    pass
+
+def parse_literal(raw):
+    try:
+        return ast.literal_eval(raw.strip())
+    except (ValueError, SyntaxError):
+        raise ValueError("expected a Python literal (strings must be quoted)") from None
+
+def parse_bool(raw):
+    value = raw.strip()
+    if value not in ("True", "False"):
+        raise ValueError("expected True or False")
+    return value == "True"
+
+def parse_text(raw):
+    return raw.strip()
+
+def parse_optional_path(raw):
+    value = parse_literal(raw)
+    if value is not None and not isinstance(value, str):
+        raise ValueError("expected a quoted path or None")
+    return value
+
+def parse_optional_port(raw):
+    """
+    Port number, None if empty or 0 (disabled)
+    """
+    value = raw.strip()
+    if value in ("", "0", "None"):
+        return None
+    port = int(value)
+    if not 0 < port < 65536:
+        raise ValueError("expected a port between 1 and 65535, empty or 0 to disable")
+    return port
+
+def parse_pose(raw):
+    return to_pose(parse_literal(raw))
+
+def parse_poses(raw):
+    value = parse_literal(raw)
+    if not isinstance(value, dict):
+        raise ValueError("expected a dict of positions")
+    return MappingProxyType({key: to_pose(position) for key, position in value.items()})
+
+def to_pose(value):
+    """
+    Returns:
+        np.ndarray: read-only [x,y,z,rx,ry,rz]
+    """
+    pose = np.array(value, dtype=np.float64)
+    if pose.shape != (POSE_SIZE,):
+        raise ValueError(f"expected {POSE_SIZE} values [x,y,z,rx,ry,rz]")
+    pose.setflags(write=False)
+    return pose
+
+def choice(parse, choices):
+    """
+    Parser which only accepts one of the choices
+    """
+    def parse_choice(raw):
+        value = parse(raw)
+        if value not in choices:
+            raise ValueError(f"expected one of {choices}")
+        return value
+    return parse_choice
+
+def positive(parse):
+    """
+    Parser which only accepts values greater than 0
+    """
+    def parse_positive(raw):
+        value = parse(raw)
+        if not value > 0: #also rejects nan
+            raise ValueError("expected a value greater than 0")
+        return value
+    return parse_positive
+
+def read(config:GlobalConfig, section, key, parse, default=REQUIRED):
+    """
+    Read and convert one config value
+
+    Args:
+        config (GlobalConfig): config file and environment overrides
+        parse (function): converts the raw string
+        default: returned if the key is not set (already converted), REQUIRED if it must be set
+
+    Raises:
+        SettingsError: if the value is missing or cannot be converted
+    """
+    raw = config[section, key, None]
+    if raw is None:
+        if default is REQUIRED:
+            raise SettingsError(f"[{section}] {key} is missing")
+        return default
+    try:
+        return parse(raw)
+    except (ValueError, SyntaxError, TypeError) as e:
+        raise SettingsError(f"[{section}] {key} = {raw!r} is invalid: {e}") from None
+
+@dataclass(frozen=True)
+class LoggingSettings:
+    console_log_level: int
+    debug: bool
+    log_dir: str = DEFAULT_LOG_DIR
+    log_name: str = DEFAULT_LOG_FILE_NAME
+    min_level: int = DEFAULT_LOG_LEVEL
+    queued: bool = False
+    queue_size: int = DEFAULT_QUEUE_SIZE
+
+    @classmethod
+    def from_config(cls, config:GlobalConfig):
+        return cls(
+            console_log_level=read(config, FIELD_LOGGING, "console_log_level", int),
+            debug=read(config, FIELD_LOGGING, "debug", parse_bool),
+            log_dir=read(config, FIELD_LOGGING, "log_dir", parse_text, DEFAULT_LOG_DIR),
+            log_name=read(config, FIELD_LOGGING, "log_name", parse_text, DEFAULT_LOG_FILE_NAME),
+            min_level=read(config, FIELD_LOGGING, "min_level", int, DEFAULT_LOG_LEVEL),
+            queued=read(config, FIELD_LOGGING, "queued", parse_bool, False),
+            queue_size=read(config, FIELD_LOGGING, "queue_size", int, DEFAULT_QUEUE_SIZE),
+        )
+
+@dataclass(frozen=True)
+class ServerSettings:
+    host: str
+    port: int
+    debug: bool
+    mode: str = SERVER_MODE_THREADING
+
+    @classmethod
+    def from_config(cls, config:GlobalConfig):
+        return cls(
+            host=read(config, FIELD_SERVERCONFIG, "host", parse_text),
+            port=read(config, FIELD_SERVERCONFIG, "port", int),
+            debug=read(config, FIELD_SERVERCONFIG, "debug", parse_bool),
+            mode=read(config, FIELD_SERVERCONFIG, "mode", choice(parse_text, SERVER_MODES), SERVER_MODE_THREADING),
+        )
+
+@dataclass(frozen=True, eq=False)
+class RobotSettings:
+    ip: str
+    port: int
+    home_position: np.ndarray
+    accurate_detection: bool
+    plug_in_method: str
+    front_socket_positions: MappingProxyType = None #only required without accurate detection
+    protocol: str = PROTOCOL_TEXT
+    ack_mode: str = ACK_MODE_FIXED_WAIT
+    control_port: int = None
+    motion_events: bool = False
+    motion_tolerance: float = DEFAULT_TARGET_TOLERANCE
+    motion_settle_time: float = DEFAULT_SETTLE_TIME
+    motion_timeout: float = DEFAULT_TIMEOUT
+
+    @classmethod
+    def from_config(cls, config:GlobalConfig):
+        accurate_detection = read(config, FIELD_ROBOT, "accurate_detection", parse_bool)
+        return cls(
+            ip=read(config, FIELD_ROBOT, "ip", parse_text),
+            port=read(config, FIELD_ROBOT, "port", int),
+            home_position=read(config, FIELD_ROBOT, "home_position", parse_pose),
+            accurate_detection=accurate_detection,
+            plug_in_method=read(config, FIELD_ROBOT, "plug_in_method", choice(parse_literal, PLUG_IN_METHODS)),
+            front_socket_positions=read(config, FIELD_ROBOT, "front_socket_positions", parse_poses,
+                                        None if accurate_detection else REQUIRED),
+            protocol=read(config, FIELD_ROBOT, "protocol", choice(parse_text, PROTOCOLS), PROTOCOL_TEXT),
+            ack_mode=read(config, FIELD_ROBOT, "ack_mode", choice(parse_text, ACK_MODES), ACK_MODE_FIXED_WAIT),
+            control_port=read(config, FIELD_ROBOT, "control_port", parse_optional_port, None),
+            motion_events=read(config, FIELD_ROBOT, "motion_events", parse_bool, False),
+            motion_tolerance=read(config, FIELD_ROBOT, "motion_tolerance", float, DEFAULT_TARGET_TOLERANCE),
+            motion_settle_time=read(config, FIELD_ROBOT, "motion_settle_time", float, DEFAULT_SETTLE_TIME),
+            motion_timeout=read(config, FIELD_ROBOT, "motion_timeout", float, DEFAULT_TIMEOUT),
+        )
+
+@dataclass(frozen=True)
+class TelemetrySettings:
+    enabled: bool = False
+    port: int = DEFAULT_TELEMETRY_PORT
+    rate: float = DEFAULT_TELEMETRY_RATE
+    buffer_size: int = DEFAULT_BUFFER_SIZE
+
+    @classmethod
+    def from_config(cls, config:GlobalConfig):
+        return cls(
+            enabled=read(config, FIELD_TELEMETRY, "enabled", parse_bool, False),
+            port=read(config, FIELD_TELEMETRY, "port", int, DEFAULT_TELEMETRY_PORT),
+            rate=read(config, FIELD_TELEMETRY, "rate", positive(float), DEFAULT_TELEMETRY_RATE),
+            buffer_size=read(config, FIELD_TELEMETRY, "buffer_size", int, DEFAULT_BUFFER_SIZE),
+        )
+
+@dataclass(frozen=True)
+class RecorderSettings:
+    enabled: bool = False
+    directory: str = DEFAULT_RECORDER_DIRECTORY
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    max_chunks: int = DEFAULT_MAX_CHUNKS
+    record_stream: bool = True
+
+    @classmethod
+    def from_config(cls, config:GlobalConfig):
+        return cls(
+            enabled=read(config, FIELD_RECORDER, "enabled", parse_bool, False),
+            directory=read(config, FIELD_RECORDER, "directory", parse_text, DEFAULT_RECORDER_DIRECTORY),
+            chunk_size=read(config, FIELD_RECORDER, "chunk_size", positive(int), DEFAULT_CHUNK_SIZE),
+            max_chunks=read(config, FIELD_RECORDER, "max_chunks", positive(int), DEFAULT_MAX_CHUNKS),
+            record_stream=read(config, FIELD_RECORDER, "record_stream", parse_bool, True),
+        )
+
+@dataclass(frozen=True, eq=False)
+class CameraSettings:
+    os: np.ndarray
+    pose_correction: str = None
+    intrinsics: str = None
+
+    @classmethod
+    def from_config(cls, config:GlobalConfig):
+        return cls(
+            os=read(config, FIELD_CAMERA, "os", parse_pose),
+            pose_correction=read(config, FIELD_CAMERA, "pose_correction", parse_optional_path, None),
+            intrinsics=read(config, FIELD_CAMERA, "intrinsics", parse_optional_path, None),
+        )
+
+@dataclass(frozen=True)
+class TracingSettings:
+    enabled: bool = False
+    buffer_size: int = DEFAULT_TRACE_BUFFER_SIZE
+    export_path: str = DEFAULT_EXPORT_PATH
+
+    @classmethod
+    def from_config(cls, config:GlobalConfig):
+        return cls(
+            enabled=read(config, FIELD_TRACING, "enabled", parse_bool, False),
+            buffer_size=read(config, FIELD_TRACING, "buffer_size", int, DEFAULT_TRACE_BUFFER_SIZE),
+            export_path=read(config, FIELD_TRACING, "export_path", parse_text, DEFAULT_EXPORT_PATH),
+        )
+
+@dataclass(frozen=True, eq=False)
+class Settings:
+    """
+    All settings of the server, one attribute per config section
+    """
+    logging: LoggingSettings
+    server: ServerSettings
+    robot: RobotSettings
+    telemetry: TelemetrySettings
+    recorder: RecorderSettings
+    camera: CameraSettings
+    tracing: TracingSettings
+
+    @classmethod
+    def from_config(cls, config:GlobalConfig):
+        """
+        Raises:
+            SettingsError: if a value is missing or invalid
+        """
+        settings = cls(
+            logging=LoggingSettings.from_config(config),
+            server=ServerSettings.from_config(config),
+            robot=RobotSettings.from_config(config),
+            telemetry=TelemetrySettings.from_config(config),
+            recorder=RecorderSettings.from_config(config),
+            camera=CameraSettings.from_config(config),
+            tracing=TracingSettings.from_config(config),
+        )
+        if settings.robot.motion_events and not settings.telemetry.enabled:
+            raise SettingsError(f"[{FIELD_ROBOT}] motion_events requires the telemetry stream ([{FIELD_TELEMETRY}] enabled=True)")
+        return settings
+
+def load_settings(config_file=DEFAULT_CONFIG_PATH):
+    """
+    Load the settings from the config file and the environment overrides
+
+    Raises:
+        SettingsError: if a value is missing or invalid
+    """
+    return Settings.from_config(GlobalConfig(config_file))
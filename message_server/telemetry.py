@@ -0,0 +1,121 @@
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from message_server.roc_logging import get_logger
+from message_server.metrics import RECONNECTS
+from message_server.recorder import SOURCE_STREAM
+from message_server.robot_protocol import (MSG_TELEMETRY, MSG_TELEMETRY_SUBSCRIBE, send_frame, recv_frame,
+                                           encode_telemetry_rate, decode_telemetry)
+
+DEFAULT_TELEMETRY_PORT = 7010
+DEFAULT_TELEMETRY_RATE = 20
+DEFAULT_BUFFER_SIZE = 1000
+RECONNECT_DELAY = 2
+SOCKET_TELEMETRY = "telemetry"
+FIELD_TIMESTAMP = "timestamp"
+
+class TelemetryStore:
+    """
+    Holds the latest robot telemetry sample and a bounded buffer of recent samples.
+
+    There is a single writer (the TelemetryReceiver), readers never block it:
+    replacing the latest sample is a single reference assignment and
+    deque.append/list(deque) are atomic, so no lock is needed.
+    """
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.latest = None
+        self.samples = deque(maxlen=buffer_size)
+
+    def push(self, sample:dict):
+        self.samples.append(sample)
+        self.latest = sample
+
+    def get_latest(self, max_age=None):
+        """
+        Returns the latest sample
+
+        Args:
+            max_age (float): ignore samples older than max_age seconds
+
+        Returns:
+            dict: sample with 'timestamp' and the robot_protocol.TELEMETRY_FIELDS, or None
+        """
+        sample = self.latest
+        if sample is None:
+            return None
+        if max_age is not None and time.time() - sample[FIELD_TIMESTAMP] > max_age:
+            return None
+        return sample
+
+    def get_recent(self, count=None):
+        """
+        Returns the most recent samples, oldest first
+
+        Args:
+            count (int): maximum amount of samples, all buffered samples if None
+        """
+        samples = list(self.samples)
+        if count is not None:
+            samples = samples[-count:]
+        return samples
+
+class TelemetryReceiver(threading.Thread):
+    """
+    Background thread that subscribes to the telemetry socket of
+    setup_robot_server.py and pushes every received sample into a TelemetryStore.
+    Reconnects if the connection is lost.
+    """
+
+    def __init__(self, ip, port, rate, store:TelemetryStore):
+        super().__init__(name="telemetry-receiver", daemon=True)
+        self.ip = ip
+        self.port = int(port)
+        self.rate = float(rate)
+        if not self.rate > 0:
+            raise ValueError(f"Telemetry rate must be greater than 0, not {rate}")
+        self.store = store
+        self.recorder = None #TelemetryRecorder, set if the stream samples are recorded
+        self.running = False
+        self.telemetry_socket = None
+
+    def run(self):
+        self.running = True
+        connected = False
+        while self.running:
+            try:
+                self.telemetry_socket = socket.create_connection((self.ip, self.port), timeout=RECONNECT_DELAY)
+                if connected:
+                    RECONNECTS.inc(SOCKET_TELEMETRY)
+                connected = True
+                self.telemetry_socket.settimeout(max(RECONNECT_DELAY, 10/self.rate))
+                send_frame(self.telemetry_socket, MSG_TELEMETRY_SUBSCRIBE, encode_telemetry_rate(self.rate))
+                get_logger(__name__).log(logging.INFO,
+                                         "Telemetry stream connected with %s Hz", self.rate)
+                self._receive()
+            except Exception as e:
+                if self.running:
+                    get_logger(__name__).log(logging.WARNING,
+                                             "Telemetry stream interrupted: %s", e)
+                    time.sleep(RECONNECT_DELAY)
+            finally:
+                if self.telemetry_socket is not None:
+                    self.telemetry_socket.close()
+
+    def _receive(self):
+        while self.running:
+            msg_type, _, payload = recv_frame(self.telemetry_socket)
+            if msg_type != MSG_TELEMETRY:
+                continue
+            sample = decode_telemetry(payload)
+            sample[FIELD_TIMESTAMP] = time.time()
+            self.store.push(sample)
+            if self.recorder is not None:
+                self.recorder.record(sample, source=SOURCE_STREAM, timestamp=sample[FIELD_TIMESTAMP])
+
+    def stop(self):
+        self.running = False
+        if self.telemetry_socket is not None:
+            self.telemetry_socket.close()
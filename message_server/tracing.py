@@ -0,0 +1,197 @@
+"""
+Span-based tracing of the plug-in cycle.
+
+Spans are timed with the monotonic perf_counter and nest per thread (the
+current span is kept in a context variable). Every span carries the cycle id
+of the message that started the work, so all spans of one charge cycle can be
+followed across the Socket.IO handler, the robot round-trips and the motion
+monitor threads. Finished spans go into a bounded in-memory buffer and can be
+exported as Chrome trace file (chrome://tracing, ui.perfetto.dev).
+
+Time the server waits on a client (vision detection, client sleeps) is recorded
+as 'client' span from sending a message to the client until the next message
+of the same cycle arrives.
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+FIELD_TRACING = "TRACING"
+DEFAULT_BUFFER_SIZE = 100000
+DEFAULT_EXPORT_PATH = "logs/trace.json"
+CLIENT_THREAD = "client"
+MAX_CLIENT_WAITS = 16 #open client waits, the wait after the last message of a cycle is never closed
+
+#(span id, cycle id) of the span the current thread/context is in
+current_span = contextvars.ContextVar("current_span", default=(None, None))
+
+class Span:
+    """
+    Context manager of one timed span
+    """
+    __slots__ = ("tracer", "name", "attributes", "span_id", "parent_id", "cycle_id", "start", "token")
+
+    def __init__(self, tracer, name, cycle_id, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.cycle_id = cycle_id
+
+    def __enter__(self):
+        self.parent_id, parent_cycle = current_span.get()
+        if self.cycle_id is None:
+            self.cycle_id = parent_cycle
+        self.span_id = next(self.tracer.ids)
+        self.token = current_span.set((self.span_id, self.cycle_id))
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter_ns()
+        current_span.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.cycle_id, self.span_id, self.parent_id, self.start, end,
+                           threading.get_ident(), self.attributes)
+        return False
+
+class NullSpan:
+    """
+    Shared no-op span while tracing is disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Tracer:
+    """
+    Creates spans and collects the finished ones
+
+    Args:
+        enabled (bool): if False, span() returns a no-op span
+        buffer_size (int): amount of finished spans kept, the oldest are dropped
+        export_path (str): default file of export_chrome_trace
+    """
+
+    def __init__(self, enabled=False, buffer_size=DEFAULT_BUFFER_SIZE, export_path=DEFAULT_EXPORT_PATH):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.spans = deque(maxlen=buffer_size) #append is atomic, no lock needed
+        self.ids = itertools.count(1)
+        self.client_waits = {} #cycle id -> (name, start)
+        self.client_lock = threading.Lock()
+        #wall clock at perf_counter 0, to align traces of different processes
+        self.epoch_ns = time.time_ns() - time.perf_counter_ns()
+
+    def span(self, name, cycle_id=None, **attributes):
+        """
+        Args:
+            name (str): span name
+            cycle_id (str): cycle of the span, inherited from the parent span if None
+            attributes: additional values shown with the span
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, cycle_id, attributes)
+
+    def record(self, name, cycle_id, span_id, parent_id, start, end, thread, attributes):
+        self.spans.append((name, cycle_id, span_id, parent_id, start, end, thread, attributes))
+
+    def begin_client_wait(self, name):
+        """
+        The server handed the cycle to the client (e.g. 'take image')
+        """
+        cycle_id = current_cycle()
+        if self.enabled and cycle_id is not None:
+            with self.client_lock:
+                self.client_waits.pop(cycle_id, None)
+                self.client_waits[cycle_id] = (name, time.perf_counter_ns())
+                if len(self.client_waits) > MAX_CLIENT_WAITS:
+                    del self.client_waits[next(iter(self.client_waits))]
+
+    def end_client_wait(self, cycle_id):
+        """
+        The next message of the cycle arrived from the client
+        """
+        with self.client_lock:
+            wait = self.client_waits.pop(cycle_id, None)
+        if wait is None:
+            return
+        name, start = wait
+        self.record(f"client:{name}", cycle_id, next(self.ids), None, start, time.perf_counter_ns(),
+                    CLIENT_THREAD, {})
+
+    def export_chrome_trace(self, path=None, cycle_id=None):
+        """
+        Write the collected spans as Chrome trace events, one process per cycle
+
+        Args:
+            path (str): output file, export_path if None
+            cycle_id (str): only export this cycle
+
+        Returns:
+            int: amount of exported spans
+        """
+        events = []
+        pids = {}
+        for name, span_cycle, span_id, parent_id, start, end, thread, attributes in list(self.spans):
+            if cycle_id is not None and span_cycle != cycle_id:
+                continue
+            if span_cycle not in pids:
+                pids[span_cycle] = len(pids) + 1
+                events.append({"name": "process_name", "ph": "M", "pid": pids[span_cycle],
+                               "args": {"name": f"cycle {span_cycle}" if span_cycle else "no cycle"}})
+            events.append({
+                "name": name,
+                "ph": "X",
+                "ts": (start + self.epoch_ns) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": pids[span_cycle],
+                "tid": thread,
+                "args": {"cycle_id": span_cycle, "span_id": span_id, "parent_id": parent_id, **attributes},
+            })
+        path = path or self.export_path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        return len(events) - len(pids)
+
+tracer = Tracer()
+
+def setup_tracing(settings):
+    """
+    Enable the global tracer from the [TRACING] settings
+
+    Args:
+        settings (TracingSettings)
+    """
+    global tracer
+    tracer = Tracer(settings.enabled, settings.buffer_size, settings.export_path)
+    return tracer
+
+def get_tracer():
+    return tracer
+
+def span(name, cycle_id=None, **attributes):
+    return tracer.span(name, cycle_id, **attributes)
+
+def current_cycle():
+    return current_span.get()[1]
+
+def run_in_context(target):
+    """
+    Wrap a thread target so it runs in the current context (current span and cycle id)
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(target, *args, **kwargs)
@@ -0,0 +1,289 @@
+"""
+Rigid transforms of robot poses [x,y,z,rx,ry,rz] (mm/deg).
+
+Orientation convention - the one place it is defined for the server and the tools:
+the angles [rx,ry,rz] of a pose are the Doosan ZYZ Euler angles (A, B, C of posx),
+R = Rz(rx) @ Ry(ry) @ Rz(rz) with rotations about the current (intrinsic) axes.
+The robot reports and expects poses in this convention, so the camera offset
+([CAMERA] os) and the detections are given in it as well. Tools searching
+rotations in other parametrizations (calibration/rotation_offset.py) convert
+their result with matrix_to_zyz.
+A pose is the homogeneous 4x4 matrix [[R, t], [0, 1]]; the camera offset
+([CAMERA] os) is the transform from the camera to the robot reference, so a
+detection is converted with camera_transform @ detection.
+
+Single poses (one per detection) are transformed with plain floats, which is
+faster than numpy for 3x3 matrices; many poses at once (N x 6 arrays) with numpy.
+Euler angles are ambiguous, so the angles of a transformed pose are taken from the
+solution closest to the angles of the input pose (no jumps of 360 degrees or
+between equivalent solutions, e.g. ry = -2 instead of rx+180, 2, rz+180).
+"""
+import math
+import numpy as np
+
+UNIT_M_RAD = "m/rad"
+UNIT_MM_DEG = "mm/deg"
+MM_PER_M = 1000.0
+GIMBAL_EPSILON = 1e-9 #cos(ry) below which rx and rz are not distinguishable
+
+def to_mm_deg(poses):
+    """
+    Convert poses from m/rad to mm/deg
+
+    Args:
+        poses (array): shape (N, 6) or (6,)
+
+    Returns:
+        np.ndarray: converted poses, same shape
+    """
+    poses = np.asarray(poses, dtype=np.float64)
+    return np.concatenate([poses[..., :3]*MM_PER_M, np.degrees(poses[..., 3:6])], axis=-1)
+
+def to_m_rad(poses):
+    """
+    Convert poses from mm/deg to m/rad
+
+    Args:
+        poses (array): shape (N, 6) or (6,)
+
+    Returns:
+        np.ndarray: converted poses, same shape
+    """
+    poses = np.asarray(poses, dtype=np.float64)
+    return np.concatenate([poses[..., :3]/MM_PER_M, np.radians(poses[..., 3:6])], axis=-1)
+
+def convert_pose(unit, coords):
+    """
+    Convert a single pose to mm/deg
+
+    Args:
+        unit (str): 'm/rad','mm/deg'
+        coords (list): [x,y,z,rx,ry,rz]
+
+    Returns:
+        list: [x,y,z,rx,ry,rz] in mm/deg as plain floats
+    """
+    if unit == UNIT_M_RAD:
+        return [float(x)*MM_PER_M for x in coords[0:3]] + [math.degrees(rad) for rad in coords[3:6]]
+    if unit == UNIT_MM_DEG:
+        return [float(x) for x in coords[0:6]]
+    raise ValueError(f"Unknown unit '{unit}'")
+
+def zyz_to_matrix(angles):
+    """
+    Rotation matrices Rz(a) @ Ry(b) @ Rz(c)
+
+    Args:
+        angles (array): Doosan angles [a,b,c] (rx, ry, rz of the pose) in degrees, shape (N, 3) or (3,)
+
+    Returns:
+        np.ndarray: shape (N, 3, 3) or (3, 3)
+    """
+    a, b, c = np.moveaxis(np.radians(np.asarray(angles, dtype=np.float64)), -1, 0)
+    ca, sa = np.cos(a), np.sin(a)
+    cb, sb = np.cos(b), np.sin(b)
+    cc, sc = np.cos(c), np.sin(c)
+    return np.stack([
+        np.stack([ca*cb*cc - sa*sc, -ca*cb*sc - sa*cc, ca*sb], axis=-1),
+        np.stack([sa*cb*cc + ca*sc, -sa*cb*sc + ca*cc, sa*sb], axis=-1),
+        np.stack([-sb*cc, sb*sc, cb], axis=-1),
+    ], axis=-2)
+
+def _wrap_to(angles, reference):
+    """
+    Shift angles by multiples of 360 degrees to the value closest to the reference
+    """
+    return angles + 360.0*np.round((reference - angles)/360.0)
+
+def matrix_to_zyz(matrices, reference=None):
+    """
+    Doosan ZYZ angles of rotation matrices (inverse of zyz_to_matrix)
+
+    Args:
+        matrices (array): shape (N, 3, 3) or (3, 3)
+        reference (array): angles the result should be closest to, same shape as the result;
+            None for the solution with b in [0, 180] and a, c in (-180, 180]
+
+    Returns:
+        np.ndarray: angles [a,b,c] in degrees, shape (N, 3) or (3,)
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    r00, r02 = matrices[..., 0, 0], matrices[..., 0, 2]
+    r10, r11, r12 = matrices[..., 1, 0], matrices[..., 1, 1], matrices[..., 1, 2]
+    r20, r21, r22 = matrices[..., 2, 0], matrices[..., 2, 1], matrices[..., 2, 2]
+    sin_b = np.hypot(r02, r12)
+    gimbal = sin_b < GIMBAL_EPSILON
+    angles = np.degrees(np.stack([np.arctan2(r12, r02), np.arctan2(sin_b, r22), np.arctan2(r21, -r20)], axis=-1))
+    if np.any(gimbal):
+        #b = 0 or 180: only a+c (or a-c) is defined, c is kept from the reference
+        c = np.zeros_like(r00) if reference is None else np.asarray(reference, dtype=np.float64)[..., 2]
+        flipped = r22 < 0
+        a = np.where(flipped, np.degrees(np.arctan2(-r10, r11)) + c, np.degrees(np.arctan2(r10, r00)) - c)
+        gimbal_angles = np.stack([a, np.where(flipped, 180.0, 0.0), c], axis=-1)
+        angles = np.where(gimbal[..., None], gimbal_angles, angles)
+    if reference is None:
+        return angles
+
+    reference = np.asarray(reference, dtype=np.float64)
+    #the equivalent solution (a+180, -b, c+180), closest to the reference
+    other = angles + np.array([180.0, 0.0, 180.0])
+    other[..., 1] = -angles[..., 1]
+    angles = _wrap_to(angles, reference)
+    other = _wrap_to(other, reference)
+    closer = np.sum((other - reference)**2, axis=-1) < np.sum((angles - reference)**2, axis=-1)
+    return np.where((closer & ~gimbal)[..., None], other, angles)
+
+def pose_to_matrix(poses):
+    """
+    Homogeneous matrices of poses
+
+    Args:
+        poses (array): [x,y,z,rx,ry,rz] in mm/deg, shape (N, 6) or (6,)
+
+    Returns:
+        np.ndarray: shape (N, 4, 4) or (4, 4)
+    """
+    poses = np.asarray(poses, dtype=np.float64)
+    matrices = np.zeros(poses.shape[:-1] + (4, 4))
+    matrices[..., :3, :3] = zyz_to_matrix(poses[..., 3:6])
+    matrices[..., :3, 3] = poses[..., :3]
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+def matrix_to_pose(matrices, reference=None):
+    """
+    Poses of homogeneous matrices (inverse of pose_to_matrix)
+
+    Args:
+        matrices (array): shape (N, 4, 4) or (4, 4)
+        reference (array): angles [rx,ry,rz] the result should be closest to (see matrix_to_zyz)
+
+    Returns:
+        np.ndarray: [x,y,z,rx,ry,rz] in mm/deg, shape (N, 6) or (6,)
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    return np.concatenate([matrices[..., :3, 3], matrix_to_zyz(matrices[..., :3, :3], reference)], axis=-1)
+
+def _rotation_rows(a, b, c):
+    """
+    Rotation matrix Rz(a) @ Ry(b) @ Rz(c) of one pose as plain floats (degrees)
+    """
+    a, b, c = math.radians(a), math.radians(b), math.radians(c)
+    ca, sa = math.cos(a), math.sin(a)
+    cb, sb = math.cos(b), math.sin(b)
+    cc, sc = math.cos(c), math.sin(c)
+    return (
+        (ca*cb*cc - sa*sc, -ca*cb*sc - sa*cc, ca*sb),
+        (sa*cb*cc + ca*sc, -sa*cb*sc + ca*cc, sa*sb),
+        (-sb*cc, sb*sc, cb),
+    )
+
+def _closest_angle(angle, reference):
+    return angle + 360.0*round((reference - angle)/360.0)
+
+def _rows_to_zyz(rows, reference):
+    """
+    Angles of a rotation matrix given as plain floats, closest to the reference angles
+    (the same solution as matrix_to_zyz)
+    """
+    (r00, _, r02), (r10, r11, r12), (r20, r21, r22) = rows
+    ref_a, ref_b, ref_c = reference
+    sin_b = math.hypot(r02, r12)
+    if sin_b < GIMBAL_EPSILON:
+        if r22 < 0:
+            return [math.degrees(math.atan2(-r10, r11)) + ref_c, 180.0, float(ref_c)]
+        return [math.degrees(math.atan2(r10, r00)) - ref_c, 0.0, float(ref_c)]
+    a = math.degrees(math.atan2(r12, r02))
+    b = math.degrees(math.atan2(sin_b, r22))
+    c = math.degrees(math.atan2(r21, -r20))
+    a1, b1, c1 = _closest_angle(a, ref_a), _closest_angle(b, ref_b), _closest_angle(c, ref_c)
+    a2, b2, c2 = _closest_angle(a + 180.0, ref_a), _closest_angle(-b, ref_b), _closest_angle(c + 180.0, ref_c)
+    if (a2-ref_a)**2 + (b2-ref_b)**2 + (c2-ref_c)**2 < (a1-ref_a)**2 + (b1-ref_b)**2 + (c1-ref_c)**2:
+        return [a2, b2, c2]
+    return [a1, b1, c1]
+
+class Transform:
+    """
+    Rigid transform as homogeneous 4x4 matrix,
+    precomputed once (e.g. the camera offset) and applied per detection
+
+    Args:
+        matrix (array): 4x4 homogeneous matrix
+    """
+
+    def __init__(self, matrix):
+        matrix = np.array(matrix, dtype=np.float64)
+        if matrix.shape != (4, 4):
+            raise ValueError(f"Transform matrix must have the shape (4, 4), not {matrix.shape}")
+        self.matrix = matrix
+        #plain floats for single poses
+        self.rotation_rows = tuple(tuple(row) for row in matrix[:3, :3].tolist())
+        self.translation = tuple(matrix[:3, 3].tolist())
+        self.is_translation = bool(np.array_equal(matrix[:3, :3], np.eye(3)))
+
+    @classmethod
+    def from_pose(cls, pose):
+        """
+        Args:
+            pose (list): [x,y,z,rx,ry,rz] in mm/deg
+        """
+        return cls(pose_to_matrix(pose))
+
+    @classmethod
+    def identity(cls):
+        return cls(np.eye(4))
+
+    def __matmul__(self, other):
+        return Transform(self.matrix @ other.matrix)
+
+    def inverse(self):
+        rotation = self.matrix[:3, :3].T
+        matrix = np.eye(4)
+        matrix[:3, :3] = rotation
+        matrix[:3, 3] = -rotation @ self.matrix[:3, 3]
+        return Transform(matrix)
+
+    def to_pose(self, reference=None):
+        """
+        Returns:
+            list: [x,y,z,rx,ry,rz] in mm/deg
+        """
+        return matrix_to_pose(self.matrix, reference).tolist()
+
+    def apply(self, coords:list):
+        """
+        Transform a single pose: self @ pose
+
+        Args:
+            coords (list): [x,y,z,rx,ry,rz] in mm/deg
+
+        Returns:
+            list: transformed pose as plain floats, the angles closest to the input angles
+        """
+        x, y, z, rx, ry, rz = coords
+        tx, ty, tz = self.translation
+        if self.is_translation:
+            #the orientation is not changed, keep the angles as they are
+            return [x + tx, y + ty, z + tz, float(rx), float(ry), float(rz)]
+        (a00, a01, a02), (a10, a11, a12), (a20, a21, a22) = self.rotation_rows
+        (b00, b01, b02), (b10, b11, b12), (b20, b21, b22) = _rotation_rows(rx, ry, rz)
+        rows = (
+            (a00*b00 + a01*b10 + a02*b20, 0.0, a00*b02 + a01*b12 + a02*b22), #r01 is not needed for the angles
+            (a10*b00 + a11*b10 + a12*b20, a10*b01 + a11*b11 + a12*b21, a10*b02 + a11*b12 + a12*b22),
+            (a20*b00 + a21*b10 + a22*b20, a20*b01 + a21*b11 + a22*b21, a20*b02 + a21*b12 + a22*b22),
+        )
+        return [a00*x + a01*y + a02*z + tx, a10*x + a11*y + a12*z + ty, a20*x + a21*y + a22*z + tz] \
+            + _rows_to_zyz(rows, (rx, ry, rz))
+
+    def apply_array(self, poses):
+        """
+        Transform many poses at once
+
+        Args:
+            poses (array): shape (N, 6) or (6,), mm/deg
+
+        Returns:
+            np.ndarray: transformed poses, same shape
+        """
+        poses = np.asarray(poses, dtype=np.float64)
+        return matrix_to_pose(self.matrix @ pose_to_matrix(poses), poses[..., 3:6])
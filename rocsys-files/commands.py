@@ -1,11 +1,15 @@
-import subprocess
 import json
+import os
 import time
 import csv
 import math
+import uuid
+from collections import namedtuple
+from vision_client import (create_vision_client, BACKEND_DOCKER, STATUS_SUCCESS, STATUS_NO_SOCKET,
+                           STATUS_UNRELIABLE, STATUS_CONTAINER_DOWN)
 
-DOCKER_COMMAND = "docker exec -it vision-vision-1 bash -c 'rocsys-vision-client DETECT_SOCKET_FAST'"
 SLEEP_TIME = 12 #needed for async movements
+VISION_BACKEND = os.getenv("ROCSYS_VISION_BACKEND", BACKEND_DOCKER) #'stub' to run without the vision container
 
 MST_CMD = "cmd"
 MST_MSG = "msg"
@@ -20,6 +24,7 @@ CT_COLLECT_DATA = "collect_data"
 FIELD_MESSAGE_TYPE = "message_type"
 FIELD_CONTENT = "content"
 FIELD_DATA = "data"
+FIELD_CYCLE_ID = "cycle_id"
 
 RES_NO_SUCCESS = 0
 RES_SUCCESS = 1
@@ -29,10 +34,19 @@ MSG_TAKE = "take image"
 MSG_RETAKE = "retake image"
 MSG_IN_POSITION = "in position"
 
-def extract_coords(text=str):
-    coords_str = text.split('Pose: ')[1].split('\n')[0]
-    coords = eval(coords_str)
-    return coords
+vision_client = None
+
+#end of an async motion as reported by the server, waited: seconds the server already waited for the motion
+MotionStatus = namedtuple("MotionStatus", ["complete", "interrupted", "waited"])
+
+def get_vision_client():
+    """
+    Returns the shared vision client, which stays warm between detections
+    """
+    global vision_client
+    if vision_client is None:
+        vision_client = create_vision_client(VISION_BACKEND)
+    return vision_client
 
 def convert_coords(coords):
     converted_coords = list()
@@ -40,30 +54,65 @@ def convert_coords(coords):
     converted_coords[3:5] = [math.degrees(rad) for rad in coords[3:6]]
     return converted_coords
 
+def read_motion_message(msg):
+    """
+    Messages after async movements are sent as dict with 'motion_complete'
+    if the server detects the end of the motion
+
+    Returns:
+        tuple: (message (str), MotionStatus)
+    """
+    if isinstance(msg, dict):
+        return msg.get("message"), MotionStatus(msg.get("motion_complete", False), msg.get("interrupted", False),
+                                                msg.get("duration", 0))
+    return msg, MotionStatus(False, False, 0)
+
+def wait_for_motion(motion, delay):
+    """
+    Wait for the end of an async motion:
+    no wait if the server reported it as complete or interrupted,
+    otherwise the rest of the fixed delay the server did not already wait
+
+    Returns:
+        bool: False if the motion was interrupted by a safety stop and the cycle must not continue
+    """
+    if motion.interrupted:
+        print("Motion interrupted by safety stop")
+        return False
+    if motion.complete:
+        print(f"Motion complete - skipped fixed delay of {delay}s")
+    else:
+        time.sleep(max(delay - motion.waited, 0))
+    return True
+
 class PlugInCommand():
     """
     This command sends a message to the main script to execute the plug-in motions. 
     First, a message is sent to reset the robot to home position.
     Then, depending on the response take an image or send a plug-in command to the robot.
     A delay is implemented between some commands to allow the main script to continue running and allow async movements to complete.
+    All messages carry the id of the charge cycle, so the server can trace the cycle across messages.
     """
-    def __init__(self, url, target,sio):
+    def __init__(self, url, target,sio,vision=None):
         self.flask_url = url
         self.target = target
+        self.cycle_id = uuid.uuid4().hex[:12]
         self.sio = sio
+        self.vision = vision if vision is not None else get_vision_client()
         
         self.sio.on("take_image",self.handle_response)
     
     def handle_response(self,msg):
         print("Received message:",msg)
+        msg, motion = read_motion_message(msg)
         if msg == MSG_TAKE:
             self.send_message(self.take_image())
         elif msg == MSG_RETAKE:
-            time.sleep(SLEEP_TIME)
-            self.send_message(self.take_image())
+            if wait_for_motion(motion, SLEEP_TIME):
+                self.send_message(self.take_image())
         elif msg == MSG_IN_POSITION:
-            time.sleep(SLEEP_TIME*1.5)
-            self.send_message(self.plug_in())
+            if wait_for_motion(motion, SLEEP_TIME*1.5):
+                self.send_message(self.plug_in())
         
     def execute(self):
         #first move to home position
@@ -81,61 +130,59 @@ class PlugInCommand():
         output = {
             FIELD_MESSAGE_TYPE: message_type,
             FIELD_CONTENT: content,
-            FIELD_DATA: str(data)
+            FIELD_DATA: data,
+            FIELD_CYCLE_ID: self.cycle_id
         }
         
         return output
     
     def take_image(self):
-        try:
-            docker_output = subprocess.check_output(DOCKER_COMMAND, shell=True, text=True, stderr=subprocess.STDOUT).strip()
-        except subprocess.CalledProcessError as e:
-            docker_output = e.output
+        detection = self.vision.detect()
 
         message_type = MST_MSG
         content = None
         data = {}
 
-        if "not running" in docker_output:
-            print(f"Error: {docker_output}")
+        if detection.status == STATUS_CONTAINER_DOWN:
+            print(f"Error: {detection.raw}")
             content = "container_down"
         else:
             print("Successfully received message from docker container!")
 
-        if "success" in docker_output:
+        if detection.status == STATUS_SUCCESS:
             message_type = MST_CMD
             content = CT_SOCKET_DET
             
             result = RES_SUCCESS
             unit = "m/rad"
-            coords = extract_coords(docker_output)
             data = {
                 "result": result,
                 "unit": unit,
-                "coords": coords
+                "coords": detection.coords
             }
-        elif "No socket detected" in docker_output or "unreliable" in docker_output:
+        elif detection.status == STATUS_NO_SOCKET or detection.status == STATUS_UNRELIABLE:
             message_type = MST_CMD
             content = CT_SOCKET_DET
-            result = RES_NO_SUCCESS if "No socket detected" in docker_output else RES_UNRELIABLE
+            result = RES_NO_SUCCESS if detection.status == STATUS_NO_SOCKET else RES_UNRELIABLE
             data = {
                 "result": result
             }
         elif content:
             data = {
-                "message": docker_output
+                "message": detection.raw
             }
         else:
             content = CT_UNKNOWN
             data = {
-                "message": docker_output
+                "message": detection.raw
             }
 
 
         output = {
             FIELD_MESSAGE_TYPE: message_type,
             FIELD_CONTENT: content,
-            FIELD_DATA: data
+            FIELD_DATA: data,
+            FIELD_CYCLE_ID: self.cycle_id
         }
         
         return output
@@ -148,16 +195,19 @@ class PlugInCommand():
         output = {
             FIELD_MESSAGE_TYPE: message_type,
             FIELD_CONTENT: content,
-            FIELD_DATA: data
+            FIELD_DATA: data,
+            FIELD_CYCLE_ID: self.cycle_id
         }
         return output
     
 class PlugOutCommand():
     """
-    This command sends a message to the main script to execute the plug-out motions
+    This command sends a message to the main script to execute the plug-out motions,
+    cycle_id continues the cycle of the plug-in
     """
-    def __init__(self, url):
+    def __init__(self, url, cycle_id=None):
         self.flask_url = url
+        self.cycle_id = cycle_id
     
     def execute(self):
         message_type = MST_CMD
@@ -169,6 +219,8 @@ class PlugOutCommand():
             FIELD_CONTENT: content,
             FIELD_DATA: data
         }
+        if self.cycle_id is not None:
+            output[FIELD_CYCLE_ID] = self.cycle_id
         
         return output
 
@@ -205,24 +257,19 @@ class CollectDataCommand(): #Currently unused and not updated
         results = list()
         coords_list = list()
         for i in range(1):
-            try:
-                docker_output = subprocess.check_output(DOCKER_COMMAND, shell=True, text=True, stderr=subprocess.STDOUT).strip()
-            except subprocess.CalledProcessError as e:
-                docker_output = e.output
+            detection = get_vision_client().detect()
 
-            if "not running" in docker_output:
-                print("docker:",docker_output)
+            if detection.status == STATUS_CONTAINER_DOWN:
+                print("docker:",detection.raw)
             else:
                 print("image taken")
             result = None
             
-            if "success" in docker_output:        
+            if detection.status == STATUS_SUCCESS:
                 result = RES_SUCCESS
-                coords = extract_coords(docker_output)
-                coords_list.append(coords)
-            elif "No socket detected" in docker_output or "unreliable" in docker_output:
-                result = RES_NO_SUCCESS if "No socket detected" in docker_output else RES_UNRELIABLE
-                coords = []
+                coords_list.append(detection.coords)
+            elif detection.status == STATUS_NO_SOCKET or detection.status == STATUS_UNRELIABLE:
+                result = RES_NO_SUCCESS if detection.status == STATUS_NO_SOCKET else RES_UNRELIABLE
             
             results.append(result)
         return results, coords_list
@@ -1,11 +1,9 @@
-import subprocess
 import math
 import csv
+from vision_client import DockerVisionClient, STATUS_SUCCESS, STATUS_NO_SOCKET, STATUS_UNRELIABLE, STATUS_CONTAINER_DOWN
 
 AMOUNT_TIMES = 1
 
-DOCKER_COMMAND = "docker exec -it vision-vision-1 bash -c 'rocsys-vision-client DETECT_SOCKET_FAST'"
-
 RES_NO_SUCCESS = 0
 RES_SUCCESS = 1
 RES_UNRELIABLE = 2
@@ -16,36 +14,27 @@ def convert_coords(coords):
     converted_coords[3:5] = [math.degrees(rad) for rad in coords[3:6]]
     return converted_coords
 
-def extract_coords(text=str):
-    coords_str = text.split('Pose: ')[1].split('\n')[0]
-    coords = eval(coords_str)
-    coords = convert_coords(coords)
-    return coords
-    
 def take_image(amount):
     results = list()
     coords_list = list()
+    vision = DockerVisionClient() #one warm shell for all images
     for i in range(amount):
-        try:
-            docker_output = subprocess.check_output(DOCKER_COMMAND, shell=True, text=True, stderr=subprocess.STDOUT).strip()
-        except subprocess.CalledProcessError as e:
-            docker_output = e.output
+        detection = vision.detect()
 
-        if "not running" in docker_output:
-            print(docker_output)
+        if detection.status == STATUS_CONTAINER_DOWN:
+            print(detection.raw)
         else:
             print("image taken")
         result = None
         
-        if "success" in docker_output:        
+        if detection.status == STATUS_SUCCESS:
             result = RES_SUCCESS
-            coords = extract_coords(docker_output)
-            coords_list.append(coords)
-        elif "No socket detected" in docker_output or "unreliable" in docker_output:
-            result = RES_NO_SUCCESS if "No socket detected" in docker_output else RES_UNRELIABLE
-            coords = []
+            coords_list.append(convert_coords(detection.coords))
+        elif detection.status == STATUS_NO_SOCKET or detection.status == STATUS_UNRELIABLE:
+            result = RES_NO_SUCCESS if detection.status == STATUS_NO_SOCKET else RES_UNRELIABLE
         
         results.append(result)
+    vision.close()
     return results, coords_list
 
 file_path = "coord.csv"
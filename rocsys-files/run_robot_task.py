@@ -7,9 +7,8 @@ Server github:
 import sys
 import socketio
 import json
-import time
 from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QGridLayout, QLabel
-from commands import PlugInCommand, PlugOutCommand, CollectDataCommand
+from commands import PlugInCommand, PlugOutCommand, CollectDataCommand, read_motion_message, wait_for_motion
 
 PLUG_IN_COMMAND = "plug-in"
 PLUG_OUT_COMMAND = "plug-out"
@@ -154,7 +153,7 @@ class SocketIOGUI(QWidget):
     
     def plug_out(self):
         if self.status == Status.Charging or self.status == Status.Connected or self.status == Status.Stopped:
-            cmd = PlugOutCommand(self.url)
+            cmd = PlugOutCommand(self.url, self.cmd.cycle_id if hasattr(self, "cmd") else None)
             self.execute_command(cmd)
             self.update_status(Status.PluggingOut)
     
@@ -179,10 +178,10 @@ def on_disconnect():
 
 def on_message(message):
     print(print(f"Received message from server: {message}"))
-    if message == "plug_in_complete":
+    message, motion = read_motion_message(message)
+    if message == "plug_in_complete" and not motion.interrupted: #interrupted by a safety stop
         gui.update_status(Status.Charging)
-    if message == "plug_out_complete":
-        time.sleep(9) #to allow for async movement to complete
+    if message == "plug_out_complete" and wait_for_motion(motion, 9): #to allow for async movement to complete
         gui.update_status(Status.Connected)
     if message == "safety_stop_response" and (gui.status == Status.PluggingIn or gui.status == Status.PluggingOut):
         gui.update_status(Status.Stopped)
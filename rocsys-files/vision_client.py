@@ -0,0 +1,170 @@
+"""
+Vision workers for the socket detection.
+
+DockerVisionClient keeps one shell in the vision container open and runs the
+rocsys-vision-client in it for every detection, instead of paying a new
+'docker exec' + shell startup per image.
+Limitation: the rocsys-vision-client itself is still started per detection -
+it only offers one-shot commands (DETECT_SOCKET_FAST), so its own startup
+(and whatever it loads) is still paid for every image. Only the docker exec
+and the shell stay warm.
+StubVisionClient returns configured results, to run the plug-in flow without the container.
+"""
+import ast
+import queue
+import subprocess
+import threading
+import time
+
+CONTAINER_NAME = "vision-vision-1"
+VISION_COMMAND = "rocsys-vision-client DETECT_SOCKET_FAST"
+DOCKER_SHELL_COMMAND = ["docker", "exec", "-i", CONTAINER_NAME, "bash"]
+END_MARKER = "__VISION_DETECTION_DONE__"
+DETECTION_TIMEOUT = 60
+
+BACKEND_DOCKER = "docker"
+BACKEND_STUB = "stub"
+
+STATUS_SUCCESS = "success"
+STATUS_NO_SOCKET = "no_socket"
+STATUS_UNRELIABLE = "unreliable"
+STATUS_CONTAINER_DOWN = "container_down"
+STATUS_UNKNOWN = "unknown"
+
+class VisionResult:
+    """
+    Structured result of one detection
+
+    Attributes:
+        status (str): one of the STATUS_* constants
+        coords (list): [x,y,z,rx,ry,rz] in m/rad, only for STATUS_SUCCESS
+        raw (str): text output of the vision client
+    """
+    __slots__ = ("status", "coords", "raw")
+
+    def __init__(self, status, coords=None, raw=""):
+        self.status = status
+        self.coords = coords
+        self.raw = raw
+
+    def __repr__(self):
+        return f"VisionResult({self.status}, {self.coords})"
+
+def parse_vision_output(text:str):
+    """
+    Convert the text output of the rocsys-vision-client into a VisionResult
+    """
+    if "not running" in text or "No such container" in text:
+        return VisionResult(STATUS_CONTAINER_DOWN, raw=text)
+    if "success" in text and "Pose: " in text:
+        coords_str = text.split("Pose: ")[1].split("\n")[0]
+        return VisionResult(STATUS_SUCCESS, list(ast.literal_eval(coords_str)), text)
+    if "No socket detected" in text:
+        return VisionResult(STATUS_NO_SOCKET, raw=text)
+    if "unreliable" in text:
+        return VisionResult(STATUS_UNRELIABLE, raw=text)
+    return VisionResult(STATUS_UNKNOWN, raw=text)
+
+class DockerVisionClient:
+    """
+    Long-lived shell in the vision container, the output of every detection
+    is delimited by an end marker line.
+    The shell starts a new rocsys-vision-client process per detection (see module docstring).
+    """
+
+    def __init__(self, command=DOCKER_SHELL_COMMAND, timeout=DETECTION_TIMEOUT):
+        self.command = command
+        self.timeout = timeout
+        self.process = None
+        self.lines = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_output, args=(self.process, self.lines), daemon=True).start()
+
+    def _read_output(self, process, lines):
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None) #process ended
+
+    def detect(self):
+        """
+        Run one socket detection in the warm shell
+
+        Returns:
+            VisionResult
+        """
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self.start()
+            try:
+                self.process.stdin.write(f"{VISION_COMMAND} 2>&1; echo {END_MARKER}\n")
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                pass #the shell ended (e.g. container down), the output is read below
+
+            output = []
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self.close()
+                    return VisionResult(STATUS_UNKNOWN, raw="Vision client timed out\n" + "".join(output))
+                if line is None: #shell ended - restart on the next detection
+                    self.process = None
+                    break
+                if line.strip() == END_MARKER:
+                    break
+                output.append(line)
+            return parse_vision_output("".join(output).strip())
+
+    def close(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process = None
+
+class StubVisionClient:
+    """
+    Returns configured detection results without the vision container,
+    cycles through the results if there are several
+
+    Args:
+        results (list): VisionResults to return, default: one successful detection
+        delay (float): simulated detection time in seconds
+    """
+
+    DEFAULT_COORDS = [0.35, 0.02, -0.05, 0.0, 0.0, 0.0]
+
+    def __init__(self, results=None, delay=0):
+        if results is None:
+            results = [VisionResult(STATUS_SUCCESS, list(self.DEFAULT_COORDS), "stub: success")]
+        self.results = results
+        self.delay = delay
+        self.count = 0
+
+    def detect(self):
+        if self.delay:
+            time.sleep(self.delay)
+        result = self.results[self.count % len(self.results)]
+        self.count += 1
+        return result
+
+    def close(self):
+        pass
+
+def create_vision_client(backend=BACKEND_DOCKER):
+    if backend == BACKEND_DOCKER:
+        return DockerVisionClient()
+    if backend == BACKEND_STUB:
+        return StubVisionClient()
+    raise ValueError(f"Unknown vision backend {backend}")
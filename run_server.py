@@ -5,13 +5,18 @@ This script will start the server
 By default the server is located at localhost on port 4444.
 """
 
-from message_server.server import Server
-from message_server.globalconfig import GlobalConfig
-
-DEFAULT_CONFIG_PATH = "config.ini"
+from message_server.server import Server, SERVER_MODE_THREADING, SERVER_MODE_ASYNCIO
+from message_server.settings import load_settings, DEFAULT_CONFIG_PATH
 
 if __name__ == "__main__":
-    server = Server()
-    config = GlobalConfig(DEFAULT_CONFIG_PATH)
+    settings = load_settings(DEFAULT_CONFIG_PATH) #fails here if the config is invalid
+    mode = settings.server.mode
+    if mode == SERVER_MODE_ASYNCIO:
+        from message_server.async_server import AsyncServer
+        server = AsyncServer()
+    elif mode == SERVER_MODE_THREADING:
+        server = Server()
+    else:
+        raise ValueError(f"Unknown server mode {mode}")
 
-    server.start(config)
\ No newline at end of file
+    server.start(settings)
@@ -0,0 +1,89 @@
+"""
+Inference backends of the safety model: the PyTorch weights or exports for
+ONNX Runtime (float or int8 quantized) and OpenVINO, which run faster on the
+CPU of the cell PC. All exports are loaded through ultralytics, so results
+and the detection logic are the same for every backend.
+
+Export once: python backends.py --backend onnx [--weights yolov8s.pt]
+"""
+import argparse
+import os
+import time
+import numpy as np
+from ultralytics import YOLO
+from detection import CONFIDENCE_MIN
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKEND_ONNX_INT8 = "onnx-int8"
+BACKEND_OPENVINO = "openvino"
+BACKENDS = [BACKEND_TORCH, BACKEND_ONNX, BACKEND_ONNX_INT8, BACKEND_OPENVINO]
+
+DEFAULT_WEIGHTS = "yolov8s.pt"
+DEFAULT_IMAGE_SIZE = 640
+WARMUP_RUNS = 3
+WARMUP_SHAPE = (720, 400, 3) #preprocessed frame
+
+def model_path(backend, weights=DEFAULT_WEIGHTS):
+    """
+    Returns:
+        str: file (or directory for OpenVINO) the backend loads
+    """
+    base = os.path.splitext(weights)[0]
+    if backend == BACKEND_TORCH:
+        return weights
+    if backend == BACKEND_ONNX:
+        return f"{base}.onnx"
+    if backend == BACKEND_ONNX_INT8:
+        return f"{base}_int8.onnx"
+    if backend == BACKEND_OPENVINO:
+        return f"{base}_openvino_model"
+    raise ValueError(f"Unknown backend: {backend}")
+
+def export_model(backend, weights=DEFAULT_WEIGHTS, image_size=DEFAULT_IMAGE_SIZE):
+    """
+    Export the PyTorch weights for a backend
+
+    Returns:
+        str: path of the exported model
+    """
+    if backend == BACKEND_TORCH:
+        return weights
+    if backend == BACKEND_OPENVINO:
+        return YOLO(weights).export(format="openvino", imgsz=image_size)
+
+    #dynamic batch size for the batched inference of the pipeline mode
+    onnx_path = YOLO(weights).export(format="onnx", imgsz=image_size, dynamic=True)
+    if backend == BACKEND_ONNX:
+        return onnx_path
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    path = model_path(BACKEND_ONNX_INT8, weights)
+    quantize_dynamic(onnx_path, path, weight_type=QuantType.QUInt8)
+    return path
+
+def load_model(backend, weights=DEFAULT_WEIGHTS, warmup_runs=WARMUP_RUNS):
+    """
+    Load the model of a backend and run it on blank frames, so the first
+    real frame does not pay for the lazy initialization
+
+    Returns:
+        YOLO: model, called like the PyTorch model
+    """
+    path = model_path(backend, weights)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} does not exist, export it with: python backends.py --backend {backend}")
+    model = YOLO(path, task="detect")
+    frame = np.zeros(WARMUP_SHAPE, dtype=np.uint8)
+    start = time.perf_counter()
+    for _ in range(warmup_runs):
+        model(frame, agnostic_nms=True, verbose=False, conf = CONFIDENCE_MIN)
+    print(f"Loaded {backend} model {path}, warm-up {round((time.perf_counter() - start) * 1000)} ms")
+    return model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the safety model")
+    parser.add_argument("--backend", default=BACKEND_ONNX, choices=BACKENDS)
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    parser.add_argument("--image-size", default=DEFAULT_IMAGE_SIZE, type=int)
+    args = parser.parse_args()
+    print(f"Exported: {export_model(args.backend, args.weights, args.image_size)}")
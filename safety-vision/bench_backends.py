@@ -0,0 +1,78 @@
+"""
+Benchmark of the inference backends on a fixed set of recorded frames:
+per-frame latency and throughput of every exported backend
+
+Usage: python bench_backends.py --source recordings/ [--backends torch onnx] [--frames 200] [--json report.json]
+"""
+import argparse
+import json
+import time
+import numpy as np
+from backends import load_model, model_path, BACKENDS, DEFAULT_WEIGHTS
+from detection import preprocess_frame, find_persons, CONFIDENCE_MIN
+from pipeline import open_source
+
+def read_frames(source, count):
+    """
+    Preprocessed frames of the source, loaded into memory so reading does not count
+    """
+    source = open_source(source)
+    frames = []
+    while len(frames) < count:
+        frame = source.read()
+        if frame is None:
+            break
+        frames.append(preprocess_frame(frame))
+    source.release()
+    return frames
+
+def bench_backend(backend, weights, frames, batch_size):
+    model = load_model(backend, weights)
+    latencies = []
+    persons = 0
+    start = time.perf_counter()
+    for index in range(0, len(frames), batch_size):
+        batch = frames[index:index + batch_size]
+        batch_start = time.perf_counter()
+        results = model(batch, agnostic_nms=True, verbose=False, conf = CONFIDENCE_MIN)
+        latencies.append((time.perf_counter() - batch_start) / len(batch))
+        persons += sum(find_persons(result)[1].size for result in results)
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        "backend": backend,
+        "model": model_path(backend, weights),
+        "frames": len(frames),
+        "batch_size": batch_size,
+        "fps": round(len(frames) / elapsed, 2),
+        "latency_ms_mean": round(float(latencies.mean()), 2),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "persons": persons, #the backends should find about the same amount
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inference backend benchmark")
+    parser.add_argument("--source", required=True, help="video file or image directory")
+    parser.add_argument("--backends", default=BACKENDS, nargs="+", choices=BACKENDS)
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    parser.add_argument("--frames", default=200, type=int, help="maximum amount of frames")
+    parser.add_argument("--batch-size", default=1, type=int)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    frames = read_frames(args.source, args.frames)
+    report = []
+    for backend in args.backends:
+        try:
+            report.append(bench_backend(backend, args.weights, frames, args.batch_size))
+        except FileNotFoundError as e:
+            print(f"Skipping {backend}: {e}")
+
+    print(f"{'backend':<12}{'fps':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'persons':>10}")
+    for row in report:
+        print(f"{row['backend']:<12}{row['fps']:>10}{row['latency_ms_mean']:>10}{row['latency_ms_p50']:>10}"
+              f"{row['latency_ms_p95']:>10}{row['persons']:>10}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
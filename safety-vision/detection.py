@@ -0,0 +1,77 @@
+"""
+Frame preprocessing and person detection shared by the live detection
+and the offline tools
+"""
+import time
+import cv2
+import numpy as np
+
+CONFIDENCE_MIN = 0.4
+PERSON_CLASS = 0
+CROP_X_START = 150
+CROP_X_END = 550
+
+RES_START = 1
+RES_END = 2
+RES_FOREIGN = 0
+
+def preprocess_frame(frame):
+    """
+    Crop the camera frame to the robot cell and flip it
+    """
+    return cv2.flip(frame[:, CROP_X_START:CROP_X_END], 0)
+
+def preprocessed_size(resolution):
+    """
+    Returns:
+        tuple: (width, height) of the preprocessed frame of a camera with resolution [width, height]
+    """
+    width, height = resolution
+    return min(width, CROP_X_END) - CROP_X_START, height
+
+def find_persons(result):
+    """
+    All persons in a YOLO result
+
+    Args:
+        result: ultralytics Results of one frame
+
+    Returns:
+        tuple: (N x 4 boxes [x1, y1, x2, y2], N confidences)
+    """
+    classes = result.boxes.cls.cpu().numpy()
+    persons = np.flatnonzero(classes == PERSON_CLASS)
+    if persons.size == 0:
+        return np.empty((0, 4)), np.empty(0)
+    return result.boxes.xyxy.cpu().numpy()[persons], result.boxes.conf.cpu().numpy()[persons]
+
+def foreign_object_data(name, confidence, frame_time):
+    """
+    Message data for a detected foreign object
+
+    Args:
+        name (str): class name
+        confidence (float): detection confidence
+        frame_time (float): time the frame was captured
+    """
+    return {
+        "result": RES_FOREIGN,
+        "object": {
+            "name": name,
+            "confidence": confidence
+        },
+        "message": f"Foreign object detected: {name}, {round(confidence*100,2)}%",
+        "timestamp": frame_time
+    }
+
+def detection_error_data(error):
+    """
+    Message data stopping the robot because the safety detection failed,
+    the robot must not move without working safety detection
+    """
+    return {
+        "result": RES_FOREIGN,
+        "object": None,
+        "message": f"Safety detection failed: {error!r}",
+        "timestamp": time.time()
+    }
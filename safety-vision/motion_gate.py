@@ -0,0 +1,100 @@
+"""
+Cheap pre-filter in front of the YOLO inference: most of the time the safety
+camera sees an empty, static cell, so frames are only inferred when enough
+pixels changed against a running background, at a minimum heartbeat rate,
+and for a while after a person was detected.
+"""
+import threading
+import time
+import cv2
+import numpy as np
+
+DEFAULT_PIXEL_THRESHOLD = 25 #gray value difference that counts as a changed pixel
+DEFAULT_CHANGED_FRACTION = 0.01 #fraction of changed pixels that triggers the inference
+DEFAULT_HEARTBEAT = 1.0 #seconds - maximum time without inference
+DEFAULT_HOLD_TIME = 2.0 #seconds the inference stays active after a person was detected
+DEFAULT_BACKGROUND_RATE = 0.05
+GATE_WIDTH = 160 #approximate width of the downscaled gray image
+
+class MotionGate:
+    """
+    Decides per frame if the full inference has to run
+
+    Args:
+        pixel_threshold (int): gray value difference of a changed pixel
+        changed_fraction (float): fraction of changed pixels to trigger the inference
+        heartbeat (float): seconds after which a frame is inferred anyway
+        hold_time (float): seconds every frame is inferred after hold() was called
+        background_rate (float): how fast the background adapts to the current frame
+    """
+
+    def __init__(self, pixel_threshold=DEFAULT_PIXEL_THRESHOLD, changed_fraction=DEFAULT_CHANGED_FRACTION,
+                 heartbeat=DEFAULT_HEARTBEAT, hold_time=DEFAULT_HOLD_TIME, background_rate=DEFAULT_BACKGROUND_RATE):
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.heartbeat = heartbeat
+        self.hold_time = hold_time
+        self.background_rate = background_rate
+        self.background = None
+        self.last_inference = 0.0
+        self.active_until = 0.0
+        self.frames = 0
+        self.skipped = 0
+        self.triggers = {"motion": 0, "heartbeat": 0, "hold": 0}
+        self.lock = threading.Lock()
+
+    def _gray(self, frame):
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        #integer factor - INTER_AREA averages whole pixel blocks, which is fast and removes sensor noise
+        height, width = frame.shape
+        factor = max(round(width / GATE_WIDTH), 1)
+        small = cv2.resize(frame, (max(width // factor, 1), max(height // factor, 1)), interpolation=cv2.INTER_AREA)
+        return small.astype(np.float32)
+
+    def check(self, frame):
+        """
+        Returns:
+            bool: True if the frame has to be inferred
+        """
+        gray = self._gray(frame)
+        now = time.monotonic()
+        with self.lock:
+            self.frames += 1
+            if self.background is None or self.background.shape != gray.shape:
+                self.background = gray
+                reason = "motion"
+            else:
+                changed = np.count_nonzero(np.abs(gray - self.background) > self.pixel_threshold)
+                self.background += self.background_rate * (gray - self.background)
+                if changed >= self.changed_fraction * gray.size:
+                    reason = "motion"
+                elif now < self.active_until:
+                    reason = "hold"
+                elif now - self.last_inference >= self.heartbeat:
+                    reason = "heartbeat"
+                else:
+                    self.skipped += 1
+                    return False
+            self.triggers[reason] += 1
+            self.last_inference = now
+            return True
+
+    def hold(self):
+        """
+        Infer every frame for the hold time, e.g. while a person is detected
+        """
+        self.active_until = time.monotonic() + self.hold_time
+
+    def summary(self):
+        """
+        Returns:
+            dict: inferred and skipped frames and the reasons for the inference
+        """
+        with self.lock:
+            return {
+                "frames": self.frames,
+                "skipped": self.skipped,
+                "skipped_fraction": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+                "triggers": dict(self.triggers),
+            }
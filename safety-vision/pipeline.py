@@ -0,0 +1,324 @@
+"""
+Pipelined safety detection: capture, inference and notification run in
+their own threads, connected by bounded queues that drop the oldest frame
+when a later stage is too slow - so the detection always works on the newest frames.
+"""
+import os
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+from detection import preprocess_frame, find_persons
+
+DEFAULT_QUEUE_SIZE = 4
+RESULT_QUEUE_SIZE = 64 #notification is cheap - only drop results if it is stuck
+STATS_WINDOW = 1000
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+class DropOldestQueue:
+    """
+    Bounded queue, putting into a full queue drops the oldest item
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE):
+        self.items = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get_batch(self, max_items=1, timeout=None):
+        """
+        Wait for at least one item and return up to max_items items, oldest first
+
+        Returns:
+            list: items, empty if the timeout passed or the queue is closed
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return []
+            batch = []
+            while self.items and len(batch) < max_items:
+                batch.append(self.items.popleft())
+            return batch
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+class StageStats:
+    """
+    Latency and throughput counters of one pipeline stage
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.latencies = deque(maxlen=STATS_WINDOW)
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record(self, latency, frames=1):
+        with self.lock:
+            self.count += frames
+            self.latencies.append(latency)
+
+    def summary(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            count = self.count
+        elapsed = time.perf_counter() - self.start_time
+        if latencies.size == 0:
+            return {"stage": self.name, "frames": count, "fps": 0.0}
+        return {
+            "stage": self.name,
+            "frames": count,
+            "fps": round(count / elapsed, 2),
+            "latency_ms_mean": round(float(latencies.mean()), 2),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+            "latency_ms_p99": round(float(np.percentile(latencies, 99)), 2),
+        }
+
+class FrameItem:
+    """
+    A frame travelling through the pipeline
+    """
+    __slots__ = ("frame_id", "capture_time", "frame", "result", "persons")
+
+    def __init__(self, frame_id, capture_time, frame):
+        self.frame_id = frame_id
+        self.capture_time = capture_time
+        self.frame = frame
+        self.result = None
+        self.persons = None #(boxes, confidences)
+
+class CameraSource:
+    """
+    Camera or video file read with OpenCV
+    """
+
+    def __init__(self, source, resolution=None):
+        self.capture = cv2.VideoCapture(source)
+        if resolution is not None:
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+
+    def read(self):
+        ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def release(self):
+        self.capture.release()
+
+class ImageDirectorySource:
+    """
+    Images of a directory in name order, e.g. recorded frames
+    """
+
+    def __init__(self, directory):
+        self.paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.index = 0
+
+    def read(self):
+        if self.index >= len(self.paths):
+            return None
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+        return frame
+
+    def release(self):
+        pass
+
+class SyntheticSource:
+    """
+    Random noise frames, to test the pipeline without camera or recordings
+    """
+
+    def __init__(self, count=300, resolution=(1280, 720), seed=0):
+        self.count = count
+        self.shape = (resolution[1], resolution[0], 3)
+        self.random = np.random.default_rng(seed)
+        self.index = 0
+
+    def read(self):
+        if self.index >= self.count:
+            return None
+        self.index += 1
+        return self.random.integers(0, 256, self.shape, dtype=np.uint8)
+
+    def release(self):
+        pass
+
+def open_source(source, resolution=None):
+    """
+    Open a frame source
+
+    Args:
+        source (str/int): camera index, video file, image directory or 'synthetic[:count]'
+        resolution (list): camera resolution [width, height]
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        return CameraSource(int(source), resolution)
+    if str(source).startswith("synthetic"):
+        count = int(source.split(":")[1]) if ":" in source else 300
+        return SyntheticSource(count, resolution or (1280, 720))
+    if os.path.isdir(source):
+        return ImageDirectorySource(source)
+    return CameraSource(source)
+
+class SafetyPipeline:
+    """
+    Capture -> inference -> notification in three threads
+
+    Args:
+        source: frame source with read() and release()
+        infer (function): runs the model on a list of frames, returns one result per frame
+        on_result (function): called with every FrameItem after inference
+        batch_size (int): maximum amount of frames per inference call
+        half_resolution (bool): halve the frames before inference
+        queue_size (int): size of the frame queue between capture and inference
+        crop (function): optional crop of the preprocessed frame before inference, e.g. the danger zone
+        detect (function): returns the persons of a result as (boxes, confidences)
+        gate (MotionGate): optional pre-filter, frames it rejects are not inferred
+    """
+
+    def __init__(self, source, infer, on_result, batch_size=1, half_resolution=False, queue_size=DEFAULT_QUEUE_SIZE,
+                 crop=None, detect=find_persons, gate=None):
+        self.source = source
+        self.infer = infer
+        self.on_result = on_result
+        self.crop = crop
+        self.detect = detect
+        self.gate = gate
+        self.batch_size = batch_size
+        self.half_resolution = half_resolution
+        self.frame_queue = DropOldestQueue(queue_size)
+        self.result_queue = DropOldestQueue(RESULT_QUEUE_SIZE)
+        self.stats = {
+            "capture": StageStats("capture"),
+            "inference": StageStats("inference"),
+            "notify": StageStats("notify"),
+            "end_to_end": StageStats("end_to_end"),
+        }
+        self.running = False
+        self.threads = []
+        self.error = None #first exception of a stage, the pipeline stops when a stage fails
+
+    def start(self):
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._run_stage, args=(self._capture, self.frame_queue), name="capture", daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._inference, self.result_queue), name="inference", daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._notify, None), name="notify", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.frame_queue.close()
+        self.result_queue.close()
+
+    def join(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def is_alive(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def _run_stage(self, stage, output_queue):
+        """
+        Run a stage, its output queue is always closed so the next stage ends too.
+        If the stage fails the exception is kept and the other stages are stopped,
+        the caller has to check error after join.
+        """
+        try:
+            stage()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+            self.stop()
+        finally:
+            if output_queue is not None:
+                output_queue.close()
+
+    def _capture(self):
+        frame_id = 0
+        while self.running:
+            start = time.perf_counter()
+            frame = self.source.read()
+            if frame is None:
+                break
+            capture_time = time.time()
+            frame = preprocess_frame(frame)
+            if self.crop is not None:
+                frame = self.crop(frame)
+            if self.gate is not None and not self.gate.check(frame):
+                self.stats["capture"].record(time.perf_counter() - start)
+                continue
+            item = FrameItem(frame_id, capture_time, frame)
+            self.stats["capture"].record(time.perf_counter() - start)
+            self.frame_queue.put(item)
+            frame_id += 1
+
+    def _inference(self):
+        while True:
+            batch = self.frame_queue.get_batch(self.batch_size, timeout=1)
+            if not batch:
+                if self.frame_queue.closed:
+                    break
+                continue
+            start = time.perf_counter()
+            if self.half_resolution:
+                for item in batch:
+                    item.frame = cv2.resize(item.frame, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+            results = self.infer([item.frame for item in batch])
+            for item, result in zip(batch, results):
+                item.result = result
+                item.persons = self.detect(result)
+                if item.persons[1].size and self.gate is not None:
+                    self.gate.hold()
+                self.result_queue.put(item)
+            self.stats["inference"].record(time.perf_counter() - start, len(batch))
+
+    def _notify(self):
+        while True:
+            batch = self.result_queue.get_batch(1, timeout=1)
+            if not batch:
+                if self.result_queue.closed:
+                    break
+                continue
+            item = batch[0]
+            start = time.perf_counter()
+            self.on_result(item)
+            self.stats["notify"].record(time.perf_counter() - start)
+            self.stats["end_to_end"].record(time.time() - item.capture_time)
+
+    def summary(self):
+        """
+        Returns:
+            dict: stats per stage and the amount of dropped frames
+        """
+        summary = {
+            "stages": [stats.summary() for stats in self.stats.values()],
+            "dropped_frames": self.frame_queue.dropped,
+            "dropped_results": self.result_queue.dropped,
+        }
+        if self.gate is not None:
+            summary["motion_gate"] = self.gate.summary()
+        return summary
@@ -0,0 +1,121 @@
+"""
+Offline replay of recorded footage through the safety detection: the same
+preprocessing, inference, person detection and tracking as yoloV8_live.py,
+with the messages going to a local fake Socket.IO client instead of the server.
+Reports FPS, latency percentiles per stage and the detection-to-message
+latency as JSON for regression tracking.
+
+Usage: python replay.py --source recording.mp4 [--json report.json] [any yoloV8_live.py option]
+"""
+import json
+import time
+import numpy as np
+import yoloV8_live as live
+from backends import load_model
+from pipeline import StageStats, open_source
+
+SERIAL_STAGES = ("read", "preprocess", "motion_gate", "inference", "detection", "end_to_end")
+
+class FakeSocketIO:
+    """
+    Records the emitted messages and the latency from the detection frame
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.latencies = []
+
+    def emit(self, event, data):
+        now = time.time()
+        message = json.loads(data)
+        self.messages.append({"event": event, "time": now, "message": message})
+        timestamp = message.get(live.FIELD_DATA, {}).get("timestamp")
+        if timestamp is not None:
+            self.latencies.append(now - timestamp)
+
+    def summary(self):
+        summary = {"messages": len(self.messages), "detection_messages": len(self.latencies)}
+        if self.latencies:
+            latencies = np.array(self.latencies) * 1000
+            for percentile in (50, 95, 99):
+                summary[f"detection_to_message_ms_p{percentile}"] = round(float(np.percentile(latencies, percentile)), 2)
+            summary["detection_to_message_ms_max"] = round(float(latencies.max()), 2)
+        return summary
+
+def replay_serial(source, model, output, tracker, danger_zone=None, gate=None):
+    """
+    The loop of run_serial with a timing per stage, each frame goes through live.process_frame
+
+    Returns:
+        dict: stage statistics
+    """
+    stats = {name: StageStats(name) for name in SERIAL_STAGES}
+    timings = {}
+    while True:
+        start = time.perf_counter()
+        frame = source.read()
+        if frame is None:
+            break
+        frame_time = time.time()
+        read = time.perf_counter()
+        stats["read"].record(read - start)
+
+        processed = live.process_frame(frame, frame_time, model, output, tracker, danger_zone, gate, timings)
+        stats["preprocess"].record(timings["preprocess"] - read)
+        if gate is not None:
+            stats["motion_gate"].record(timings["motion_gate"] - timings["preprocess"])
+        if processed is None:
+            stats["end_to_end"].record(time.perf_counter() - start)
+            continue
+        inference_start = timings["motion_gate"] if gate is not None else timings["preprocess"]
+        stats["inference"].record(timings["inference"] - inference_start)
+        stats["detection"].record(timings["detection"] - timings["inference"])
+        stats["end_to_end"].record(timings["detection"] - start)
+
+    summary = {"stages": [stage.summary() for stage in stats.values()], "tracker": tracker.summary()}
+    if gate is not None:
+        summary["motion_gate"] = gate.summary()
+    return summary
+
+if __name__ == "__main__":
+    parser = live.create_parser("Replay recorded footage through the safety detection")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    sink = FakeSocketIO()
+    live.sio = sink
+    live.OFFLINE = False
+    live.SEND_MESSAGES = True #as after start_detection
+
+    source = open_source(args.source, args.webcam_resolution)
+    model = load_model(args.backend, args.weights)
+    output = {
+        live.FIELD_MESSAGE_TYPE: live.MST_MSG,
+        live.FIELD_CONTENT: live.CT_SAFETY,
+        live.FIELD_DATA: {}
+    }
+    tracker = live.create_tracker(args)
+    danger_zone = live.create_zones(args)[0]
+    start = time.perf_counter()
+    if args.pipeline:
+        args.stats_interval = 0
+        summary = live.run_pipeline(source, model, 2, None, None, output, tracker, args, danger_zone)
+    else:
+        summary = replay_serial(source, model, output, tracker, danger_zone, live.create_gate(args))
+    elapsed = time.perf_counter() - start
+    source.release()
+
+    frames = summary["stages"][0]["frames"]
+    report = {
+        "source": args.source,
+        "backend": args.backend,
+        "mode": "pipeline" if args.pipeline else "serial",
+        "frames": frames,
+        "fps": round(frames / elapsed, 2),
+        **summary,
+        **sink.summary(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
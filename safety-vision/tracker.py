@@ -0,0 +1,164 @@
+"""
+Temporal debouncing of person detections: detections are associated to tracks
+by IoU, a track is confirmed when it was seen in N of the last M frames and
+cleared after a number of frames without a detection (hysteresis).
+Confirmed tracks are notified once and then again at a limited rate.
+"""
+import numpy as np
+
+DEFAULT_MAX_TRACKS = 16
+DEFAULT_WINDOW = 5 #M - frames of the sliding window
+DEFAULT_CONFIRM_FRAMES = 3 #N - hits in the window to confirm a track
+DEFAULT_CLEAR_FRAMES = 10 #consecutive misses until a confirmed track is cleared
+DEFAULT_IOU_MIN = 0.3
+DEFAULT_RENOTIFY_INTERVAL = 2.0 #seconds between notifications while a person is confirmed
+
+def iou_matrix(boxes1, boxes2):
+    """
+    Intersection over union of every box pair
+
+    Args:
+        boxes1 (np.ndarray): N x 4 boxes [x1, y1, x2, y2]
+        boxes2 (np.ndarray): M x 4 boxes
+
+    Returns:
+        np.ndarray: N x M IoU values
+    """
+    x1 = np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    y1 = np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    x2 = np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+    y2 = np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    union = area1[:, None] + area2[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+class PersonTracker:
+    """
+    Tracks held in fixed-size arrays, one row per track slot
+
+    Args:
+        window (int): M - frames of the sliding window
+        confirm_frames (int): N - hits in the window to confirm a track
+        clear_frames (int): consecutive misses until a confirmed track is cleared
+        iou_min (float): minimum IoU to associate a detection with a track
+        renotify_interval (float): seconds between notifications while a person is confirmed
+        max_tracks (int): amount of track slots, further detections are ignored
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, confirm_frames=DEFAULT_CONFIRM_FRAMES, clear_frames=DEFAULT_CLEAR_FRAMES,
+                 iou_min=DEFAULT_IOU_MIN, renotify_interval=DEFAULT_RENOTIFY_INTERVAL, max_tracks=DEFAULT_MAX_TRACKS):
+        self.window = window
+        self.confirm_frames = min(confirm_frames, window)
+        self.clear_frames = clear_frames
+        self.iou_min = iou_min
+        self.renotify_interval = renotify_interval
+        self.active = np.zeros(max_tracks, dtype=bool)
+        self.confirmed = np.zeros(max_tracks, dtype=bool)
+        self.notified = np.zeros(max_tracks, dtype=bool)
+        self.boxes = np.zeros((max_tracks, 4))
+        self.confidence = np.zeros(max_tracks)
+        self.first_seen = np.zeros(max_tracks)
+        self.misses = np.zeros(max_tracks, dtype=int)
+        self.hits = np.zeros((max_tracks, window), dtype=bool) #ring buffer over the last frames
+        self.frame_index = 0
+        self.last_notification = 0.0
+        self.notifications = 0
+
+    def _associate(self, boxes):
+        """
+        Greedy IoU association, best pairs first
+
+        Returns:
+            np.ndarray: track slot per detection, -1 if unmatched
+        """
+        matches = np.full(len(boxes), -1)
+        tracks = np.flatnonzero(self.active)
+        if tracks.size == 0 or len(boxes) == 0:
+            return matches
+        iou = iou_matrix(boxes, self.boxes[tracks])
+        iou[iou < self.iou_min] = 0
+        while iou.size and iou.max() > 0:
+            detection, track = np.unravel_index(np.argmax(iou), iou.shape)
+            matches[detection] = tracks[track]
+            iou[detection, :] = 0
+            iou[:, track] = 0
+        return matches
+
+    def update(self, boxes, confidences, frame_time, notify=True):
+        """
+        Add the person detections of one frame
+
+        Args:
+            boxes (np.ndarray): N x 4 person boxes
+            confidences (np.ndarray): N confidences
+            frame_time (float): capture time of the frame
+            notify (bool): a notification can be sent, while the detection is inactive persons
+                are tracked without being marked as notified
+
+        Returns:
+            tuple: (confidence, timestamp) if a notification is due, otherwise None - the timestamp is
+                the frame a new person was first seen in, for a repeated notification the current frame
+        """
+        column = self.frame_index % self.window
+        self.frame_index += 1
+        self.hits[:, column] = False
+
+        matches = self._associate(boxes)
+        for detection in np.flatnonzero(matches < 0):
+            free = np.flatnonzero(~self.active)
+            if free.size == 0:
+                break
+            slot = free[0]
+            self.active[slot] = True
+            self.confirmed[slot] = False
+            self.notified[slot] = False
+            self.first_seen[slot] = frame_time
+            matches[detection] = slot
+
+        matched = matches[matches >= 0]
+        self.boxes[matched] = boxes[matches >= 0]
+        self.confidence[matched] = confidences[matches >= 0]
+        self.hits[matched, column] = True
+        self.misses[matched] = 0
+        missed = self.active.copy()
+        missed[matched] = False
+        self.misses[missed] += 1
+
+        self.confirmed |= self.active & (np.count_nonzero(self.hits, axis=1) >= self.confirm_frames)
+        #unconfirmed tracks vanish when the window is empty, confirmed ones only after the clear frames
+        cleared = self.active & np.where(self.confirmed, self.misses >= self.clear_frames, ~self.hits.any(axis=1))
+        self.active[cleared] = False
+        self.confirmed[cleared] = False
+        self.hits[cleared] = False
+
+        confirmed = np.flatnonzero(self.confirmed)
+        if confirmed.size == 0 or not notify:
+            return None
+        #a newly confirmed person is always notified, known persons at a limited rate
+        new = confirmed[~self.notified[confirmed]]
+        if new.size == 0 and frame_time - self.last_notification < self.renotify_interval:
+            return None
+        candidates = new if new.size else confirmed
+        best = candidates[np.argmax(self.confidence[candidates])]
+        self.notified[confirmed] = True
+        self.last_notification = frame_time
+        self.notifications += 1
+        timestamp = self.first_seen[best] if new.size else frame_time
+        return float(self.confidence[best]), float(timestamp)
+
+    def reset_notifications(self):
+        """
+        Treat the confirmed persons as not notified, they are reported with the next frame
+        """
+        self.notified[:] = False
+        self.last_notification = 0.0
+
+    def summary(self):
+        return {
+            "frames": self.frame_index,
+            "active_tracks": int(np.count_nonzero(self.active)),
+            "confirmed_tracks": int(np.count_nonzero(self.confirmed)),
+            "notifications": self.notifications,
+        }
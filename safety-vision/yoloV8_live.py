@@ -1,14 +1,21 @@
 import cv2
 import argparse
-from ultralytics import YOLO
 import supervision as sv
 import numpy as np
 import json
 import socketio
 import sys
+import time
+from detection import (preprocess_frame, preprocessed_size, find_persons, foreign_object_data, detection_error_data, CONFIDENCE_MIN,
+                       PERSON_CLASS, RES_START, RES_END, RES_FOREIGN)
+from pipeline import SafetyPipeline, open_source
+from zone import DangerZone, ZONE_POLYGON
+from motion_gate import MotionGate, DEFAULT_PIXEL_THRESHOLD, DEFAULT_CHANGED_FRACTION, DEFAULT_HEARTBEAT
+from backends import load_model, BACKENDS, BACKEND_TORCH, DEFAULT_WEIGHTS
+from tracker import (PersonTracker, DEFAULT_WINDOW, DEFAULT_CONFIRM_FRAMES, DEFAULT_CLEAR_FRAMES,
+                     DEFAULT_RENOTIFY_INTERVAL)
 
 FLASK_URL = "http://192.168.137.2:4444"
-CONFIDENCE_MIN = 0.4
 FIELD_MESSAGE_TYPE = "message_type"
 FIELD_CONTENT = "content"
 FIELD_DATA = "data"
@@ -16,30 +23,126 @@ MST_MSG = "msg"
 CT_SAFETY = "safety_detection"
 MSG_FOREIGN = "detection_foreign"
 
-RES_START = 1
-RES_END = 2
-RES_FOREIGN = 0
-
-ZONE_POLYGON = np.array([
-    [0, 0],
-    [0.5, 0],
-    [0.5, 1],
-    [0, 1]
-])
-
 SEND_MESSAGES = False
+OFFLINE = False
+TRACKER = None #reset when the detection starts
 
 sio = socketio.Client()
 
-def parse_arguments() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="YOLOv8 live")
+def create_parser(description="YOLOv8 live") -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
     parser.add_argument(
         "--webcam-resolution", 
         default=[1280, 720], 
         nargs=2, 
         type=int
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--source",
+        default="1",
+        help="camera index, video file, image directory or 'synthetic[:count]'"
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="run capture, inference and notification in separate threads"
+    )
+    parser.add_argument(
+        "--batch-size",
+        default=1,
+        type=int,
+        help="frames per inference call (pipeline mode)"
+    )
+    parser.add_argument(
+        "--half-resolution",
+        action="store_true",
+        help="halve the frames before inference (pipeline mode)"
+    )
+    parser.add_argument(
+        "--stats-interval",
+        default=10,
+        type=float,
+        help="seconds between printing the stage statistics (pipeline mode), 0 to disable"
+    )
+    parser.add_argument(
+        "--show",
+        default=0,
+        type=int,
+        choices=[0, 1, 2],
+        help="show the safety camera: 1 = yes, 2 = no, 0 = ask"
+    )
+    parser.add_argument(
+        "--zone-filter",
+        action="store_true",
+        help="only run inference on the danger zone and ignore persons outside of it"
+    )
+    parser.add_argument(
+        "--motion-gate",
+        action="store_true",
+        help="only run inference when the frame changed, at least every --heartbeat seconds"
+    )
+    parser.add_argument(
+        "--motion-threshold",
+        default=DEFAULT_PIXEL_THRESHOLD,
+        type=int,
+        help="gray value difference that counts as a changed pixel (motion gate)"
+    )
+    parser.add_argument(
+        "--motion-fraction",
+        default=DEFAULT_CHANGED_FRACTION,
+        type=float,
+        help="fraction of changed pixels that triggers the inference (motion gate)"
+    )
+    parser.add_argument(
+        "--heartbeat",
+        default=DEFAULT_HEARTBEAT,
+        type=float,
+        help="maximum seconds without inference (motion gate)"
+    )
+    parser.add_argument(
+        "--confirm-frames",
+        default=DEFAULT_CONFIRM_FRAMES,
+        type=int,
+        help="frames of the --window a person has to be seen in before it is reported"
+    )
+    parser.add_argument(
+        "--window",
+        default=DEFAULT_WINDOW,
+        type=int,
+        help="sliding window in frames for the confirmation"
+    )
+    parser.add_argument(
+        "--clear-frames",
+        default=DEFAULT_CLEAR_FRAMES,
+        type=int,
+        help="frames without detection until a reported person is cleared"
+    )
+    parser.add_argument(
+        "--renotify-interval",
+        default=DEFAULT_RENOTIFY_INTERVAL,
+        type=float,
+        help="seconds between repeated messages while a person stays detected"
+    )
+    parser.add_argument(
+        "--backend",
+        default=BACKEND_TORCH,
+        choices=BACKENDS,
+        help="inference backend, export the model first with backends.py"
+    )
+    parser.add_argument(
+        "--weights",
+        default=DEFAULT_WEIGHTS,
+        help="PyTorch weights the backend model was exported from"
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="do not connect to the server, only print the messages"
+    )
+    return parser
+
+def parse_arguments() -> argparse.Namespace:
+    args = create_parser().parse_args()
     return args
 
 
@@ -61,7 +164,25 @@ def show_camera(frame, model, detections, box_annotator, zone):
 
 def send_message(output=dict):
     print(f"Sending message: {output}")
-    sio.emit("message_output",json.dumps(output))
+    if not OFFLINE:
+        sio.emit("message_output",json.dumps(output))
+
+def notify_person(output, name, confidence, frame_time):
+    """
+    Send the foreign object message
+    """
+    output[FIELD_DATA] = foreign_object_data(name, confidence, frame_time)
+    send_message(output)
+
+def report_persons(tracker, output, name, persons, frame_time):
+    """
+    Add the persons of a frame to the tracker and notify confirmed persons if the detection is active,
+    the timestamp of a new person is the frame it was first seen in
+    """
+    event = tracker.update(persons[0], persons[1], frame_time, SEND_MESSAGES)
+    if event is not None:
+        confidence, timestamp = event
+        notify_person(output, name, confidence, timestamp)
 
 def on_connect():
     print("Connected")
@@ -71,66 +192,75 @@ def on_disconnect():
 
 def on_receive_message(data):
     print("Received message:",data)
+    global SEND_MESSAGES
     if data == "start_detection":
-        global SEND_MESSAGES
+        if TRACKER is not None:
+            #persons already in the zone are reported with the next frame instead of after the renotify interval
+            TRACKER.reset_notifications()
         SEND_MESSAGES = True
     elif data == "stop_detection":
         SEND_MESSAGES = False
 
-if __name__ == "__main__":
-    args = parse_arguments()
-    frame_width, frame_height = args.webcam_resolution
+def process_frame(frame, frame_time, model, output, tracker, danger_zone=None, gate=None, timings=None):
+    """
+    Preprocessing, motion gate, inference and person notification of one camera frame,
+    the step of run_serial and of the replay benchmark
 
-    cap = cv2.VideoCapture(1)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, frame_width)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_height)
+    Args:
+        frame (np.ndarray): camera frame
+        frame_time (float): capture time, sent with detections
+        timings (dict): if given, filled with the perf_counter time after each stage
+            ("preprocess", "motion_gate", "inference", "detection")
 
-    model = YOLO("yolov8s.pt")
-    initOD = False
-    url = FLASK_URL
-    show = 0
-    names = model.names
+    Returns:
+        tuple: (preprocessed frame, YOLO result, persons), None if the motion gate skipped the frame
+    """
+    frame = preprocess_frame(frame) # changed for frame size
+    if danger_zone is not None:
+        frame = danger_zone.crop(frame)
+    if timings is not None:
+        timings["preprocess"] = time.perf_counter()
 
-    box_annotator = sv.BoxAnnotator(
-        thickness=2,
-        text_thickness=2,
-        text_scale=1
-    )
+    if gate is not None:
+        inferred = gate.check(frame)
+        if timings is not None:
+            timings["motion_gate"] = time.perf_counter()
+        if not inferred:
+            return None
 
-    zone_polygon = (ZONE_POLYGON * np.array(args.webcam_resolution)).astype(int)
-    zone = sv.PolygonZone(polygon=zone_polygon, frame_resolution_wh=tuple(args.webcam_resolution))
-    
-    sio.connect(FLASK_URL)
-    sio.on("connect",on_connect)
-    sio.on("disconnect",on_disconnect)
-    sio.on("message_safety",on_receive_message)
-    sio.on("message_all",on_receive_message)
+    result = model(frame, agnostic_nms=True, verbose=False, conf = CONFIDENCE_MIN)[0]
+    if timings is not None:
+        timings["inference"] = time.perf_counter()
 
-    output = {
-        FIELD_MESSAGE_TYPE: MST_MSG,
-        FIELD_CONTENT: CT_SAFETY,
-        FIELD_DATA: {}
-    }
+    # Send message if person is detected, before spending time on the display
+    persons = find_persons(result) if danger_zone is None else danger_zone.find_persons(result)
+    report_persons(tracker, output, model.names[PERSON_CLASS], persons, frame_time)
+    if persons[1].size and gate is not None:
+        gate.hold()
+    if timings is not None:
+        timings["detection"] = time.perf_counter()
+    return frame, result, persons
 
+def run_serial(source, model, show, box_annotator, zone, output, tracker, danger_zone=None, gate=None):
+    """
+    Capture, inference and notification one after another in one loop,
+    with a danger zone only the zone is inferred and checked for persons,
+    with a motion gate static frames are skipped
+    """
+    names = model.names
     counter = 0
-    while (show != 1 and show != 2):
-        show = input("Show safety camera [1 = yes, 2 = no]: ")
-        show = int(show)
-
-
     while True:       
-        ret, frame = cap.read()
+        frame = source.read()
+        frame_time = time.time() #sent with detections, the server measures the detection-to-stop latency
         initOD = 0
-        personFound = False 
-        frame = cv2.flip(frame[:, 150:550],0) # changed for frame size
 
         #Let machine know if safety camera is available
-        if not ret:
+        if frame is None:
             output[FIELD_DATA] = {
                 "message": "No safety camera connected"
             }
             break
-        
+
         #Let machine know safety detection has started
         if counter == 0:
             output[FIELD_DATA] = {
@@ -138,63 +268,180 @@ if __name__ == "__main__":
                 "message": "Safety detection started"
             }
             send_message(output)
+        #Add +1 to counter so machine won't send new available info
+        counter += 1
+
+        processed = process_frame(frame, frame_time, model, output, tracker, danger_zone, gate)
+        if processed is None:
+            if (cv2.waitKey(1) == 27):
+                break
+            continue
+        frame, result, persons = processed
+
+        if persons[1].size:
+            #don't use for now
+            """initOD = input("reinitialize safety camera press 1:\\n")
+            initOD = int(initOD)
+            if (initOD == 1):
+                output[FIELD_DATA] = {
+                    "result": RES_FOREIGN,
+                    "object": {
+                        "name": names[PERSON_CLASS]
+                        #"confidence": r.boxes.conf
+                    },
+                    "message": "Camera reinitialized by user input "
+                }
+                send_message(output)"""
 
-        result = model(frame, agnostic_nms=True, verbose=False, conf = 0.4)[0]
-        detections = sv.Detections.from_ultralytics(result)
-        
         # Display camera frame if 1 has been chosen
         if(show == 1):
-            show_camera(frame, model, detections, box_annotator, zone)
+            show_camera(frame, model, sv.Detections.from_ultralytics(result), box_annotator, zone)
 
-        #Add +1 to counter so machine won't send new available info
-        counter += 1
-         
-        # Send message if person is detected
-        for r in result:
-            for c in r.boxes.cls:
-                if c == 0:
-                    personFound = True
-                    confidence = r.boxes.conf.item()
-                    output[FIELD_DATA] = {
-                        "result": RES_FOREIGN,
-                        "object": {
-                            "name": names[int(c)],
-                            "confidence": confidence
-                        },
-                        "message": f"Foreign object detected: {names[int(c)]}, {round(confidence*100,2)}%"
-                    }
-                    if SEND_MESSAGES:
-                        send_message(output)
-                    SEND_MESSAGES = False
-
-                    #don't use for now
-                    """initOD = input("reinitialize safety camera press 1:\n")
-                    initOD = int(initOD)
-                    if (initOD == 1):                    
-                        output[FIELD_DATA] = {
-                            "result": RES_FOREIGN,
-                            "object": {
-                                "name": names[int(c)]
-                                #"confidence": r.boxes.conf
-                            },
-                            "message": "Camera reinitialized by user input "
-                        }
-                        send_message(output)"""
-                    break
-
-            if (personFound == True):
-                break
-        
         if (cv2.waitKey(1) == 27):
             break
+    print(json.dumps(tracker.summary()))
+    if gate is not None:
+        print(json.dumps(gate.summary()))
+
+def create_gate(args):
+    """
+    Motion gate from the arguments, None if it is disabled
+    """
+    if not args.motion_gate:
+        return None
+    return MotionGate(args.motion_threshold, args.motion_fraction, args.heartbeat)
+
+def create_tracker(args):
+    return PersonTracker(args.window, args.confirm_frames, args.clear_frames, renotify_interval=args.renotify_interval)
+
+def create_zones(args):
+    """
+    Danger zone the detection checks and the zone of the shown frame,
+    both from one pixel polygon in the preprocessed frame
+
+    Returns:
+        tuple: (DangerZone, None without --zone-filter; sv.PolygonZone of the shown frame)
+    """
+    frame_size = preprocessed_size(args.webcam_resolution)
+    danger_zone = DangerZone.from_normalized(ZONE_POLYGON, frame_size)
+    #only the pipeline halves the frames before inference
+    scale = 0.5 if args.pipeline and args.half_resolution else 1.0
+    polygon, shown_size = danger_zone.shown_polygon(args.zone_filter, scale)
+    zone = sv.PolygonZone(polygon=np.round(polygon).astype(int), frame_resolution_wh=shown_size)
+    return (danger_zone if args.zone_filter else None), zone
+
+def run_pipeline(source, model, show, box_annotator, zone, output, tracker, args, danger_zone=None):
+    """
+    Capture, inference and notification in separate threads,
+    the main thread prints the stage statistics and shows the camera
+
+    Returns:
+        dict: final pipeline and tracker statistics
+
+    Raises:
+        Exception: the error of a failed pipeline stage, after the robot was stopped
+    """
+    names = model.names
+    latest = {"item": None}
+
+    def infer(frames):
+        return model(frames, agnostic_nms=True, verbose=False, conf = CONFIDENCE_MIN)
+
+    def on_result(item):
+        latest["item"] = item
+        report_persons(tracker, output, names[PERSON_CLASS], item.persons, item.capture_time)
+
+    output[FIELD_DATA] = {
+        "result": RES_START,
+        "message": "Safety detection started"
+    }
+    send_message(output)
+
+    crop = None
+    detect = find_persons
+    if danger_zone is not None:
+        scale = 2 if args.half_resolution else 1
+        crop = danger_zone.crop
+        detect = lambda result: danger_zone.find_persons(result, scale)
+
+    pipeline = SafetyPipeline(source, infer, on_result, args.batch_size, args.half_resolution,
+                              crop=crop, detect=detect, gate=create_gate(args))
+    pipeline.start()
+    last_stats = time.monotonic()
+    shown = None
+    try:
+        while pipeline.is_alive():
+            item = latest["item"]
+            if show == 1 and item is not None and item is not shown:
+                show_camera(item.frame.copy(), model, sv.Detections.from_ultralytics(item.result), box_annotator, zone)
+                shown = item
+            if show == 1 and cv2.waitKey(1) == 27:
+                break
+            if args.stats_interval and time.monotonic() - last_stats >= args.stats_interval:
+                print(json.dumps({**pipeline.summary(), "tracker": tracker.summary()}))
+                last_stats = time.monotonic()
+            time.sleep(0.005)
+    finally:
+        pipeline.stop()
+        pipeline.join(timeout=5)
+        summary = {**pipeline.summary(), "tracker": tracker.summary()}
+        print(json.dumps(summary))
+    if pipeline.error is not None:
+        #a failed stage ends the safety detection - stop the robot instead of letting it move unmonitored
+        output[FIELD_DATA] = detection_error_data(pipeline.error)
+        send_message(output)
+        raise pipeline.error
+    return summary
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    frame_width, frame_height = args.webcam_resolution
+    OFFLINE = args.offline
+
+    source = open_source(args.source, args.webcam_resolution)
+
+    model = load_model(args.backend, args.weights)
+    url = FLASK_URL
+    show = args.show
+
+    box_annotator = sv.BoxAnnotator(
+        thickness=2,
+        text_thickness=2,
+        text_scale=1
+    )
+
+    danger_zone, zone = create_zones(args)
+
+    if not OFFLINE:
+        sio.connect(FLASK_URL)
+    sio.on("connect",on_connect)
+    sio.on("disconnect",on_disconnect)
+    sio.on("message_safety",on_receive_message)
+    sio.on("message_all",on_receive_message)
+
+    output = {
+        FIELD_MESSAGE_TYPE: MST_MSG,
+        FIELD_CONTENT: CT_SAFETY,
+        FIELD_DATA: {}
+    }
+
+    while (show != 1 and show != 2):
+        show = input("Show safety camera [1 = yes, 2 = no]: ")
+        show = int(show)
+
+    TRACKER = create_tracker(args)
+    if args.pipeline:
+        run_pipeline(source, model, show, box_annotator, zone, output, TRACKER, args, danger_zone)
+    else:
+        run_serial(source, model, show, box_annotator, zone, output, TRACKER, danger_zone, create_gate(args))
 
     output[FIELD_MESSAGE_TYPE] = MST_MSG
     output[FIELD_DATA] = {
             "result": RES_END,
             "message": "Safety detection finished"
         }
-    send_message(url,output)
+    send_message(output)
 
-    cap.release()
+    source.release()
     cv2.destroyAllWindows()
-    sys.exit()
\ No newline at end of file
+    sys.exit()
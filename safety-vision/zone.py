@@ -0,0 +1,122 @@
+"""
+Danger zone of the robot cell: inference is restricted to the bounding
+rectangle of the zone polygon and only persons inside the polygon count
+as foreign objects
+"""
+import numpy as np
+from detection import find_persons
+
+#danger zone, normalized to the preprocessed (cropped and flipped) frame - the whole robot cell crop
+ZONE_POLYGON = np.array([
+    [0, 0],
+    [1, 0],
+    [1, 1],
+    [0, 1]
+])
+
+class DangerZone:
+    """
+    Zone polygon in pixel coordinates of the preprocessed (cropped and flipped) frame,
+    the coordinates the detections are checked in
+
+    Args:
+        pixel_polygon (np.ndarray): [[x, y], ...] in pixels
+        frame_size (tuple): (width, height) of the preprocessed frame, taken from the first cropped frame if None
+    """
+
+    def __init__(self, pixel_polygon, frame_size=None):
+        self.pixel_polygon = np.asarray(pixel_polygon, dtype=float)
+        self.frame_shape = None
+        self.rect = None #x0, y0, x1, y1 of the bounding rectangle in pixels
+        if frame_size is not None:
+            self._update((frame_size[1], frame_size[0]))
+
+    @classmethod
+    def from_normalized(cls, polygon, frame_size):
+        """
+        Zone from a polygon normalized to the preprocessed frame
+
+        Args:
+            polygon (np.ndarray): [[x, y], ...] in 0..1
+            frame_size (tuple): (width, height) of the preprocessed frame
+        """
+        return cls(np.asarray(polygon) * np.array(frame_size), frame_size)
+
+    def _update(self, frame_shape):
+        height, width = frame_shape[0:2]
+        self.frame_shape = frame_shape[0:2]
+        x0, y0 = np.floor(self.pixel_polygon.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(self.pixel_polygon.max(axis=0)).astype(int)
+        self.rect = (max(int(x0), 0), max(int(y0), 0), min(int(x1), width), min(int(y1), height))
+
+    def shown_polygon(self, cropped=False, scale=1.0):
+        """
+        The zone in pixels of the shown frame, to draw it over the detections of that frame
+
+        Args:
+            cropped (bool): the shown frame is the crop of the zone
+            scale (float): factor from the preprocessed frame to the shown frame
+
+        Returns:
+            tuple: (polygon, (width, height) of the shown frame)
+        """
+        height, width = self.frame_shape
+        polygon = self.pixel_polygon
+        if cropped:
+            x0, y0, x1, y1 = self.rect
+            polygon = polygon - np.array([x0, y0])
+            width, height = x1 - x0, y1 - y0
+        return polygon * scale, (int(width * scale), int(height * scale))
+
+    def crop(self, frame):
+        """
+        Returns the part of the frame inside the bounding rectangle of the zone
+        """
+        if self.frame_shape != frame.shape[0:2]:
+            self._update(frame.shape)
+        x0, y0, x1, y1 = self.rect
+        return frame[y0:y1, x0:x1]
+
+    def contains(self, points):
+        """
+        Vectorized point-in-polygon test (ray casting)
+
+        Args:
+            points (np.ndarray): N x 2 pixel coordinates in the preprocessed frame
+
+        Returns:
+            np.ndarray: N booleans
+        """
+        height, width = self.frame_shape
+        #points on the frame border belong to the frame, e.g. the feet of a person at the bottom
+        x = np.clip(points[:, 0:1], 0, width - 1)
+        y = np.clip(points[:, 1:2], 0, height - 1)
+        x1, y1 = self.pixel_polygon[:, 0], self.pixel_polygon[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        spans = (y1 > y) != (y2 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (x2 - x1) * (y - y1) / (y2 - y1) + x1
+        crossings = np.count_nonzero(spans & (x < x_cross), axis=1)
+        return crossings % 2 == 1
+
+    def find_persons(self, result, scale=1.0):
+        """
+        Persons standing inside the zone (bottom center of the box),
+        for inference on the cropped zone
+
+        Args:
+            result: ultralytics Results of the cropped frame
+            scale (float): factor from the inference resolution to the cropped frame
+
+        Returns:
+            tuple: (N x 4 boxes in preprocessed frame coordinates, N confidences)
+        """
+        boxes, confidences = find_persons(result)
+        if boxes.size == 0:
+            return boxes, confidences
+        x0, y0 = self.rect[0:2]
+        boxes = boxes * scale + np.array([x0, y0, x0, y0])
+        anchors = np.column_stack(((boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]))
+        inside = self.contains(anchors)
+        return boxes[inside], confidences[inside]
+
@@ -1,5 +1,173 @@
 from DRCF import *
 import socket
+import struct
+
+# framed binary protocol - mirrors message_server/robot_protocol.py, keep in sync
+PROTOCOL_MAGIC = b"RC"
+PROTOCOL_VERSION = 1
+HEADER_FORMAT = "!2sBBBI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MSG_COMMAND = 1
+MSG_REPLY = 2
+MSG_BATCH = 3
+MSG_BATCH_REPLY = 4
+MSG_TELEMETRY_SUBSCRIBE = 5
+MSG_TELEMETRY = 6
+TELEMETRY_FORMAT = "!24d"
+FLAG_COMPLETION_ACK = 0x01
+ACK_NONE = 0
+ACK_ACCEPTED = 1
+ACK_FINISHED = 2
+
+# async motions return immediately, blocking motions return when the move is done
+ASYNC_MOTION_COMMANDS = ("amovel", "amovej", "amovejx", "amovec", "amovesj", "amovesx", "amoveb", "amove_spiral", "amove_periodic")
+MOTION_COMMANDS = ("movel", "movej", "movejx", "movec", "movesj", "movesx", "moveb", "move_spiral", "move_periodic", "move_home")
+MOTION_POLL_TIME = 0.01
+TELEMETRY_PORT = 7010
+CONTROL_PORT = 7011
+CONTROL_COMMANDS = ("stop",)
+
+# set by the control thread - aborts the remaining steps of a running batch
+stop_requested = False
+
+def recv_exact(sock, size):
+    buffer = b""
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer += chunk
+    return buffer
+
+def recv_frame(sock):
+    header = recv_exact(sock, HEADER_SIZE)
+    if header is None:
+        return None, None, None
+    magic, version, msg_type, flags, length = struct.unpack(HEADER_FORMAT, header)
+    if magic != PROTOCOL_MAGIC or version != PROTOCOL_VERSION:
+        raise Exception("Invalid frame header received")
+    payload = recv_exact(sock, length) if length else b""
+    return msg_type, flags, payload
+
+def send_frame(sock, msg_type, payload, flags=0):
+    header = struct.pack(HEADER_FORMAT, PROTOCOL_MAGIC, PROTOCOL_VERSION, msg_type, flags, len(payload))
+    sock.sendall(header + payload)
+
+def execute_command(command, flags):
+    """
+    Execute a DRL command and return the acknowledgement type for the reply
+    """
+    exec(command)
+    if not flags & FLAG_COMPLETION_ACK:
+        wait(1)
+        return ACK_NONE
+
+    name = command.split("(")[0].strip()
+    if name in ASYNC_MOTION_COMMANDS:
+        return ACK_ACCEPTED
+    if name in MOTION_COMMANDS:
+        # blocking motions: make sure the robot has settled before sampling the pose
+        while check_motion() != 0:
+            wait(MOTION_POLL_TIME)
+    return ACK_FINISHED
+
+def encode_telemetry(current_pos, joint_torque, ext_torque, tool_force):
+    values = list(current_pos) + list(joint_torque) + list(ext_torque) + list(tool_force)
+    return struct.pack(TELEMETRY_FORMAT, *values)
+
+def sample_telemetry():
+    return encode_telemetry(
+        get_current_posx()[0],
+        get_joint_torque(),
+        get_external_torque(),
+        get_tool_force(DR_TOOL)
+    )
+
+def decode_batch(payload):
+    count = struct.unpack_from("!H", payload)[0]
+    offset = 2
+    commands = []
+    for i in range(count):
+        length = struct.unpack_from("!I", payload, offset)[0]
+        offset += 4
+        commands.append(payload[offset:offset+length].decode("utf-8"))
+        offset += length
+    return commands
+
+def execute_batch(commands, flags):
+    """
+    Execute the batch steps back-to-back and collect the telemetry after every step
+    """
+    reply = struct.pack("!H", len(commands))
+    for command in commands:
+        if stop_requested:
+            break
+        ack = execute_command(command, flags)
+        reply += struct.pack("!B", ack) + sample_telemetry()
+    return reply
+
+def telemetry_server():
+    """
+    Pushes the robot telemetry to the subscribed server at the requested rate,
+    runs in its own DRL thread next to the command loop
+    """
+    telemetry_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    telemetry_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    telemetry_socket.bind(('0.0.0.0', TELEMETRY_PORT))
+    telemetry_socket.listen(1)
+    while True:
+        client, address = telemetry_socket.accept()
+        print('Telemetry connection established with:', address)
+        try:
+            msg_type, flags, payload = recv_frame(client)
+            if msg_type != MSG_TELEMETRY_SUBSCRIBE:
+                continue
+            rate = struct.unpack("!d", payload)[0]
+            if not rate > 0: #also rejects nan
+                print('Rejected telemetry rate:', rate)
+                continue
+            period = 1.0 / rate
+            while True:
+                send_frame(client, MSG_TELEMETRY, sample_telemetry())
+                wait(period)
+        except Exception as e:
+            print('Telemetry connection closed:', e)
+        finally:
+            client.close()
+
+def control_server():
+    """
+    High-priority connection for safety stops, runs in its own DRL thread so
+    a stop is executed immediately, even while the command loop is busy
+    """
+    global stop_requested
+    control_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    control_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    control_socket.bind(('0.0.0.0', CONTROL_PORT))
+    control_socket.listen(1)
+    while True:
+        client, address = control_socket.accept()
+        print('Control connection established with:', address)
+        try:
+            while True:
+                msg_type, flags, payload = recv_frame(client)
+                if msg_type is None:
+                    break
+                command = payload.decode("utf-8")
+                if command.split("(")[0].strip() not in CONTROL_COMMANDS:
+                    print('Rejected control command:', command)
+                    send_frame(client, MSG_REPLY, sample_telemetry(), ACK_NONE)
+                    continue
+                stop_requested = True
+                exec(command)
+                send_frame(client, MSG_REPLY, sample_telemetry(), ACK_FINISHED)
+        except Exception as e:
+            print('Control connection closed:', e)
+        finally:
+            client.close()
+
+thread_run(telemetry_server, loop=False)
+thread_run(control_server, loop=False)
 
 server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 server_socket.bind(('0.0.0.0', 7009))  # Replace with appropriate IP and port
@@ -8,7 +176,7 @@ server_socket.listen(1)
 print('Server listening for connections...')
 server_socket.settimeout(120)  # Set initial timeout to x seconds
 
-change_operation_speed(50)      
+change_operation_speed(50)
 
 while True:
     try:
@@ -16,12 +184,33 @@ while True:
         print('Connection established with:', client_address)
 
         while True:
-            command = client_socket.recv(1024).decode("utf-8")  # Receive DRL command from client
-            if not command:
+            # the protocol is chosen by the server (config.ini) - detect it from the first bytes
+            prefix = client_socket.recv(len(PROTOCOL_MAGIC), socket.MSG_PEEK)
+            if not prefix:
                 # If no command is received, the client has closed the connection
                 print('Client closed the connection.')
                 break
-            
+
+            if prefix == PROTOCOL_MAGIC:
+                msg_type, flags, payload = recv_frame(client_socket)
+                if msg_type is None:
+                    print('Client closed the connection.')
+                    break
+                stop_requested = False
+                if msg_type == MSG_BATCH:
+                    reply = execute_batch(decode_batch(payload), flags)
+                    send_frame(client_socket, MSG_BATCH_REPLY, reply)
+                    continue
+
+                command = payload.decode("utf-8")
+
+                ack = execute_command(command, flags)
+
+                send_frame(client_socket, MSG_REPLY, sample_telemetry(), ack)
+                continue
+
+            command = client_socket.recv(1024).decode("utf-8")  # Receive DRL command from client
+
             # Execute the DRL command on the robot
             exec(command)
             wait(1)
@@ -0,0 +1,383 @@
+"""
+Stand-in for setup_robot_server.py to run the charge cycle without hardware.
+
+The DRL commands sent by the RobotController are executed against fake DRL
+functions (amovel, movel, move_home, amove_periodic, stop, compliance control, ...)
+which move a simulated pose with configurable motion timing. The command,
+telemetry and control sockets speak the same protocols as the robot side
+(text and binary, detected per message) using message_server/robot_protocol.py.
+
+Usage: python -m simulator.fake_robot [--config config.ini] [--time-scale 0.1]
+Start it before the server, with the server pointing at it: ROBOT__ip=127.0.0.1 python run_server.py
+"""
+import argparse
+import math
+import socket
+import threading
+import time
+import numpy as np
+from message_server.settings import load_settings
+from message_server.transforms import zyz_to_matrix
+from message_server.robot_protocol import (MAGIC, MSG_COMMAND, MSG_REPLY, MSG_BATCH, MSG_BATCH_REPLY,
+                                           MSG_TELEMETRY_SUBSCRIBE, MSG_TELEMETRY, FLAG_COMPLETION_ACK,
+                                           ACK_NONE, ACK_ACCEPTED, ACK_FINISHED, send_frame, recv_frame,
+                                           decode_command, decode_batch, encode_batch_reply, encode_telemetry,
+                                           decode_telemetry_rate)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7009
+DEFAULT_TELEMETRY_PORT = 7010
+DEFAULT_CONTROL_PORT = 7011
+DEFAULT_HOME_POSITION = [347.85, 34.5, 491.3, 179, -179.9, 179]
+
+#Doosan constants used in the commands
+DR_BASE = 0
+DR_TOOL = 1
+DR_MV_MOD_ABS = 0
+DR_MV_MOD_REL = 1
+DR_SSTOP = 2
+
+ASYNC_MOTION_COMMANDS = ("amovel", "amovej", "amovejx", "amovec", "amovesj", "amovesx", "amoveb", "amove_spiral", "amove_periodic")
+MOTION_COMMANDS = ("movel", "movej", "movejx", "movec", "movesj", "movesx", "moveb", "move_spiral", "move_periodic", "move_home")
+CONTROL_COMMANDS = ("stop",)
+
+MOTION_STATE_IDLE = 0
+MOTION_STATE_BUSY = 2
+DEFAULT_ROTATION_VELOCITY = 60 #deg/s
+HOME_VELOCITY = 200 #mm/s
+HOME_ACCELERATION = 400
+FIXED_WAIT = 1 #seconds the robot side waits after a command without completion ack
+POLL_INTERVAL = 0.005
+
+#telemetry model
+JOINT_TORQUE_BASE = np.array([0.5, -35.0, 18.0, 0.2, 2.5, 0.05])
+JOINT_TORQUE_NOISE = 0.3
+EXTERNAL_TORQUE_NOISE = 0.2
+TOOL_FORCE_NOISE = 0.5
+CONTACT_FORCE = np.array([0.0, 0.0, -35.0, 0.0, 0.0, 0.0]) #N - plug pressed into the socket
+
+def wrap_angles(angles):
+    return (np.asarray(angles) + 180) % 360 - 180
+
+def motion_duration(distance, rotation, vel, acc):
+    """
+    Duration of a trapezoidal velocity profile, the slower of translation and rotation
+    """
+    vel = float(vel[0] if isinstance(vel, (list, tuple)) else vel)
+    acc = float(acc[0] if isinstance(acc, (list, tuple)) else acc)
+    if distance > vel*vel/acc:
+        linear = distance/vel + vel/acc
+    else:
+        linear = 2*math.sqrt(distance/acc)
+    return max(linear, rotation/DEFAULT_ROTATION_VELOCITY)
+
+class Motion:
+    """
+    A motion of the simulated robot, the pose is a function of the elapsed time
+    """
+
+    def __init__(self, start_pose, duration, target=None, amplitude=None, period=None):
+        self.start_pose = start_pose
+        self.start_time = time.monotonic()
+        self.duration = duration
+        self.target = target
+        self.amplitude = amplitude
+        self.period = period
+
+    def pose(self, now):
+        elapsed = min(now - self.start_time, self.duration)
+        if self.amplitude is not None:
+            phase = np.divide(2*math.pi*elapsed, self.period, out=np.zeros(6), where=self.period > 0)
+            return self.start_pose + self.amplitude*np.sin(phase)
+        u = elapsed/self.duration if self.duration > 0 else 1.0
+        s = u*u*(3 - 2*u) #smooth start and end
+        delta = self.target - self.start_pose
+        delta[3:6] = wrap_angles(delta[3:6])
+        pose = self.start_pose + delta*s
+        pose[3:6] = wrap_angles(pose[3:6])
+        return pose
+
+    def finished(self, now):
+        return now - self.start_time >= self.duration
+
+class SimulatedRobot:
+    """
+    Simulated pose and the fake DRL functions
+
+    Args:
+        home_position (list): pose of move_home
+        time_scale (float): factor for all motion and wait times, e.g. 0.1 runs ten times faster
+        seed (int): seed of the telemetry noise
+    """
+
+    def __init__(self, home_position=DEFAULT_HOME_POSITION, time_scale=1.0, seed=0):
+        self.home_position = np.array(home_position, dtype=float)
+        self.pose = self.home_position.copy()
+        self.time_scale = float(time_scale)
+        self.motion = None
+        self.compliance = False
+        self.stop_requested = False
+        self.lock = threading.Lock()
+        self.random = np.random.default_rng(seed)
+        self.command_count = 0
+
+    def current_pose(self):
+        with self.lock:
+            return self._update(time.monotonic())
+
+    def _update(self, now):
+        if self.motion is not None:
+            self.pose = self.motion.pose(now)
+            if self.motion.finished(now):
+                self.motion = None
+        return self.pose.copy()
+
+    def _start_motion(self, motion):
+        with self.lock:
+            self._update(time.monotonic())
+            self.motion = motion
+
+    def _relative_target(self, pos, mod, ref):
+        start = self.current_pose()
+        pos = np.array(pos, dtype=float)
+        if mod != DR_MV_MOD_REL:
+            return start, pos
+        delta = pos.copy()
+        if ref == DR_TOOL:
+            delta[0:3] = zyz_to_matrix(start[3:6]) @ delta[0:3]
+        return start, start + delta
+
+    def _linear(self, pos, vel, acc, mod, ref):
+        start, target = self._relative_target(pos, mod, ref)
+        rotation = float(np.abs(wrap_angles(target[3:6] - start[3:6])).max())
+        duration = motion_duration(float(np.linalg.norm(target[0:3] - start[0:3])), rotation, vel, acc)
+        motion = Motion(start, duration*self.time_scale, target=target)
+        self._start_motion(motion)
+        return motion
+
+    def _wait_for(self, motion):
+        while self.motion is motion:
+            time.sleep(POLL_INTERVAL)
+            self.current_pose()
+
+    #fake DRL functions
+    def amovel(self, pos, vel=100, acc=100, ref=DR_BASE, mod=DR_MV_MOD_ABS, **kwargs):
+        self._linear(pos, vel, acc, mod, ref)
+
+    def movel(self, pos, vel=100, acc=100, ref=DR_BASE, mod=DR_MV_MOD_ABS, **kwargs):
+        self._wait_for(self._linear(pos, vel, acc, mod, ref))
+
+    def move_home(self, target=None):
+        self._wait_for(self._linear(self.home_position, HOME_VELOCITY, HOME_ACCELERATION, DR_MV_MOD_ABS, DR_BASE))
+
+    def amove_periodic(self, amp, period, atime=0, repeat=1, ref=DR_TOOL, **kwargs):
+        start = self.current_pose()
+        amplitude = np.array(amp, dtype=float)
+        period = np.array(period if isinstance(period, (list, tuple)) else [period]*6, dtype=float)
+        if ref == DR_TOOL:
+            amplitude[0:3] = zyz_to_matrix(start[3:6]) @ amplitude[0:3]
+        duration = float(period.max())*repeat*self.time_scale
+        self._start_motion(Motion(start, duration, amplitude=amplitude, period=period*self.time_scale))
+
+    def stop(self, stop_mode=DR_SSTOP):
+        with self.lock:
+            self._update(time.monotonic())
+            self.motion = None
+
+    def wait(self, seconds):
+        time.sleep(float(seconds)*self.time_scale)
+
+    def check_motion(self):
+        with self.lock:
+            self._update(time.monotonic())
+            return MOTION_STATE_IDLE if self.motion is None else MOTION_STATE_BUSY
+
+    def task_compliance_ctrl(self, stx=None, **kwargs):
+        self.compliance = True
+
+    def release_compliance_ctrl(self):
+        self.compliance = False
+
+    def change_operation_speed(self, speed):
+        pass
+
+    def get_current_posx(self, ref=DR_BASE):
+        return (self.current_pose().tolist(), 0)
+
+    def get_joint_torque(self):
+        return (JOINT_TORQUE_BASE + self.random.normal(0, JOINT_TORQUE_NOISE, 6)).tolist()
+
+    def get_external_torque(self):
+        return self.random.normal(0, EXTERNAL_TORQUE_NOISE, 6).tolist()
+
+    def get_tool_force(self, ref=DR_BASE):
+        force = self.random.normal(0, TOOL_FORCE_NOISE, 6)
+        if self.compliance or (self.motion is not None and self.motion.amplitude is not None):
+            force += CONTACT_FORCE
+        return force.tolist()
+
+    def namespace(self):
+        """
+        Globals for executing the DRL commands
+        """
+        names = ("amovel", "movel", "move_home", "amove_periodic", "stop", "wait", "check_motion",
+                 "task_compliance_ctrl", "release_compliance_ctrl", "change_operation_speed",
+                 "get_current_posx", "get_joint_torque", "get_external_torque", "get_tool_force")
+        namespace = {name: getattr(self, name) for name in names}
+        namespace.update(DR_BASE=DR_BASE, DR_TOOL=DR_TOOL, DR_MV_MOD_ABS=DR_MV_MOD_ABS,
+                         DR_MV_MOD_REL=DR_MV_MOD_REL, DR_SSTOP=DR_SSTOP)
+        return namespace
+
+    def execute(self, command, flags=0):
+        """
+        Execute a DRL command like execute_command of setup_robot_server.py
+
+        Returns:
+            int: acknowledgement type for the reply
+        """
+        self.command_count += 1
+        exec(command, self.namespace())
+        if not flags & FLAG_COMPLETION_ACK:
+            self.wait(FIXED_WAIT)
+            return ACK_NONE
+        name = command.split("(")[0].strip()
+        if name in ASYNC_MOTION_COMMANDS:
+            return ACK_ACCEPTED
+        if name in MOTION_COMMANDS:
+            while self.check_motion() != MOTION_STATE_IDLE:
+                time.sleep(POLL_INTERVAL)
+        return ACK_FINISHED
+
+    def telemetry(self):
+        return {
+            "current_pos": self.current_pose().tolist(),
+            "joint_torque": self.get_joint_torque(),
+            "external_torque": self.get_external_torque(),
+            "tool_force": self.get_tool_force(),
+        }
+
+class FakeRobotServer:
+    """
+    Command, telemetry and control sockets of setup_robot_server.py for a SimulatedRobot
+    """
+
+    def __init__(self, robot, host=DEFAULT_HOST, port=DEFAULT_PORT, telemetry_port=DEFAULT_TELEMETRY_PORT,
+                 control_port=DEFAULT_CONTROL_PORT):
+        self.robot = robot
+        self.host = host
+        self.ports = {"command": int(port), "telemetry": int(telemetry_port), "control": int(control_port)}
+        self.sockets = []
+        self.running = False
+
+    def start(self):
+        self.running = True
+        handlers = {"command": self._command_client, "telemetry": self._telemetry_client, "control": self._control_client}
+        for name, handler in handlers.items():
+            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server_socket.bind((self.host, self.ports[name]))
+            server_socket.listen(1)
+            self.sockets.append(server_socket)
+            threading.Thread(target=self._accept, args=(name, server_socket, handler), name=f"fake-robot-{name}", daemon=True).start()
+        print(f"Fake robot listening on {self.host} {self.ports}")
+
+    def stop(self):
+        self.running = False
+        for server_socket in self.sockets:
+            server_socket.close()
+
+    def _accept(self, name, server_socket, handler):
+        while self.running:
+            try:
+                client, address = server_socket.accept()
+            except OSError:
+                break
+            print(f"{name} connection established with: {address}")
+            try:
+                handler(client)
+            except Exception as e: #like the DRL program, a failing command ends the connection
+                print(f"{name} connection closed: {e!r}")
+            finally:
+                client.close()
+
+    def _command_client(self, client):
+        while True:
+            #the protocol is chosen by the server (config.ini) - detect it from the first bytes
+            prefix = client.recv(len(MAGIC), socket.MSG_PEEK)
+            if not prefix:
+                return
+            if prefix == MAGIC:
+                msg_type, flags, payload = recv_frame(client)
+                self.robot.stop_requested = False
+                if msg_type == MSG_BATCH:
+                    steps = []
+                    for command in decode_batch(payload):
+                        if self.robot.stop_requested:
+                            break
+                        ack = self.robot.execute(command, flags)
+                        steps.append((ack, self.robot.telemetry()))
+                    send_frame(client, MSG_BATCH_REPLY, encode_batch_reply(steps))
+                elif msg_type == MSG_COMMAND:
+                    ack = self.robot.execute(decode_command(payload), flags)
+                    send_frame(client, MSG_REPLY, encode_telemetry(self.robot.telemetry()), ack)
+                continue
+
+            command = client.recv(1024).decode("utf-8")
+            self.robot.execute(command)
+            robot_information = {
+                "current_pos": str(self.robot.get_current_posx()),
+                "joint_torque": str(self.robot.get_joint_torque()),
+                "external_torque": str(self.robot.get_external_torque()),
+                "tool_force": str(self.robot.get_tool_force()),
+            }
+            client.sendall(str(robot_information).encode("utf-8"))
+
+    def _telemetry_client(self, client):
+        msg_type, _, payload = recv_frame(client)
+        if msg_type != MSG_TELEMETRY_SUBSCRIBE:
+            return
+        rate = decode_telemetry_rate(payload)
+        if not rate > 0: #also rejects nan
+            print("Rejected telemetry rate:", rate)
+            return
+        period = 1.0/rate
+        while self.running:
+            send_frame(client, MSG_TELEMETRY, encode_telemetry(self.robot.telemetry()))
+            time.sleep(period)
+
+    def _control_client(self, client):
+        while True:
+            msg_type, _, payload = recv_frame(client)
+            command = decode_command(payload)
+            if command.split("(")[0].strip() not in CONTROL_COMMANDS:
+                print("Rejected control command:", command)
+                send_frame(client, MSG_REPLY, encode_telemetry(self.robot.telemetry()), ACK_NONE)
+                continue
+            self.robot.stop_requested = True
+            self.robot.execute(command, FLAG_COMPLETION_ACK)
+            send_frame(client, MSG_REPLY, encode_telemetry(self.robot.telemetry()), ACK_FINISHED)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Doosan robot server")
+    parser.add_argument("--config", default="config.ini", help="home position and ports are read from the config")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--time-scale", default=1.0, type=float, help="factor for motion and wait times")
+    parser.add_argument("--seed", default=0, type=int)
+    args = parser.parse_args()
+
+    settings = load_settings(args.config)
+    robot = SimulatedRobot(settings.robot.home_position, args.time_scale, args.seed)
+    server = FakeRobotServer(
+        robot,
+        args.host,
+        settings.robot.port,
+        settings.telemetry.port,
+        #like the robot script, the simulator always listens for stops, also if the server does not use it
+        settings.robot.control_port or DEFAULT_CONTROL_PORT
+    )
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
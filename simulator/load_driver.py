@@ -0,0 +1,175 @@
+"""
+Load driver for the charge cycle: runs plug-in/plug-out cycles through the
+server like the rocsys GUI (commands.PlugInCommand/PlugOutCommand over
+Socket.IO), with the stub vision client, and reports the cycle time breakdown.
+
+Start the fake robot and the server first:
+    python -m simulator.fake_robot --time-scale 0.1
+    ROBOT__ip=127.0.0.1 python run_server.py
+    python -m simulator.load_driver --cycles 200 [--json report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+import socketio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rocsys-files"))
+from commands import PlugInCommand, PlugOutCommand, read_motion_message, CT_SOCKET_DET, CT_PLUG_IN
+from vision_client import StubVisionClient, VisionResult, STATUS_SUCCESS
+
+DEFAULT_URL = "http://127.0.0.1:4444"
+DEFAULT_CYCLE_TIMEOUT = 120
+MSG_PLUG_IN_COMPLETE = "plug_in_complete"
+MSG_PLUG_OUT_COMPLETE = "plug_out_complete"
+MSG_SAFETY_STOP = "safety_stop_response"
+MARK_INTERRUPTED = "interrupted"
+
+#phase name, start mark, end mark
+PHASES = [
+    ("home", "start", "take image"),
+    ("vision_1", "take image", "detection_1"),
+    ("retake_motion", "detection_1", "retake image"),
+    ("vision_2", "retake image", "detection_2"),
+    ("approach_motion", "detection_2", "in position"),
+    ("plug_in_request", "in position", "plug_in_sent"),
+    ("plug_in", "plug_in_sent", MSG_PLUG_IN_COMPLETE),
+    ("plug_out", "plug_out_sent", MSG_PLUG_OUT_COMPLETE),
+    ("total", "start", MSG_PLUG_OUT_COMPLETE),
+]
+
+class Cycle:
+    """
+    Timestamps of the steps of one charge cycle
+    """
+
+    def __init__(self):
+        self.marks = {}
+        self.detections = 0
+        self.events = {MSG_PLUG_IN_COMPLETE: threading.Event(), MSG_PLUG_OUT_COMPLETE: threading.Event()}
+
+    def mark(self, name):
+        self.marks.setdefault(name, time.monotonic())
+        if name in self.events:
+            self.events[name].set()
+
+    def on_message(self, message):
+        """
+        Mark a received message, an interrupted motion ends the cycle
+        """
+        message, motion = read_motion_message(message)
+        if motion.interrupted:
+            self.mark(MARK_INTERRUPTED)
+            for event in self.events.values():
+                event.set()
+        else:
+            self.mark(message)
+
+    def durations(self):
+        return {
+            phase: self.marks[end] - self.marks[start]
+            for phase, start, end in PHASES
+            if start in self.marks and end in self.marks
+        }
+
+class TimedPlugInCommand(PlugInCommand):
+    """
+    PlugInCommand that marks every received message and sent command in the cycle
+    """
+
+    def __init__(self, url, target, sio, vision, cycle):
+        self.cycle = cycle
+        super().__init__(url, target, sio, vision)
+
+    def handle_response(self, msg):
+        self.cycle.mark(read_motion_message(msg)[0])
+        super().handle_response(msg)
+
+    def send_message(self, output=dict):
+        super().send_message(output)
+        if output.get("content") == CT_SOCKET_DET:
+            self.cycle.detections += 1
+            self.cycle.mark(f"detection_{self.cycle.detections}")
+        elif output.get("content") == CT_PLUG_IN:
+            self.cycle.mark("plug_in_sent")
+
+def run_cycle(sio, url, target, vision, timeout):
+    """
+    Run one plug-in/plug-out cycle
+
+    Returns:
+        Cycle
+    """
+    cycle = Cycle()
+    sio.on("message_input", cycle.on_message)
+    sio.on("message_all", cycle.on_message)
+
+    command = TimedPlugInCommand(url, target, sio, vision, cycle)
+    cycle.mark("start")
+    command.send_message(command.execute())
+    if not cycle.events[MSG_PLUG_IN_COMPLETE].wait(timeout) or MARK_INTERRUPTED in cycle.marks:
+        return cycle
+
+    cycle.mark("plug_out_sent")
+    command.send_message(PlugOutCommand(url, command.cycle_id).execute())
+    cycle.events[MSG_PLUG_OUT_COMPLETE].wait(timeout)
+    return cycle
+
+def summarize(cycles):
+    """
+    Returns:
+        dict: statistics per phase in seconds and the amount of incomplete cycles
+    """
+    phases = {}
+    for phase, _, _ in PHASES:
+        values = np.array([cycle.durations()[phase] for cycle in cycles if phase in cycle.durations()])
+        if values.size == 0:
+            continue
+        phases[phase] = {
+            "count": int(values.size),
+            "mean": round(float(values.mean()), 3),
+            "p50": round(float(np.percentile(values, 50)), 3),
+            "p95": round(float(np.percentile(values, 95)), 3),
+            "max": round(float(values.max()), 3),
+        }
+    return {
+        "cycles": len(cycles),
+        "incomplete": sum(MSG_PLUG_OUT_COMPLETE not in cycle.marks for cycle in cycles),
+        "safety_stops": sum(MSG_SAFETY_STOP in cycle.marks for cycle in cycles),
+        "interrupted": sum(MARK_INTERRUPTED in cycle.marks for cycle in cycles),
+        "phases": phases,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Charge cycle load driver")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--cycles", default=10, type=int)
+    parser.add_argument("--target", default=0, type=int, help="front socket position")
+    parser.add_argument("--vision-delay", default=0.5, type=float, help="simulated detection time in seconds")
+    parser.add_argument("--coords", default=list(StubVisionClient.DEFAULT_COORDS), nargs=6, type=float,
+                        help="socket pose returned by the stub vision client, m/rad")
+    parser.add_argument("--timeout", default=DEFAULT_CYCLE_TIMEOUT, type=float, help="seconds per cycle step")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    vision = StubVisionClient([VisionResult(STATUS_SUCCESS, args.coords, "stub: success")], args.vision_delay)
+    sio = socketio.Client()
+    sio.connect(args.url)
+    cycles = []
+    try:
+        for i in range(args.cycles):
+            cycle = run_cycle(sio, args.url, args.target, vision, args.timeout)
+            cycles.append(cycle)
+            total = cycle.durations().get("total")
+            print(f"Cycle {i+1}/{args.cycles}: " + (f"{total:.2f}s" if total is not None else "incomplete"))
+    finally:
+        sio.disconnect()
+
+    report = summarize(cycles)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
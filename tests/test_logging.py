@@ -0,0 +1,31 @@
+import logging
+import pytest
+from message_server import roc_logging
+from message_server.settings import LoggingSettings
+
+@pytest.fixture
+def queued_logging(tmp_path, monkeypatch):
+    #fresh module state, the loggers of this test are removed again
+    for name in ("settings", "loggers", "file_log_handler", "console_log_handler", "queue_handler", "queue_listener"):
+        monkeypatch.setattr(roc_logging, name, {} if name == "loggers" else None)
+    roc_logging.setup_logging(LoggingSettings(console_log_level=logging.INFO, debug=False, log_dir=str(tmp_path),
+                                              min_level=logging.INFO, queued=True))
+    yield tmp_path / roc_logging.DEFAULT_LOG_FILE_NAME
+    roc_logging.stop_logging()
+    for logger in roc_logging.loggers.values():
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+    roc_logging.file_log_handler.close()
+
+def test_records_after_stop_are_written(queued_logging):
+    logger = roc_logging.get_logger("test_logging")
+    logger.info("queued record")
+    roc_logging.stop_logging()
+    assert roc_logging.queue_listener is None
+    assert all(not isinstance(handler, roc_logging.DroppingQueueHandler) for handler in logger.handlers)
+    logger.info("record during shutdown")
+    roc_logging.get_logger("test_logging_late").info("record of a new logger")
+    roc_logging.file_log_handler.flush()
+    lines = queued_logging.read_text().splitlines()
+    assert [line.rsplit(" - ", 1)[1] for line in lines] == ["queued record", "record during shutdown",
+                                                           "record of a new logger"]
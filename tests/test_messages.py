@@ -0,0 +1,70 @@
+import json
+import pytest
+from message_server.messages import (decode_message, MessageError, SocketDetection, SafetyDetection, ResetPlugIn,
+                                     CT_SOCKET_DET, CT_SAFETY, CT_RESET_PLUG_IN)
+
+def message(content, data, message_type="cmd", **fields):
+    return json.dumps({"message_type": message_type, "content": content, "data": data, **fields})
+
+def test_socket_detection():
+    decoded = decode_message(message(CT_SOCKET_DET, {"result": 1, "unit": "m/rad", "coords": [0.35, 0.02, -0.05, 0, 0, 0.1]},
+                                     cycle_id="ed9b87f50ac9"))
+    assert (decoded.message_type, decoded.content, decoded.cycle_id) == ("cmd", CT_SOCKET_DET, "ed9b87f50ac9")
+    assert isinstance(decoded.data, SocketDetection)
+    assert (decoded.data.result, decoded.data.unit, decoded.data.coords) == (1, "m/rad", [0.35, 0.02, -0.05, 0, 0, 0.1])
+
+def test_failed_socket_detection_needs_no_coords():
+    decoded = decode_message(message(CT_SOCKET_DET, {"result": 0}))
+    assert (decoded.data.result, decoded.data.coords) == (0, None)
+
+@pytest.mark.parametrize("data", [
+    {},
+    {"result": 3},
+    {"result": True, "unit": "m/rad", "coords": [0]*6},
+    {"result": 1, "unit": "inch", "coords": [0]*6},
+    {"result": 1, "unit": "m/rad"},
+    {"result": 1, "unit": "m/rad", "coords": [0]*5},
+    {"result": 1, "unit": "m/rad", "coords": [0, 0, 0, 0, 0, "0"]},
+    {"result": 1, "unit": "m/rad", "coords": [0, 0, 0, 0, 0, False]},
+])
+def test_invalid_socket_detection(data):
+    with pytest.raises(MessageError):
+        decode_message(message(CT_SOCKET_DET, data))
+
+def test_safety_detection():
+    decoded = decode_message(message(CT_SAFETY, {"result": 0, "message": "Foreign object detected",
+                                                 "object": {"name": "person"}, "timestamp": 1700000000.5}, "msg"))
+    assert isinstance(decoded.data, SafetyDetection)
+    assert (decoded.data.result, decoded.data.object, decoded.data.timestamp) == (0, {"name": "person"}, 1700000000.5)
+
+@pytest.mark.parametrize("data", [{"result": 5}, {"result": 0, "message": 1}, {"result": 0, "timestamp": "now"}])
+def test_invalid_safety_detection(data):
+    with pytest.raises(MessageError):
+        decode_message(message(CT_SAFETY, data, "msg"))
+
+def test_reset_plug_in():
+    assert decode_message(message(CT_RESET_PLUG_IN, {"target": 2})).data.target == 2
+    assert isinstance(decode_message(message(CT_RESET_PLUG_IN, {})).data, ResetPlugIn)
+    with pytest.raises(MessageError):
+        decode_message(message(CT_RESET_PLUG_IN, {"target": "2"}))
+
+def test_legacy_and_unknown_data():
+    #legacy senders put str(dict) into the data field, unknown contents keep their dict
+    assert decode_message(message(CT_SOCKET_DET, str({"result": 0}))).data.result == 0
+    assert decode_message(message("start_plug_in", "")).data == {}
+    assert decode_message({"message_type": "cmd", "content": "start_unplug", "data": None}).data == {}
+    assert decode_message(message("collect_data", {"amount": 3})).data == {"amount": 3}
+
+@pytest.mark.parametrize("raw", [
+    "not json",
+    "[1, 2]",
+    json.dumps({"message_type": "cmd", "content": "start_plug_in"}),
+    message("start_plug_in", {}, "event"),
+    message(1, {}),
+    message("start_plug_in", [1]),
+    message("start_plug_in", "__import__('os')"),
+    message("start_plug_in", {}, cycle_id=5),
+])
+def test_invalid_envelope(raw):
+    with pytest.raises(MessageError):
+        decode_message(raw)
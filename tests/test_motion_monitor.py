@@ -0,0 +1,118 @@
+import threading
+import time
+import pytest
+from message_server.motion_monitor import MotionMonitor
+from message_server.robot_controller import RobotController
+from message_server.telemetry import TelemetryStore
+
+SAMPLE_INTERVAL = 0.005
+TARGET = [500.0, 0.0, 300.0, 0.0, 180.0, 0.0]
+
+class TelemetryFeed:
+    """
+    Pushes a sample of position(elapsed seconds) into the store every SAMPLE_INTERVAL
+    """
+
+    def __init__(self, store, position):
+        self.store = store
+        self.position = position
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        start = time.monotonic()
+        while self.running:
+            self.store.push({"timestamp": time.time(), "current_pos": self.position(time.monotonic() - start)})
+            time.sleep(SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+
+def approach(elapsed, duration=0.1):
+    """
+    Linear motion from 100 mm before the target, standing still at the target after the duration
+    """
+    progress = min(elapsed/duration, 1.0)
+    return [TARGET[0] - 100*(1 - progress)] + TARGET[1:]
+
+@pytest.fixture
+def store():
+    return TelemetryStore()
+
+def test_completes_when_standing_still_at_target(store):
+    monitor = MotionMonitor(store, settle_time=0.05, timeout=5)
+    with TelemetryFeed(store, approach):
+        completed, duration = monitor.wait_for_completion(TARGET)
+    assert completed
+    assert 0.1 <= duration < 1
+
+def test_without_target_completes_when_standing_still(store):
+    monitor = MotionMonitor(store, settle_time=0.05, timeout=5)
+    with TelemetryFeed(store, lambda elapsed: TARGET):
+        completed, duration = monitor.wait_for_completion()
+    assert completed and duration < 1
+
+def test_standing_still_away_from_target_times_out(store):
+    monitor = MotionMonitor(store, target_tolerance=2, settle_time=0.05, timeout=0.2)
+    with TelemetryFeed(store, lambda elapsed: [TARGET[0] - 10] + TARGET[1:]):
+        completed, duration = monitor.wait_for_completion(TARGET)
+    assert not completed
+    assert 0.2 <= duration < 1
+
+def test_moving_robot_times_out(store):
+    monitor = MotionMonitor(store, settle_time=0.05, timeout=5)
+    with TelemetryFeed(store, lambda elapsed: [TARGET[0] + 100*elapsed] + TARGET[1:]):
+        completed, duration = monitor.wait_for_completion(timeout=0.2) #overrides the configured timeout
+    assert not completed
+    assert 0.2 <= duration < 1
+
+def test_no_telemetry_times_out(store):
+    completed, duration = MotionMonitor(store, timeout=0.1).wait_for_completion(TARGET)
+    assert not completed and duration >= 0.1
+
+def test_cancelled(store):
+    monitor = MotionMonitor(store, settle_time=0.05, timeout=5)
+    cancel_at = time.monotonic() + 0.05
+    with TelemetryFeed(store, lambda elapsed: [TARGET[0] + 100*elapsed] + TARGET[1:]):
+        completed, duration = monitor.wait_for_completion(TARGET, lambda: time.monotonic() >= cancel_at)
+    assert not completed
+    assert duration < 1
+
+class RecordingHandler:
+    def __init__(self):
+        self.sent = []
+        self.event = threading.Event()
+
+    def send_message(self, target, message):
+        self.sent.append((target, message))
+        self.event.set()
+
+@pytest.fixture
+def controller(store):
+    controller = RobotController("127.0.0.1", 7009, TARGET, [0]*6, True, "wiggle")
+    controller.message_handler = RecordingHandler()
+    controller.motion_monitor = MotionMonitor(store, settle_time=0.05, timeout=30)
+    return controller
+
+def test_notify_waits_at_most_the_client_delay(store, controller):
+    with TelemetryFeed(store, lambda elapsed: [TARGET[0] + 100*elapsed] + TARGET[1:]):
+        controller._notify_after_motion("take_image", "retake image", TARGET, 0.2)
+        assert controller.message_handler.event.wait(2)
+    target, message = controller.message_handler.sent[0]
+    assert target == "take_image"
+    assert (message["message"], message["motion_complete"], message["interrupted"]) == ("retake image", False, False)
+    assert 0.2 <= message["duration"] < 1
+
+def test_notify_reports_safety_stop(store, controller):
+    with TelemetryFeed(store, lambda elapsed: [TARGET[0] + 100*elapsed] + TARGET[1:]):
+        controller._notify_after_motion("message_input", "plug_out_complete", TARGET, 9)
+        time.sleep(0.05)
+        controller.safety_stop = True
+        assert controller.message_handler.event.wait(2)
+    message = controller.message_handler.sent[0][1]
+    assert (message["message"], message["motion_complete"], message["interrupted"]) == ("plug_out_complete", False, True)
@@ -0,0 +1,86 @@
+import socket
+import threading
+import time
+import pytest
+from message_server.message_handler import MessageHandler
+from message_server.robot_controller import RobotController, TGT_INPUT, TGT_SAFETY, TGT_ALL
+from message_server.robot_protocol import PROTOCOL_BINARY, PROTOCOL_TEXT, ACK_MODE_COMPLETION, ACK_MODE_FIXED_WAIT
+from simulator.fake_robot import SimulatedRobot, FakeRobotServer, DEFAULT_HOME_POSITION
+
+TIME_SCALE = 0.05 #the wiggle waits 10 s, 0.5 s in the test
+
+class RecordingServer:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, client, message):
+        self.sent.append((client, message))
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+@pytest.fixture
+def robot():
+    ports = [free_port() for _ in range(3)]
+    robot = SimulatedRobot(DEFAULT_HOME_POSITION, TIME_SCALE)
+    server = FakeRobotServer(robot, "127.0.0.1", *ports)
+    server.start()
+    yield robot, ports
+    server.stop()
+
+def connect(robot, protocol, ack_mode, control=True):
+    _, (port, _, control_port) = robot
+    controller = RobotController("127.0.0.1", port, DEFAULT_HOME_POSITION, [0]*6, True, "wiggle")
+    server = RecordingServer()
+    handler = MessageHandler(server, controller, protocol, ack_mode, control_port if control else None)
+    return controller, handler, server
+
+def input_messages(server):
+    return [message for target, message in server.sent if target == TGT_INPUT]
+
+def plug_in_with_stop(controller, stop_after):
+    plug_in = threading.Thread(target=controller.plug_in)
+    plug_in.start()
+    time.sleep(stop_after)
+    controller.stop()
+    plug_in.join(5)
+    assert not plug_in.is_alive()
+
+def test_plug_in_complete(robot):
+    controller, handler, server = connect(robot, PROTOCOL_BINARY, ACK_MODE_COMPLETION)
+    controller.plug_in()
+    assert server.sent == [(TGT_INPUT, "plug_in_complete"), (TGT_SAFETY, "stop_detection")]
+    handler.robot_socket.close()
+
+def test_safety_stop_aborts_plug_in_batch(robot):
+    controller, handler, server = connect(robot, PROTOCOL_BINARY, ACK_MODE_COMPLETION)
+    plug_in_with_stop(controller, 0.1) #during the wait step
+    assert robot[0].command_count == 3 #amove_periodic, wait and the stop of the control connection
+    assert (TGT_SAFETY, "stop_detection") not in server.sent
+    assert (TGT_ALL, "safety_stop_response") in server.sent
+    [message] = input_messages(server)
+    assert (message["message"], message["motion_complete"], message["interrupted"]) == ("plug_in_complete", False, True)
+    handler.robot_socket.close()
+
+def test_safety_stop_aborts_plug_in_in_text_mode(robot):
+    controller, handler, server = connect(robot, PROTOCOL_TEXT, ACK_MODE_FIXED_WAIT, control=False)
+    plug_in_with_stop(controller, 0.1) #the stop waits for the running command, the remaining ones are not sent
+    assert (TGT_SAFETY, "stop_detection") not in server.sent
+    [message] = input_messages(server)
+    assert (message["message"], message["interrupted"]) == ("plug_in_complete", True)
+    handler.robot_socket.close()
+
+def test_safety_stop_aborts_plug_out_batch(robot):
+    controller, handler, server = connect(robot, PROTOCOL_BINARY, ACK_MODE_COMPLETION)
+    controller.current_position = robot[0].current_pose().tolist()
+    plug_out = threading.Thread(target=controller.plug_out)
+    plug_out.start()
+    time.sleep(0.02) #during the synchronous movel
+    controller.stop()
+    plug_out.join(5)
+    assert server.sent[0] == (TGT_SAFETY, "start_detection")
+    [message] = input_messages(server)
+    assert (message["message"], message["interrupted"]) == ("plug_out_complete", True)
+    handler.robot_socket.close()
@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pytest
+from message_server.recorder import (TelemetryRecorder, read_range, load_range, list_chunks, chunk_range,
+                                     SOURCE_REPLY, SOURCE_STREAM, SAMPLE_DTYPE)
+from message_server.robot_protocol import TELEMETRY_FIELDS
+
+def sample(value):
+    return {field: [float(value)]*6 for field in TELEMETRY_FIELDS}
+
+def record(recorder, timestamps, **kwargs):
+    for timestamp in timestamps:
+        recorder.record(sample(timestamp), timestamp=float(timestamp), **kwargs)
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "telemetry")
+
+def test_chunks_are_written_when_full(directory):
+    recorder = TelemetryRecorder(directory, chunk_size=4, max_chunks=10)
+    record(recorder, range(1, 11))
+    recorder.close() #also saves the last, not full chunk
+    chunks = list_chunks(directory)
+    assert [chunk_range(path) for path in chunks] == [(1, 4), (5, 8), (9, 10)]
+    assert [len(np.load(path)) for path in chunks] == [4, 4, 2]
+
+def test_oldest_chunks_are_deleted(directory):
+    recorder = TelemetryRecorder(directory, chunk_size=2, max_chunks=2)
+    record(recorder, range(1, 9))
+    recorder.close()
+    assert [chunk_range(path) for path in list_chunks(directory)] == [(5, 6), (7, 8)]
+
+@pytest.mark.parametrize("chunk_size, max_chunks", [(0, 10), (4, 0), (4, -1)])
+def test_invalid_limits(directory, chunk_size, max_chunks):
+    with pytest.raises(ValueError):
+        TelemetryRecorder(directory, chunk_size, max_chunks)
+
+def test_read_range(directory):
+    recorder = TelemetryRecorder(directory, chunk_size=4, max_chunks=10)
+    record(recorder, range(1, 13))
+    recorder.close()
+    views = read_range(directory, 3, 6)
+    assert [view["timestamp"].tolist() for view in views] == [[3, 4], [5, 6]]
+    assert all(isinstance(view, np.memmap) for view in views) #views of the files, not copies
+    assert load_range(directory, 3, 6)["timestamp"].tolist() == [3, 4, 5, 6]
+    assert load_range(directory, 5, 8)["timestamp"].tolist() == [5, 6, 7, 8]
+    assert len(load_range(directory)) == 12
+    assert len(load_range(directory, 100, 200)) == 0
+    assert load_range(directory, 100, 200).dtype == SAMPLE_DTYPE
+
+def test_out_of_order_samples_are_sorted(directory):
+    #stream samples carry the robot timestamp, replies the receive time
+    recorder = TelemetryRecorder(directory, chunk_size=6, max_chunks=10)
+    record(recorder, [2, 4, 6], source=SOURCE_REPLY)
+    record(recorder, [1, 3, 5], source=SOURCE_STREAM)
+    recorder.close()
+    chunk = np.load(list_chunks(directory)[0])
+    assert chunk["timestamp"].tolist() == [1, 2, 3, 4, 5, 6]
+    assert chunk["source"].tolist() == [SOURCE_STREAM, SOURCE_REPLY]*3
+    assert chunk["current_pos"][:, 0].tolist() == [1, 2, 3, 4, 5, 6]
+    assert load_range(directory, 2, 4)["timestamp"].tolist() == [2, 3, 4]
+
+def test_command_id_is_kept_for_stream_samples(directory):
+    recorder = TelemetryRecorder(directory, chunk_size=3, max_chunks=10)
+    recorder.record(sample(1), command_id=7, timestamp=1.0)
+    recorder.record(sample(2), source=SOURCE_STREAM, timestamp=2.0)
+    recorder.record(sample(3), command_id=8, timestamp=3.0)
+    recorder.close()
+    assert load_range(directory)["command_id"].tolist() == [7, 7, 8]
+
+def test_empty_close_writes_nothing(directory):
+    TelemetryRecorder(directory).close()
+    assert os.path.isdir(directory)
+    assert list_chunks(directory) == []
@@ -0,0 +1,90 @@
+import socket
+import struct
+import pytest
+from message_server.robot_protocol import (ProtocolError, encode_frame, decode_header, send_frame, recv_frame,
+                                           encode_command, decode_command, encode_telemetry, decode_telemetry,
+                                           decode_text_reply, encode_telemetry_rate, decode_telemetry_rate,
+                                           encode_batch, decode_batch, encode_batch_reply, decode_batch_reply,
+                                           HEADER_SIZE, HEADER_FORMAT, MAGIC, VERSION, MAX_PAYLOAD_SIZE,
+                                           MSG_COMMAND, MSG_BATCH_REPLY, FLAG_COMPLETION_ACK, ACK_ACCEPTED,
+                                           ACK_FINISHED, TELEMETRY_FIELDS)
+
+ROBOT_INFORMATION = {
+    "current_pos": [347.85, 34.5, 491.3, 179.0, -179.9, 179.0],
+    "joint_torque": [0.5, -35.0, 18.0, 0.2, 2.5, 0.05],
+    "external_torque": [0.1, -0.2, 0.3, 0.0, 0.0, 0.0],
+    "tool_force": [0.0, 0.0, -35.0, 0.0, 0.0, 0.0],
+}
+
+def test_frame_round_trip_over_socket():
+    server, client = socket.socketpair()
+    with server, client:
+        send_frame(client, MSG_COMMAND, encode_command("amovel([1,2,3,0,0,0], vel=300)"), FLAG_COMPLETION_ACK)
+        send_frame(client, MSG_COMMAND, b"")
+        msg_type, flags, payload = recv_frame(server)
+        assert (msg_type, flags, decode_command(payload)) == (MSG_COMMAND, FLAG_COMPLETION_ACK,
+                                                              "amovel([1,2,3,0,0,0], vel=300)")
+        assert recv_frame(server) == (MSG_COMMAND, 0, b"")
+
+def test_truncated_frame_raises():
+    server, client = socket.socketpair()
+    with server:
+        client.sendall(encode_frame(MSG_COMMAND, b"stop(2)")[:-2])
+        client.close()
+        with pytest.raises(ConnectionError):
+            recv_frame(server)
+
+def test_invalid_headers_are_rejected():
+    assert decode_header(encode_frame(MSG_COMMAND, b"abc")[:HEADER_SIZE]) == (MSG_COMMAND, 0, 3)
+    with pytest.raises(ProtocolError):
+        decode_header(struct.pack(HEADER_FORMAT, b"XX", VERSION, MSG_COMMAND, 0, 0))
+    with pytest.raises(ProtocolError):
+        decode_header(struct.pack(HEADER_FORMAT, MAGIC, VERSION + 1, MSG_COMMAND, 0, 0))
+    with pytest.raises(ProtocolError):
+        decode_header(struct.pack(HEADER_FORMAT, MAGIC, VERSION, MSG_COMMAND, 0, MAX_PAYLOAD_SIZE + 1))
+
+def test_telemetry_round_trip():
+    assert decode_telemetry(encode_telemetry(ROBOT_INFORMATION)) == ROBOT_INFORMATION
+    with pytest.raises(ProtocolError):
+        decode_telemetry(encode_telemetry(ROBOT_INFORMATION)[:-8])
+
+def test_telemetry_rate_round_trip():
+    assert decode_telemetry_rate(encode_telemetry_rate(20.0)) == 20.0
+    with pytest.raises(ProtocolError):
+        decode_telemetry_rate(encode_telemetry_rate(20.0)[:-1])
+
+def test_batch_round_trip():
+    commands = ["movel([60,0,0,0,0,0], vel=50, acc=50, ref=1, mod=1)", "amovel([347.85,34.5,491.3,179,-179.9,179])",
+                "wait(10)", ""]
+    assert decode_batch(encode_batch(commands)) == commands
+    assert decode_batch(encode_batch([])) == []
+    with pytest.raises(ProtocolError):
+        decode_batch(encode_batch(commands) + b"x")
+
+@pytest.mark.parametrize("size", [0, 1, 3, 5, 10])
+def test_truncated_batch_raises_protocol_error(size):
+    #count, step length and command cut off
+    with pytest.raises(ProtocolError):
+        decode_batch(encode_batch(["wait(10)", "stop(2)"])[:size])
+
+def test_batch_reply_round_trip():
+    steps = decode_batch_reply(encode_batch_reply([(ACK_FINISHED, ROBOT_INFORMATION),
+                                                   (ACK_ACCEPTED, ROBOT_INFORMATION)]))
+    assert [step.pop("ack") for step in steps] == [ACK_FINISHED, ACK_ACCEPTED]
+    assert steps == [ROBOT_INFORMATION, ROBOT_INFORMATION]
+    with pytest.raises(ProtocolError):
+        decode_batch_reply(encode_batch_reply([(ACK_FINISHED, ROBOT_INFORMATION)])[:-1])
+    for size in (0, 1):
+        with pytest.raises(ProtocolError):
+            decode_batch_reply(encode_batch_reply([])[:size])
+
+def test_text_reply():
+    reply = str({
+        "current_pos": str((ROBOT_INFORMATION["current_pos"], 2)), #get_current_posx returns (pose, solution space)
+        **{field: str(ROBOT_INFORMATION[field]) for field in TELEMETRY_FIELDS[1:]}
+    })
+    assert decode_text_reply(reply) == ROBOT_INFORMATION
+    with pytest.raises(ProtocolError):
+        decode_text_reply("{'current_pos': '([1, 2], 2)'}")
+    with pytest.raises(ProtocolError):
+        decode_text_reply("not a reply")
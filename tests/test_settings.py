@@ -0,0 +1,112 @@
+import os
+import pytest
+from message_server.settings import load_settings, SettingsError, SERVER_MODE_THREADING
+from message_server.robot_protocol import PROTOCOL_TEXT, ACK_MODE_FIXED_WAIT
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.ini")
+
+MINIMAL_CONFIG = """
+[LOGGING]
+console_log_level = 20
+debug = False
+
+[SERVERCONFIG]
+host = 0.0.0.0
+port = 4444
+debug = False
+
+[ROBOT]
+ip = 127.0.0.1
+port = 7009
+home_position = [347.85,34.5,491.3,179,-179.9,179]
+accurate_detection = True
+plug_in_method = "wiggle"
+
+[CAMERA]
+os = [-82,-6,55.5,0,0,0]
+"""
+
+@pytest.fixture(autouse=True)
+def no_overrides(monkeypatch):
+    #SECTION__key environment variables override the config file
+    for name in list(os.environ):
+        if "__" in name and name.split("__")[0].isupper():
+            monkeypatch.delenv(name)
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / "config.ini"
+    path.write_text(MINIMAL_CONFIG)
+    return str(path)
+
+def test_shipped_config_defaults():
+    settings = load_settings(CONFIG_PATH)
+    assert settings.robot.protocol == PROTOCOL_TEXT
+    assert settings.robot.ack_mode == ACK_MODE_FIXED_WAIT
+    assert settings.robot.control_port is None
+    assert not settings.robot.motion_events
+    assert not settings.telemetry.enabled
+    assert not settings.recorder.enabled
+    assert not settings.logging.queued
+
+def test_minimal_config(config):
+    settings = load_settings(config)
+    assert settings.server.mode == SERVER_MODE_THREADING
+    assert settings.robot.home_position.tolist() == [347.85, 34.5, 491.3, 179, -179.9, 179]
+    assert settings.robot.front_socket_positions is None
+    assert settings.camera.pose_correction is None
+    with pytest.raises(ValueError):
+        settings.robot.home_position[0] = 0 #positions are read-only
+
+def test_environment_override(config, monkeypatch):
+    monkeypatch.setenv("ROBOT__control_port", "7011")
+    monkeypatch.setenv("TELEMETRY__rate", "50")
+    settings = load_settings(config)
+    assert settings.robot.control_port == 7011
+    assert settings.telemetry.rate == 50.0
+
+@pytest.mark.parametrize("key, value", [
+    ("ROBOT__control_port", ""),
+    ("ROBOT__control_port", "0"),
+])
+def test_disabled_control_port(config, monkeypatch, key, value):
+    monkeypatch.setenv(key, value)
+    assert load_settings(config).robot.control_port is None
+
+@pytest.mark.parametrize("key, value, error", [
+    ("SERVERCONFIG__port", "http", "[SERVERCONFIG] port"),
+    ("SERVERCONFIG__mode", "gevent", "[SERVERCONFIG] mode"),
+    ("LOGGING__debug", "yes", "[LOGGING] debug"),
+    ("ROBOT__home_position", "[1, 2, 3]", "[ROBOT] home_position"),
+    ("ROBOT__home_position", "__import__('os')", "[ROBOT] home_position"),
+    ("ROBOT__plug_in_method", "wiggle", "[ROBOT] plug_in_method"), #must be quoted
+    ("ROBOT__protocol", "json", "[ROBOT] protocol"),
+    ("ROBOT__ack_mode", "never", "[ROBOT] ack_mode"),
+    ("ROBOT__control_port", "70000", "[ROBOT] control_port"),
+    ("TELEMETRY__rate", "0", "[TELEMETRY] rate"),
+    ("TELEMETRY__rate", "-5", "[TELEMETRY] rate"),
+    ("TELEMETRY__rate", "nan", "[TELEMETRY] rate"),
+    ("RECORDER__max_chunks", "0", "[RECORDER] max_chunks"),
+    ("RECORDER__chunk_size", "0", "[RECORDER] chunk_size"),
+    ("CAMERA__pose_correction", "models/correction.npz", "[CAMERA] pose_correction"), #must be quoted
+])
+def test_invalid_values(config, monkeypatch, key, value, error):
+    monkeypatch.setenv(key, value)
+    with pytest.raises(SettingsError, match=error.replace("[", r"\[").replace("]", r"\]")):
+        load_settings(config)
+
+def test_missing_values(tmp_path):
+    path = tmp_path / "config.ini"
+    path.write_text(MINIMAL_CONFIG.replace("ip = 127.0.0.1\n", ""))
+    with pytest.raises(SettingsError, match=r"\[ROBOT\] ip is missing"):
+        load_settings(str(path))
+    path.write_text(MINIMAL_CONFIG.replace("accurate_detection = True", "accurate_detection = False"))
+    with pytest.raises(SettingsError, match=r"\[ROBOT\] front_socket_positions is missing"):
+        load_settings(str(path))
+
+def test_motion_events_require_telemetry(config, monkeypatch):
+    monkeypatch.setenv("ROBOT__motion_events", "True")
+    with pytest.raises(SettingsError, match="motion_events"):
+        load_settings(config)
+    monkeypatch.setenv("TELEMETRY__enabled", "True")
+    assert load_settings(config).robot.motion_events
@@ -0,0 +1,55 @@
+import numpy as np
+from tracker import PersonTracker
+
+BOX = np.array([[100.0, 200.0, 180.0, 400.0]])
+CONFIDENCE = np.array([0.9])
+FRAME_INTERVAL = 0.033
+
+def frames(tracker, count, start=0.0, notify=True):
+    """
+    The same person in every frame
+
+    Returns:
+        list: the events of the frames
+    """
+    return [tracker.update(BOX, CONFIDENCE, start + i*FRAME_INTERVAL, notify) for i in range(count)]
+
+def test_confirmed_person_is_notified_once_then_at_the_renotify_interval():
+    tracker = PersonTracker(window=5, confirm_frames=3, renotify_interval=0.5)
+    events = frames(tracker, 30)
+    notified = [i for i, event in enumerate(events) if event is not None]
+    assert notified[0] == 2 #confirmed in the third frame
+    assert events[2] == (0.9, 0.0) #timestamp of the first frame the person was seen in
+    assert len(notified) == 2
+    assert (notified[1] - notified[0]) * FRAME_INTERVAL >= 0.5
+
+def test_person_seen_while_inactive_is_notified_after_start_detection():
+    tracker = PersonTracker(window=5, confirm_frames=3, renotify_interval=2.0)
+    assert frames(tracker, 10, notify=False) == [None]*10 #detection off, nothing sent
+    assert tracker.summary()["confirmed_tracks"] == 1
+    assert tracker.summary()["notifications"] == 0
+    tracker.reset_notifications() #start_detection
+    event = tracker.update(BOX, CONFIDENCE, 10*FRAME_INTERVAL)
+    assert event == (0.9, 0.0) #the first frame after the start, not after the renotify interval
+
+def test_notification_is_not_consumed_while_inactive():
+    #without the reset the person is still new once the detection is active
+    tracker = PersonTracker(window=5, confirm_frames=3, renotify_interval=2.0)
+    frames(tracker, 10, notify=False)
+    assert tracker.update(BOX, CONFIDENCE, 10*FRAME_INTERVAL) is not None
+
+def test_reset_renotifies_known_person():
+    tracker = PersonTracker(window=5, confirm_frames=3, renotify_interval=2.0)
+    assert frames(tracker, 3)[2] is not None
+    assert tracker.update(BOX, CONFIDENCE, 3*FRAME_INTERVAL) is None #within the renotify interval
+    tracker.reset_notifications()
+    assert tracker.update(BOX, CONFIDENCE, 4*FRAME_INTERVAL) is not None
+
+def test_person_is_cleared_after_the_clear_frames():
+    tracker = PersonTracker(window=5, confirm_frames=3, clear_frames=4)
+    frames(tracker, 3)
+    empty = np.empty((0, 4)), np.empty(0)
+    for i in range(4):
+        assert tracker.summary()["active_tracks"] == 1
+        tracker.update(*empty, (3 + i)*FRAME_INTERVAL)
+    assert tracker.summary()["active_tracks"] == 0
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from message_server.transforms import (Transform, convert_pose, zyz_to_matrix, matrix_to_zyz, pose_to_matrix,
+                                       to_mm_deg, to_m_rad, UNIT_M_RAD, UNIT_MM_DEG)
+
+RZ_90 = np.array([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+RY_90 = np.array([[0.0, 0.0, 1.0], [0.0, 1.0, 0.0], [-1.0, 0.0, 0.0]])
+
+def random_poses(count, seed=0):
+    random = np.random.default_rng(seed)
+    return np.column_stack([random.uniform(-500, 500, (count, 3)), random.uniform(-180, 180, (count, 3))])
+
+def test_zyz_known_rotations():
+    assert np.allclose(zyz_to_matrix([0, 0, 0]), np.eye(3))
+    assert np.allclose(zyz_to_matrix([90, 0, 0]), RZ_90)
+    assert np.allclose(zyz_to_matrix([0, 0, 90]), RZ_90)
+    assert np.allclose(zyz_to_matrix([0, 90, 0]), RY_90)
+    #tool pointing down: the usual orientation of the robot, e.g. the home position
+    assert np.allclose(zyz_to_matrix([0, 180, 0]), np.diag([-1.0, 1.0, -1.0]))
+    #intrinsic z-y-z: first a, then b around the new y, then c around the new z
+    assert np.allclose(zyz_to_matrix([90, 90, 0]), RZ_90 @ RY_90)
+    assert np.allclose(zyz_to_matrix([0, 90, 90]), RY_90 @ RZ_90)
+
+def test_matrix_to_zyz_round_trip():
+    angles = random_poses(200)[:, 3:6]
+    matrices = zyz_to_matrix(angles)
+    assert np.allclose(zyz_to_matrix(matrix_to_zyz(matrices)), matrices)
+    assert np.allclose(matrix_to_zyz(matrices, angles), angles)
+
+def test_matrix_to_zyz_gimbal_keeps_reference():
+    #b = 0 and b = 180 only define a+c and a-c, c is taken from the reference
+    assert np.allclose(matrix_to_zyz(zyz_to_matrix([30, 0, 20]), [30, 0, 20]), [30, 0, 20])
+    assert np.allclose(matrix_to_zyz(zyz_to_matrix([30, 180, 20]), [30, 180, 20]), [30, 180, 20])
+    assert np.allclose(matrix_to_zyz(zyz_to_matrix([30, 0, 20])), [50, 0, 0])
+
+def test_translation_only_offset_adds_the_position():
+    camera = Transform.from_pose([-82, -6, 55.5, 0, 0, 0])
+    assert camera.is_translation
+    assert camera.apply([100, 200, 300, 179, -179.9, 179]) == [18, 194, 355.5, 179, -179.9, 179]
+
+def test_rotated_offset_rotates_the_detection():
+    camera = Transform.from_pose([10, 0, 0, 90, 0, 0])
+    assert np.allclose(camera.apply([1, 2, 3, 0, 0, 0]), [8, 1, 3, 90, 0, 0])
+    assert np.allclose(camera.apply([1, 2, 3, 0, 90, 0]), [8, 1, 3, 90, 90, 0])
+
+def test_apply_matches_the_matrix_product():
+    camera = Transform.from_pose([10, 20, 30, 15, 25, -40])
+    poses = random_poses(100)
+    expected = camera.matrix @ pose_to_matrix(poses)
+    single = np.array([camera.apply(list(pose)) for pose in poses])
+    assert np.allclose(pose_to_matrix(single), expected)
+    assert np.allclose(pose_to_matrix(camera.apply_array(poses)), expected)
+    assert np.allclose(single, camera.apply_array(poses))
+
+def test_apply_keeps_the_angles_close_to_the_input():
+    camera = Transform.from_pose([0, 0, 0, 0.5, 0.2, -0.5])
+    #no jumps of 360 degrees or to the equivalent solution (a+180, -b, c+180)
+    x, y, z, a, b, c = camera.apply([0, 0, 0, 179, 179.9, 179])
+    assert abs(a - 179) < 2 and abs(b - 179.9) < 2 and abs(c - 179) < 2
+
+def test_inverse_and_composition():
+    camera = Transform.from_pose([10, 20, 30, 15, 25, -40])
+    assert np.allclose((camera @ camera.inverse()).matrix, np.eye(4))
+    assert np.allclose(Transform.identity().apply([1, 2, 3, 4, 5, 6]), [1, 2, 3, 4, 5, 6])
+
+def test_unit_conversion():
+    assert np.allclose(convert_pose(UNIT_M_RAD, [0.1, 0.2, 0.3, np.pi, 0, -np.pi/2]), [100, 200, 300, 180, 0, -90])
+    assert convert_pose(UNIT_MM_DEG, [1, 2, 3, 4, 5, 6]) == [1, 2, 3, 4, 5, 6]
+    assert np.allclose(to_m_rad(to_mm_deg(random_poses(10))), random_poses(10))
+    with pytest.raises(ValueError):
+        convert_pose("inch/deg", [0]*6)
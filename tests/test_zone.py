@@ -0,0 +1,28 @@
+import numpy as np
+from detection import preprocessed_size
+from zone import DangerZone, ZONE_POLYGON
+
+DEFAULT_RESOLUTION = [1280, 720]
+
+def test_default_zone_covers_the_preprocessed_frame():
+    frame_size = preprocessed_size(DEFAULT_RESOLUTION)
+    assert frame_size == (400, 720)
+    zone = DangerZone.from_normalized(ZONE_POLYGON, frame_size)
+    assert zone.pixel_polygon.tolist() == [[0, 0], [400, 0], [400, 720], [0, 720]]
+    assert zone.rect == (0, 0, 400, 720)
+    frame = np.zeros((720, 400, 3), dtype=np.uint8)
+    assert zone.crop(frame).shape == frame.shape
+    #feet at the right border and at the bottom still count
+    assert zone.contains(np.array([[10.0, 10.0], [350.0, 500.0], [399.0, 719.0], [200.0, 720.0]])).all()
+
+def test_shown_polygon():
+    zone = DangerZone([[100, 0], [300, 0], [300, 720], [100, 720]], (400, 720))
+    polygon, size = zone.shown_polygon()
+    assert polygon.tolist() == [[100, 0], [300, 0], [300, 720], [100, 720]] and size == (400, 720)
+    polygon, size = zone.shown_polygon(cropped=True, scale=0.5)
+    assert polygon.tolist() == [[0, 0], [100, 0], [100, 360], [0, 360]] and size == (100, 360)
+
+def test_contains():
+    zone = DangerZone([[0, 0], [200, 0], [200, 720], [0, 720]], (400, 720))
+    inside = zone.contains(np.array([[100.0, 300.0], [250.0, 300.0], [-5.0, 300.0]]))
+    assert inside.tolist() == [True, False, True] #points left of the frame are clipped onto its border